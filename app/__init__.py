@@ -9,4 +9,5 @@ mongo = PyMongo(app)
 
 from app import views
 from app import controllers
+from app import commands
 
@@ -0,0 +1,70 @@
+# app/commands.py
+
+import os
+import click
+from app import app
+from app.models import prepare_database
+
+@app.cli.command('migrate-chapters')
+def migrate_chapters():
+    """
+    Crea gli indici e migra i documenti salvati da versioni precedenti (capitoli embedded, campi di riepilogo).
+    """
+    migrated = prepare_database()
+    click.echo(f"Fumetti migrati: {migrated}")
+
+@app.cli.command('build-covers')
+@click.option('--all', 'rebuild_all', is_flag=True, help="Rigenera anche le copertine già registrate")
+def build_covers(rebuild_all):
+    """
+    Genera le miniature di copertina delle serie usate dagli sprite della libreria.
+    """
+    from app.models import Comic
+    from app.services.comic_service import ComicService
+
+    comic_ids = [comic['_id'] for comic in Comic.list_all()] if rebuild_all else Comic.list_missing_cover_thumbs()
+    operations = [ComicService.build_series_cover(comic_id) for comic_id in comic_ids]
+    if operations:
+        Comic.bulk_write(operations)
+    click.echo(f"Copertine generate: {len(operations)}")
+
+@app.cli.command('convert-rar')
+def convert_rar():
+    """
+    Estrae in anticipo nella cache tutti i capitoli RAR della libreria, secondo RAR_ACCELERATION.
+    """
+    from app.services.comic_service import rar_accelerator
+    from app.services.rar_cache import is_rar
+
+    if not rar_accelerator.enabled:
+        raise click.ClickException("RAR_ACCELERATION è disattivata ('extract' o 'cbz' per attivarla)")
+
+    converted = skipped = failed = 0
+    for root, _, files in os.walk(app.config['COMICS_FOLDER']):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if not is_rar(path):
+                continue
+            mtime = os.stat(path).st_mtime
+            if rar_accelerator.is_converted(path, mtime):
+                skipped += 1
+                continue
+            try:
+                pages = rar_accelerator.convert(path, mtime)
+                converted += 1
+                click.echo(f"{path}: {pages} pagine")
+            except Exception as e:
+                failed += 1
+                click.echo(f"{path}: errore {e}", err=True)
+    click.echo(f"Convertiti: {converted}, già pronti: {skipped}, errori: {failed}")
+
+@app.cli.command('watch-library')
+def watch_library():
+    """
+    Osserva la libreria e aggiorna le serie modificate appena i file sono stati copiati.
+    """
+    from app.services.watcher import create_library_watcher
+
+    watcher = create_library_watcher()
+    click.echo(f"Osservo {watcher.directory_path} (backend {watcher.backend}), Ctrl+C per uscire")
+    watcher.run_forever()
@@ -1,9 +1,255 @@
-from io import BytesIO
-from flask import render_template, redirect, send_file, url_for, abort
-from app import app, mongo
-from app.models import Comic, Chapter
-from app.services import ComicScanner, ComicService
-from PIL import Image
+import time
+from datetime import datetime, timezone
+from flask import render_template, redirect, request, send_file, url_for, abort, jsonify, g
+from werkzeug.http import is_resource_modified
+from werkzeug.wsgi import ClosingIterator, wrap_file
+from app import app
+from app.models import Comic, Chapter, ScanJob
+from app.services import ComicService, scan_job_manager, search_index
+from app.services.comic_service import page_cache, page_io_executor, page_prefetcher, rar_accelerator, transcode_pool
+from app.services.metadata_cache import metadata_cache
+from app.services.reading_progress import progress_buffer
+from app.services.executors import ExecutorBusy, ExecutorTimeout
+from app.services import metrics
+from app.services.page_stream import CHUNK_SIZE
+from app.utils import chapter_version
+from imaging import VARIANT_FORMATS
+
+# Gli URL con ?v= non cambiano mai contenuto: i client possono tenerli in cache per un anno
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+app.add_template_global(chapter_version)
+
+def chapter_validators(comic_id, chapter_number, *parts):
+    """
+    Calcola i validatori HTTP di una risposta ricavata da un capitolo, senza aprire l'archivio.
+
+    L'ETag è forte: cambia con dimensione e mtime del capitolo e con le parti che
+    distinguono la risposta (pagina, variante...). La risposta è immutabile se
+    l'URL porta ?v= uguale alla versione attuale del capitolo.
+
+    :param comic_id: ID del fumetto
+    :param chapter_number: Numero del capitolo
+    :param parts: Valori che distinguono la risposta tra quelle dello stesso capitolo
+    :return: Dizionario con 'etag', 'last_modified' e 'immutable'
+    """
+    version, mtime = ComicService.get_chapter_version(comic_id, chapter_number)
+    return {
+        'etag': '-'.join([version, *(str(part) for part in parts)]),
+        'last_modified': datetime.fromtimestamp(int(mtime), timezone.utc),
+        'immutable': request.args.get('v') == version
+    }
+
+def not_modified(validators):
+    """
+    Restituisce una risposta 304 se il client ha già la versione attuale, altrimenti None.
+    """
+    if is_resource_modified(request.environ, etag=validators['etag'], last_modified=validators['last_modified']):
+        return None
+    return set_cache_headers(app.response_class(status=304), validators)
+
+def set_cache_headers(response, validators):
+    """
+    Imposta ETag, Last-Modified e Cache-Control di una risposta ricavata da un capitolo.
+    """
+    response.set_etag(validators['etag'])
+    response.last_modified = validators['last_modified']
+    if validators['immutable']:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        # Senza versione nell'URL il client deve riconvalidare a ogni uso, di solito ottenendo un 304
+        response.cache_control.no_cache = True
+    return response
+
+def send_cached_file(path, mimetype, validators):
+    """
+    Invia un file su disco (immagine sciolta o derivato) con i validatori del capitolo da cui proviene.
+    """
+    response = send_file(path, mimetype=mimetype, conditional=True,
+                         etag=validators['etag'], last_modified=validators['last_modified'])
+    return set_cache_headers(response, validators)
+
+def send_page(content, validators):
+    """
+    Costruisce la risposta HTTP per una pagina senza copiarla in memoria.
+
+    Le sorgenti posizionabili (file su disco e membri STORED) supportano le
+    richieste Range con risposta 206; i membri compressi vengono inviati a blocchi.
+
+    :param content: PageContent restituito da ComicService
+    :param validators: Validatori restituiti da chapter_validators
+    :return: Risposta Flask
+    """
+    if content.path is not None:
+        return send_cached_file(content.path, content.mimetype, validators)
+
+    if content.file is not None:
+        body = wrap_file(request.environ, content.file, buffer_size=CHUNK_SIZE)
+        response = app.response_class(body, mimetype=content.mimetype, direct_passthrough=True)
+        response.content_length = content.size
+        set_cache_headers(response, validators)
+        return response.make_conditional(request, accept_ranges=True, complete_length=content.size)
+
+    response = app.response_class(metrics.timed('decompress', content.chunks), mimetype=content.mimetype, direct_passthrough=True)
+    response.content_length = content.size
+    response.headers['Accept-Ranges'] = 'none'
+    return set_cache_headers(response, validators)
+
+def variant_args():
+    """
+    Legge e valida i parametri ?w= e ?fmt= delle varianti di pagina.
+
+    :return: Tuple (larghezza o None, formato o None), entrambi None se va inviata la pagina originale;
+             risponde 400 se non validi
+    """
+    width = request.args.get('w', type=int)
+    fmt = request.args.get('fmt')
+    if width is not None and width <= 0:
+        abort(400, description="Larghezza non valida")
+    if fmt is not None and fmt not in VARIANT_FORMATS:
+        abort(400, description="Formato non supportato")
+    if width is not None and width > max(app.config['PAGE_VARIANT_WIDTHS']):
+        # Oltre la variante più larga si inviano i byte originali invece di convertire a piena risoluzione
+        return None, None
+    return width, fmt
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    g.request_spans = metrics.start_request()
+
+@app.after_request
+def finish_request_timing(response):
+    """
+    Registra durata, stato e byte della richiesta quando la risposta è stata
+    inviata del tutto (i corpi in streaming vengono scritti dopo questo hook).
+    """
+    started = g.get('request_started')
+    if started is None:
+        return response
+    spans = g.request_spans
+    route = request.url_rule.endpoint if request.url_rule is not None else 'unmatched'
+    method, path = request.method, request.full_path.rstrip('?')
+    status = str(response.status_code)
+    # Le risposte in streaming (es. gli intervalli di pagine) non hanno Content-Length: si contano i blocchi inviati
+    sent = [response.content_length or 0]
+    if response.content_length is None and response.is_streamed and not is_file_wrapper(response.response):
+        response.response = count_bytes(response.response, sent)
+
+    def on_close():
+        elapsed = time.perf_counter() - started
+        metrics.finish_request()
+        metrics.request_seconds.observe(elapsed, route)
+        metrics.requests_total.inc(1, route, status)
+        if sent[0]:
+            metrics.response_bytes.inc(sent[0], route)
+        threshold = app.config['SLOW_REQUEST_SECONDS']
+        if threshold and elapsed >= threshold:
+            stages = metrics.summarize_spans(spans)
+            other = max(0.0, elapsed - sum(stages.values()))
+            breakdown = ' '.join(f'{stage}={seconds:.3f}s' for stage, seconds in sorted(stages.items()))
+            app.logger.warning("Richiesta lenta %s %s [%s] %s in %.3fs: %s altro=%.3fs",
+                               method, path, route, status, elapsed, breakdown, other)
+
+    call_after_body(response, on_close)
+    return response
+
+def call_after_body(response, callback):
+    """
+    Esegue callback quando il server ha finito di inviare il corpo della risposta.
+
+    Le risposte direct_passthrough vengono passate al server così come sono e
+    ignorano call_on_close: il callback viene agganciato alla chiusura del corpo,
+    senza nascondere al server il file wrapper (che può usare sendfile).
+    """
+    if not response.direct_passthrough:
+        response.call_on_close(callback)
+        return
+
+    body = response.response
+    if is_file_wrapper(body):
+        close = body.close
+
+        def close_and_call():
+            try:
+                close()
+            finally:
+                callback()
+
+        body.close = close_and_call
+    else:
+        response.response = ClosingIterator(body, callback)
+
+def is_file_wrapper(body):
+    """
+    Verifica se il corpo di una risposta è il file wrapper del server WSGI (che può usare sendfile).
+    """
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    return isinstance(file_wrapper, type) and isinstance(body, file_wrapper)
+
+def count_bytes(body, sent):
+    """
+    Generatore che produce i blocchi del corpo di una risposta sommandone la lunghezza in sent[0].
+
+    Chiude il corpo originale alla fine, come farebbe il server.
+    """
+    iterator = iter(body)
+    try:
+        for chunk in iterator:
+            sent[0] += len(chunk)
+            yield chunk
+    finally:
+        close = getattr(body, 'close', None)
+        if close is not None:
+            close()
+
+@app.errorhandler(ExecutorBusy)
+def executor_busy(error):
+    """
+    Pool di lavoro saturo: il client può riprovare a breve.
+    """
+    response = jsonify({'error': str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+@app.errorhandler(ExecutorTimeout)
+def executor_timeout(error):
+    """
+    La pagina non è stata preparata entro il tempo massimo della richiesta.
+    """
+    response = jsonify({'error': str(error)})
+    response.status_code = 504
+    return response
+
+def sprite_cells(comics):
+    """
+    Calcola la posizione di ogni copertina nello sprite di una pagina della libreria.
+
+    Le celle seguono l'ordine dei fumetti con miniatura, come in ComicService.get_cover_sprite.
+
+    :param comics: Fumetti della pagina
+    :return: Dizionario ID del fumetto -> stile CSS (background-size e background-position)
+    """
+    members = [comic['_id'] for comic in comics if comic.get('cover_thumb')]
+    columns = max(1, min(app.config['SPRITE_COLUMNS'], len(members)))
+    rows = max(1, -(-len(members) // columns))
+    cells = {}
+    for index, comic_id in enumerate(members):
+        row, column = divmod(index, columns)
+        x = column * 100 / (columns - 1) if columns > 1 else 0
+        y = row * 100 / (rows - 1) if rows > 1 else 0
+        cells[comic_id] = f'background-size: {columns * 100}% {rows * 100}%; background-position: {x:.4f}% {y:.4f}%'
+    return cells
+
+def reader_key():
+    """
+    Identifica il lettore della richiesta corrente per la lettura anticipata (indirizzo e user agent).
+    """
+    return f"{request.remote_addr}|{request.user_agent.string}"
 
 class ComicController:
     @staticmethod
@@ -11,99 +257,340 @@ class ComicController:
     @app.route('/home')
     def index():
         """
-        Visualizza la lista dei fumetti.
+        Visualizza la lista dei fumetti, una pagina alla volta.
+
+        ?sort= sceglie l'ordinamento (title o recent), ?after= il cursore della pagina.
+        """
+        sort = request.args.get('sort', 'title')
+        if sort not in Comic.SORT_ORDERS:
+            abort(400, description="Ordinamento non valido")
+        try:
+            comics, next_cursor = Comic.list_summary(sort, request.args.get('after'), app.config['LIBRARY_PAGE_SIZE'])
+        except ValueError as e:
+            abort(400, description=str(e))
+
+        # Le copertine già generate arrivano tutte in un unico sprite; le altre una per una
+        cells = sprite_cells(comics)
+        sprite_url = None
+        if cells:
+            sprite_url = url_for('cover_sprite', sort=sort, after=request.args.get('after'), v=ComicService.sprite_version(comics))
+        return render_template('home.html', comics=comics, sort=sort, next_cursor=next_cursor, scan_job=ScanJob.get_running(),
+                               sprite_cells=cells, sprite_url=sprite_url)
+
+    @app.route('/covers/sprite')
+    def cover_sprite():
+        """
+        Invia lo sprite con le copertine di una pagina della libreria (stessi ?sort= e ?after= della home).
+        """
+        sort = request.args.get('sort', 'title')
+        if sort not in Comic.SORT_ORDERS:
+            abort(400, description="Ordinamento non valido")
+        try:
+            comics, _ = Comic.list_summary(sort, request.args.get('after'), app.config['LIBRARY_PAGE_SIZE'])
+        except ValueError as e:
+            abort(400, description=str(e))
+
+        version = ComicService.sprite_version(comics)
+        if version is None:
+            abort(404, description="Nessuna copertina disponibile")
+        validators = {'etag': version, 'last_modified': None, 'immutable': request.args.get('v') == version}
+        cached = not_modified(validators)
+        if cached is not None:
+            return cached
+        return send_cached_file(ComicService.get_cover_sprite(comics), 'image/jpeg', validators)
+
+    @app.route('/api/library')
+    def library_summary():
+        """
+        Restituisce in JSON una pagina del riepilogo della libreria.
+
+        Parametri: sort (title o recent), after (cursore), limit (massimo LIBRARY_PAGE_SIZE).
         """
-        comics = Comic.list_all()
-        return render_template('home.html', comics=comics)
+        sort = request.args.get('sort', 'title')
+        if sort not in Comic.SORT_ORDERS:
+            abort(400, description="Ordinamento non valido")
+        limit = min(request.args.get('limit', app.config['LIBRARY_PAGE_SIZE'], type=int), app.config['LIBRARY_PAGE_SIZE'])
+        try:
+            comics, next_cursor = Comic.list_summary(sort, request.args.get('after'), max(limit, 1))
+        except ValueError as e:
+            abort(400, description=str(e))
+
+        items = []
+        for comic in comics:
+            cover_url = None
+            if comic.get('cover_chapter') is not None:
+                cover_url = url_for('view_cover', comic_id=comic['_id'], chapter_number=comic['cover_chapter'],
+                                    v=comic.get('cover_version'))
+            items.append({
+                'id': str(comic['_id']),
+                'title': comic['title'],
+                'chapter_count': comic.get('chapter_count', 0),
+                'page_count': comic.get('page_count', 0),
+                'cover_url': cover_url,
+                'url': url_for('view_comic', comic_id=comic['_id'])
+            })
+        return jsonify({'items': items, 'next': next_cursor})
     
+    @app.route('/search')
+    def search():
+        """
+        Pagina di ricerca della libreria; con ?q= mostra subito i risultati.
+        """
+        query = request.args.get('q', '').strip()
+        comics = search_index.search(query, app.config['SEARCH_MAX_RESULTS']) if query else []
+        return render_template('search.html', comics=comics, query=query)
+
+    @app.route('/api/search')
+    def search_api():
+        """
+        Restituisce in JSON i fumetti il cui titolo o autore corrisponde a ?q=, per il completamento durante la digitazione.
+
+        Parametri: q (testo cercato), limit (massimo SEARCH_MAX_RESULTS).
+        """
+        query = request.args.get('q', '')
+        limit = min(request.args.get('limit', 10, type=int), app.config['SEARCH_MAX_RESULTS'])
+        items = []
+        for comic in search_index.search(query, max(limit, 1)):
+            cover_url = None
+            if comic.get('cover_chapter') is not None:
+                cover_url = url_for('view_cover', comic_id=comic['_id'], chapter_number=comic['cover_chapter'], size='small',
+                                    v=comic.get('cover_version'))
+            items.append({
+                'id': str(comic['_id']),
+                'title': comic['title'],
+                'author': comic.get('author'),
+                'chapter_count': comic.get('chapter_count', 0),
+                'cover_url': cover_url,
+                'url': url_for('view_comic', comic_id=comic['_id'])
+            })
+        return jsonify({'query': query, 'items': items})
+
     @app.route('/comic/<comic_id>')
     @app.route('/comic/<comic_id>/<int:page_number>')
     def view_comic(comic_id, page_number=1):
         """
         Visualizza i dettagli di un fumetto, inclusi i capitoli.
         """
-        comic = Comic.get_by_id(comic_id)
+        comic = ComicService.get_comic(comic_id)
         chapters_per_page = app.config['CHAPTERS_PER_PAGE']
         offset = (page_number - 1) * chapters_per_page
         
-        # Recupera solo i capitoli necessari per la pagina corrente
-        chapters = comic['chapters'][offset:offset + chapters_per_page]
-        
-        # Calcola il numero totale di pagine
-        total_chapters = len(comic['chapters'])
+        with metrics.span('mongo'):
+            # Recupera solo i capitoli necessari per la pagina corrente
+            chapters = list(Chapter.list_by_comic(comic_id, offset, chapters_per_page))
+
+            # Calcola il numero totale di pagine
+            total_chapters = Chapter.count_by_comic(comic_id)
         total_pages = (total_chapters + chapters_per_page - 1) // chapters_per_page
+        progress = progress_buffer.get(comic_id)
         
-        return render_template('comic.html', comic=comic, chapters=chapters, page_number=page_number, total_pages=total_pages)
+        return render_template('comic.html', comic=comic, chapters=chapters, page_number=page_number, total_pages=total_pages, progress=progress)
 
     @app.route('/comic/<comic_id>/chapter/<int:chapter_number>', methods=['GET'])
     def view_chapter(comic_id, chapter_number):
         """
         Visualizza le immagini di un capitolo specifico del fumetto.
 
+        Il lettore parte dalla pagina ?page=, o da quella a cui si era arrivati nel capitolo.
+
         :param comic_id: ID del fumetto
         :param chapter_number: numero del capitolo
         :return: Renderizza la pagina del capitolo o restituisce un errore
         """
-        # Recupera il fumetto dal database
-        comic = Comic.get_by_id(comic_id)
-        
-        # Recupera il capitolo dal database
-        chapter = Chapter.find_by_number(comic_id, chapter_number)
-        if chapter is None:
+        # Recupera fumetto e capitolo, con i capitoli vicini, dalla cache dei metadati
+        comic = ComicService.get_comic(comic_id)
+        resolved = ComicService.get_chapter(comic_id, chapter_number)
+        if resolved is None:
             abort(404, description="Capitolo non trovato.")
 
+        chapter = resolved['chapter']
         images = chapter['page_count']
-        page = chapter_number // app.config['CHAPTERS_PER_PAGE'] + 1
+        # Pagina dell'elenco dei capitoli che contiene questo capitolo
+        page = resolved['position'] // app.config['CHAPTERS_PER_PAGE'] + 1
+        prev, next = resolved['prev'], resolved['next']
+
+        start_page = request.args.get('page', type=int)
+        if start_page is None:
+            progress = progress_buffer.get(comic_id)
+            if progress is not None and progress['chapter_number'] == chapter['number']:
+                start_page = progress['page_number']
+        start_page = min(max(start_page or 0, 0), max(images - 1, 0))
 
-        prev = Chapter.find_by_number(comic_id, chapter_number-1)
-        next = Chapter.find_by_number(comic_id, chapter_number+1)
+        window = min(app.config['READER_WINDOW'], app.config['BULK_MAX_PAGES'])
+        # Il lettore chiede le varianti solo se sono più strette delle pagine
+        page_width = ComicService.get_page_width(comic_id, chapter_number) if images else None
+        return render_template('chapter.html', comic=comic, chapter=chapter, images=images, page=page, prev=prev, next=next,
+                               window=window, start_page=start_page, page_width=page_width,
+                               variant_widths=sorted(app.config['PAGE_VARIANT_WIDTHS']))
 
-        return render_template('chapter.html', comic=comic, chapter=chapter, images=images, page=page)
+    @app.route('/reading')
+    def continue_reading():
+        """
+        Scaffale "continua a leggere": i fumetti letti più di recente, con il punto a cui si era arrivati.
+        """
+        shelf = progress_buffer.list_recent(app.config['CONTINUE_READING_LIMIT'])
+        return render_template('reading.html', shelf=shelf)
+
+    @app.route('/api/progress/<comic_id>/<int:chapter_number>', methods=['POST'])
+    def record_progress(comic_id, chapter_number):
+        """
+        Registra la pagina (?page= o campo del form) a cui è arrivato il lettore.
+
+        Il progresso va nel buffer in memoria e viene scritto su MongoDB in differita,
+        quindi la richiesta non accede al database se i metadati del capitolo sono in cache.
+        """
+        page_number = request.values.get('page', type=int)
+        resolved = ComicService.get_chapter(comic_id, chapter_number)
+        if resolved is None:
+            abort(404, description="Capitolo non trovato.")
+        page_count = resolved['chapter']['page_count']
+        if page_number is None or not 0 <= page_number < page_count:
+            abort(400, description="Pagina non valida")
+        progress_buffer.record(comic_id, chapter_number, page_number, page_count)
+        return '', 204
 
     @app.route('/comic/<comic_id>/chapter/<int:chapter_number>/<int:page_number>')
     def view_page(comic_id, chapter_number, page_number):
         """
         Visualizza una pagina specifica di un capitolo di un fumetto.
+
+        Con ?w= (larghezza in pixel) e/o ?fmt= (webp o jpeg) invia una variante
+        ridimensionata e convertita invece dell'originale. Le richieste condizionali
+        ricevono 304 prima che l'archivio venga aperto.
         """
+        width, fmt = variant_args()
+        is_variant = width is not None or fmt is not None
         try:
-            image_data, mimetype = ComicService.get_page_image(comic_id, chapter_number, page_number)
-            return send_file(BytesIO(image_data), mimetype=mimetype)
+            variant = (f'w{width or 0}', fmt or 'jpeg') if is_variant else ()
+            validators = chapter_validators(comic_id, chapter_number, page_number, *variant)
+            cached = not_modified(validators)
+            if cached is not None:
+                return cached
+
+            if is_variant:
+                variant_path, mimetype = ComicService.get_page_variant(comic_id, chapter_number, page_number, width, fmt)
+                response = send_cached_file(variant_path, mimetype, validators)
+            else:
+                response = send_page(ComicService.load_page_content(comic_id, chapter_number, page_number), validators)
+            if app.config['PREFETCH_ENABLED']:
+                ComicService.prefetch_pages(reader_key(), comic_id, chapter_number, page_number, width, fmt)
+            return response
         except FileNotFoundError:
             abort(404, description="Pagina non trovata")
+        except (ExecutorBusy, ExecutorTimeout):
+            raise
         except Exception as e:
             abort(500, description=str(e))
 
+    @app.route('/comic/<comic_id>/chapter/<int:chapter_number>/pages')
+    def view_page_range(comic_id, chapter_number):
+        """
+        Invia in un'unica risposta le pagine da ?start= per ?count= pagine (massimo BULK_MAX_PAGES).
+
+        Il corpo è una sequenza di frame con intestazione di lunghezza (vedi page_stream.frame_header).
+        ?w= e ?fmt= funzionano come per view_page. X-Page-Count indica le pagine incluse,
+        che possono essere meno di quelle richieste se una variante non è pronta.
+        """
+        start = request.args.get('start', 0, type=int)
+        count = min(request.args.get('count', app.config['BULK_MAX_PAGES'], type=int), app.config['BULK_MAX_PAGES'])
+        if count < 1:
+            abort(400, description="Numero di pagine non valido")
+        width, fmt = variant_args()
+        try:
+            validators = chapter_validators(comic_id, chapter_number, 'pages', start, count, f'w{width or 0}', fmt or '')
+            cached = not_modified(validators)
+            if cached is not None:
+                return cached
+            chunks, included, truncated = ComicService.get_page_range(comic_id, chapter_number, start, count, width, fmt)
+            if app.config['PREFETCH_ENABLED']:
+                # Il lettore carica le pagine solo a finestre: la lettura anticipata parte dalla fine di questa
+                ComicService.prefetch_pages(reader_key(), comic_id, chapter_number, start + included - 1, width, fmt)
+        except FileNotFoundError:
+            abort(404, description="Pagina non trovata")
+
+        response = app.response_class(metrics.timed('decompress', chunks), mimetype='application/octet-stream', direct_passthrough=True)
+        response.headers['X-Page-Start'] = str(start)
+        response.headers['X-Page-Count'] = str(included)
+        if truncated:
+            # Un intervallo ridotto non corrisponde all'ETag della finestra richiesta: non va messo in cache
+            response.cache_control.no_store = True
+            return response
+        return set_cache_headers(response, validators)
+
     @app.route('/comic/<comic_id>/<int:chapter_number>/cover')
     def view_cover(comic_id, chapter_number):
         """
-        Visualizza una pagina specifica di un capitolo di un fumetto con qualità ridotta.
+        Visualizza la miniatura della prima pagina di un capitolo.
+
+        La dimensione si sceglie con il parametro ?size= tra quelle di THUMBNAIL_SIZES.
         """
+        size = request.args.get('size', app.config['COVER_THUMBNAIL_SIZE'])
+        if size not in app.config['THUMBNAIL_SIZES']:
+            abort(400, description="Dimensione della miniatura non valida")
         try:
-            # Ottieni i dati dell'immagine e il tipo MIME dal servizio
-            image_data, mimetype = ComicService.get_page_image(comic_id, chapter_number, 0)
-            
-            # Apri l'immagine utilizzando Pillow
-            image = Image.open(BytesIO(image_data))
-            
-            # Salva l'immagine in un buffer con qualità ridotta
-            buffer = BytesIO()
-            image.save(buffer, format=image.format, quality=1)  # Modifica 'quality' secondo le tue esigenze
-            buffer.seek(0)
-            
-            # Restituisci l'immagine con qualità ridotta
-            return send_file(buffer, mimetype=mimetype)
-        
+            validators = chapter_validators(comic_id, chapter_number, 'cover', size)
+            cached = not_modified(validators)
+            if cached is not None:
+                return cached
+            cover_path = ComicService.get_cover(comic_id, chapter_number, size)
+            return send_cached_file(cover_path, 'image/jpeg', validators)
         except FileNotFoundError:
             abort(404, description="Pagina non trovata")
+        except (ExecutorBusy, ExecutorTimeout):
+            raise
         except Exception as e:
             abort(500, description=str(e))
 
         
-    @app.route('/scan')
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """
+        Esporta le metriche di questo processo nel formato testuale di Prometheus.
+        """
+        return app.response_class(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/api/stats/cache')
+    def cache_stats():
+        """
+        Restituisce in JSON i contatori delle cache e dei buffer di questo processo: metadati, lettura anticipata, RAR e progressi.
+        """
+        return jsonify({
+            'metadata': metadata_cache.stats(),
+            'pages': page_cache.stats(),
+            'prefetch': page_prefetcher.stats(),
+            'rar': rar_accelerator.stats(),
+            'page_io': page_io_executor.stats(),
+            'transcode': transcode_pool.stats(),
+            'progress': progress_buffer.stats()
+        })
+
+    @app.route('/scan', methods=['GET', 'POST'])
     def scan_comics():
-        directory_to_scan = app.config['COMICS_FOLDER'] 
-        scanner = ComicScanner(directory_to_scan, mongo)
-        scanner.scan_and_register_comics()
-        return redirect(url_for('index'))
+        """
+        Avvia l'aggiornamento della libreria in background. Con ?full=1 la libreria viene ricostruita da zero.
+
+        Con GET (il pulsante della home) reindirizza subito alla libreria; con POST
+        risponde 202 con l'ID del job e l'URL da cui leggere l'avanzamento.
+        """
+        job_id, started = scan_job_manager.start(full=request.args.get('full') == '1')
+        if request.method == 'GET':
+            return redirect(url_for('index'))
 
+        status_url = url_for('scan_status', job_id=job_id) if job_id else None
+        response = jsonify({'job_id': job_id, 'started': started, 'status_url': status_url})
+        response.status_code = 202
+        if status_url:
+            response.headers['Location'] = status_url
+        return response
 
+    @app.route('/scan/status')
+    @app.route('/scan/status/<job_id>')
+    def scan_status(job_id=None):
+        """
+        Restituisce in JSON stato e avanzamento di una scansione (di default l'ultima avviata).
+        """
+        job = ScanJob.get(job_id) if job_id else ScanJob.get_latest()
+        if job is None:
+            abort(404, description="Scansione non trovata")
+        job['job_id'] = job.pop('_id')
+        return jsonify(job)
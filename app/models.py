@@ -1,37 +1,295 @@
 from app import mongo
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING, DESCENDING, DeleteMany, InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app.utils import chapter_version, decode_cursor, encode_cursor, extract_metadata_from_filename
 import os
 import zipfile
 import rarfile
 
 class Comic:
-    def __init__(self, title, path, chapters=None):
+    # Campi usati dalla griglia della libreria
+    SUMMARY_PROJECTION = {
+        'title': 1,
+        'sort_title': 1,
+        'added_at': 1,
+        'chapter_count': 1,
+        'page_count': 1,
+        'cover_chapter': 1,
+        'cover_version': 1,
+        'cover_thumb': 1
+    }
+    # Ordinamenti della libreria: campo principale e direzione; _id rompe i pareggi
+    SORT_ORDERS = {
+        'title': ('sort_title', ASCENDING),
+        'recent': ('added_at', DESCENDING)
+    }
+
+    # Campi caricati dall'indice di ricerca
+    SEARCH_PROJECTION = {
+        'title': 1,
+        'author': 1,
+        'sort_title': 1,
+        'chapter_count': 1,
+        'cover_chapter': 1,
+        'cover_version': 1
+    }
+
+    def __init__(self, title, path, mtime=None, author=None):
         self.title = title
-        self.chapters = chapters or []
+        self.author = author
         self.path = path
+        self.mtime = mtime  # Data di modifica della directory al momento della scansione
+        self.added_at = datetime.now(timezone.utc)
 
-    def save(self):
+    def to_document(self):
         """
-        Salva il fumetto nel database.
+        Restituisce il fumetto nella forma in cui viene salvato nel database.
+        I capitoli sono salvati nella collezione chapters.
         """
-        comic_data = {
+        return {
             'title': self.title,
-            'chapters': self.chapters,
-            'path': self.path
+            'author': self.author,
+            'sort_title': self.title.lower(),
+            'path': self.path,
+            'mtime': self.mtime,
+            'added_at': self.added_at,
+            # Statistiche aggiornate dallo scanner con refresh_stats_ops
+            'chapter_count': 0,
+            'page_count': 0,
+            'cover_chapter': None
         }
-        result = mongo.db.comics.insert_one(comic_data)
+
+    def save(self):
+        """
+        Salva il fumetto nel database.
+        """
+        result = mongo.db.comics.insert_one(self.to_document())
         return result.inserted_id
 
+    def insert_op(self, comic_id):
+        """
+        Operazione di bulk_write che inserisce il fumetto con un ID assegnato dal client.
+
+        :param comic_id: ObjectId da assegnare al fumetto
+        """
+        return InsertOne(dict(self.to_document(), _id=comic_id))
+
+    @staticmethod
+    def bulk_write(operations):
+        """
+        Esegue in ordine un gruppo di operazioni sulla collezione dei fumetti.
+
+        :param operations: Lista di operazioni pymongo (InsertOne, UpdateOne, ...)
+        :return: BulkWriteResult
+        """
+        return mongo.db.comics.bulk_write(operations, ordered=True)
+
+    @staticmethod
+    def list_scan_state(paths=None):
+        """
+        Restituisce lo stato registrato all'ultima scansione: percorso e mtime di ogni fumetto.
+
+        :param paths: Percorsi delle directory a cui limitarsi (opzionale)
+        """
+        query = {} if paths is None else {'path': {'$in': list(paths)}}
+        return mongo.db.comics.find(query, {'path': 1, 'mtime': 1})
+
+    @staticmethod
+    def update_mtime_op(comic_id, mtime):
+        """
+        Operazione di bulk_write che aggiorna la data di modifica registrata per la directory del fumetto.
+        """
+        return UpdateOne({'_id': ObjectId(comic_id)}, {'$set': {'mtime': mtime}})
+
+    @staticmethod
+    def cover_thumb_op(comic_id, cover_thumb):
+        """
+        Operazione di bulk_write che registra la miniatura di copertina della serie.
+
+        :param comic_id: ID del fumetto
+        :param cover_thumb: Dizionario con chiave del derivato, larghezza e altezza (None se la serie non ha una prima pagina)
+        """
+        return UpdateOne({'_id': ObjectId(comic_id)}, {'$set': {'cover_thumb': cover_thumb}})
+
+    @staticmethod
+    def unset_cover_thumb_op(comic_id):
+        """
+        Operazione di bulk_write che rimuove la miniatura di copertina registrata, per rigenerarla in seguito.
+
+        :param comic_id: ID del fumetto
+        """
+        return UpdateOne({'_id': ObjectId(comic_id)}, {'$unset': {'cover_thumb': ''}})
+
+    @staticmethod
+    def list_missing_cover_thumbs():
+        """
+        Restituisce gli ID dei fumetti con capitoli ma senza miniatura di copertina (campo assente o None).
+        """
+        return mongo.db.comics.distinct('_id', {'cover_chapter': {'$ne': None}, 'cover_thumb': None})
+
+    @staticmethod
+    def delete_by_ids_op(comic_ids):
+        """
+        Operazione di bulk_write che elimina i fumetti le cui directory non esistono più.
+
+        :param comic_ids: ID dei fumetti da eliminare
+        """
+        return DeleteMany({'_id': {'$in': list(comic_ids)}})
+
+    @staticmethod
+    def refresh_stats_ops(comic_ids):
+        """
+        Ricalcola dai capitoli il numero di capitoli, di pagine, il capitolo di copertina e la sua versione (per gli URL delle copertine).
+
+        :param comic_ids: ID dei fumetti da aggiornare
+        :return: Lista di operazioni di bulk_write
+        """
+        comic_ids = list(comic_ids)
+        stats = {
+            row['_id']: row
+            for row in mongo.db.chapters.aggregate([
+                {'$match': {'comic_id': {'$in': comic_ids}}},
+                {'$sort': {'comic_id': 1, 'number': 1}},
+                {'$group': {
+                    '_id': '$comic_id',
+                    'chapter_count': {'$sum': 1},
+                    'page_count': {'$sum': '$page_count'},
+                    'cover_chapter': {'$first': '$number'},
+                    'cover_size': {'$first': '$size'},
+                    'cover_mtime': {'$first': '$mtime'}
+                }}
+            ])
+        }
+        operations = []
+        for comic_id in comic_ids:
+            row = stats.get(comic_id, {})
+            cover_version = None
+            if row.get('cover_chapter') is not None:
+                cover_version = chapter_version(row.get('cover_size'), row.get('cover_mtime'))
+            operations.append(UpdateOne({'_id': comic_id}, {'$set': {
+                'chapter_count': row.get('chapter_count', 0),
+                'page_count': row.get('page_count', 0),
+                'cover_chapter': row.get('cover_chapter'),
+                'cover_version': cover_version
+            }}))
+        return operations
+
+    @staticmethod
+    def ensure_indexes():
+        """
+        Crea gli indici usati dalla paginazione della libreria, se non esistono già.
+        """
+        for field, direction in Comic.SORT_ORDERS.values():
+            mongo.db.comics.create_index([(field, direction), ('_id', direction)])
+        # Usato dagli aggiornamenti mirati del watcher
+        mongo.db.comics.create_index('path')
+
+    @staticmethod
+    def backfill_summary():
+        """
+        Completa i fumetti salvati prima dell'introduzione dei campi di riepilogo e dell'autore.
+
+        :return: Numero di fumetti aggiornati
+        """
+        # La data di aggiunta viene ricavata dalla data di creazione dell'ObjectId
+        mongo.db.comics.update_many({'added_at': {'$exists': False}}, [{'$set': {
+            'added_at': {'$toDate': '$_id'},
+            'sort_title': {'$toLower': '$title'}
+        }}])
+        comic_ids = mongo.db.comics.distinct('_id', {'$or': [
+            {'chapter_count': {'$exists': False}},
+            {'cover_version': {'$exists': False}}
+        ]})
+        if comic_ids:
+            Comic.bulk_write(Comic.refresh_stats_ops(comic_ids))
+
+        # L'autore viene ricavato dal nome della directory, come fa lo scanner
+        operations = [
+            UpdateOne({'_id': comic['_id']}, {'$set': {
+                'author': extract_metadata_from_filename(os.path.basename(comic['path']))['author']
+            }})
+            for comic in mongo.db.comics.find({'author': {'$exists': False}}, {'path': 1})
+        ]
+        if operations:
+            Comic.bulk_write(operations)
+        return len(comic_ids)
+
+    @staticmethod
+    def list_summary(sort='title', after=None, limit=50):
+        """
+        Restituisce una pagina della libreria con i soli campi della griglia, usando la paginazione a cursore.
+
+        Il cursore codifica il valore di ordinamento e l'_id dell'ultimo fumetto
+        restituito, così ogni pagina è una lettura su indice indipendente dal numero
+        di fumetti che la precedono.
+
+        :param sort: Ordinamento, una delle chiavi di SORT_ORDERS
+        :param after: Cursore restituito dalla pagina precedente (opzionale)
+        :param limit: Numero massimo di fumetti da restituire
+        :return: Tuple (lista dei fumetti, cursore della pagina successiva o None)
+        """
+        field, direction = Comic.SORT_ORDERS[sort]
+        query = {}
+        if after is not None:
+            try:
+                value, last_id = decode_cursor(after)
+                if field == 'added_at':
+                    value = datetime.fromisoformat(value)
+                last_id = ObjectId(last_id)
+            except (ValueError, TypeError, InvalidId) as e:
+                raise ValueError("Cursore non valido") from e
+            operator = '$gt' if direction == ASCENDING else '$lt'
+            query = {'$or': [
+                {field: {operator: value}},
+                {field: value, '_id': {operator: last_id}}
+            ]}
+
+        comics = list(
+            mongo.db.comics.find(query, Comic.SUMMARY_PROJECTION)
+            .sort([(field, direction), ('_id', direction)])
+            .limit(limit + 1)
+        )
+        next_cursor = None
+        if len(comics) > limit:
+            comics = comics[:limit]
+            last = comics[-1]
+            value = last.get(field)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            next_cursor = encode_cursor(value, str(last['_id']))
+        return comics, next_cursor
+
     @staticmethod
     def get_by_id(comic_id):
         """
         Recupera un fumetto dal database dato il suo ID.
         """
-        comic = mongo.db.comics.find_one_or_404({'_id': ObjectId(comic_id)})
-    
-        # Ordinamento dei capitoli per numero
-        comic['chapters'] = sorted(comic['chapters'], key=lambda x: x['number'])
-        return comic
+        return mongo.db.comics.find_one_or_404({'_id': ObjectId(comic_id)})
+
+    @staticmethod
+    def list_search_documents(comic_ids=None):
+        """
+        Restituisce i campi indicizzati dalla ricerca di tutti i fumetti o solo di quelli indicati.
+
+        :param comic_ids: ID dei fumetti da caricare (opzionale)
+        :return: Cursore dei fumetti
+        """
+        query = {} if comic_ids is None else {'_id': {'$in': list(comic_ids)}}
+        return mongo.db.comics.find(query, Comic.SEARCH_PROJECTION)
+
+    @staticmethod
+    def list_summary_by_ids(comic_ids):
+        """
+        Restituisce i campi della griglia dei fumetti indicati.
+
+        :param comic_ids: ID dei fumetti
+        :return: Dizionario ID -> fumetto (i fumetti non più esistenti mancano)
+        """
+        comic_ids = [ObjectId(comic_id) for comic_id in comic_ids]
+        return {comic['_id']: comic for comic in mongo.db.comics.find({'_id': {'$in': comic_ids}}, Comic.SUMMARY_PROJECTION)}
 
     @staticmethod
     def list_all():
@@ -41,31 +299,188 @@ class Comic:
         return mongo.db.comics.find()
 
 class Chapter:
-    def __init__(self, comic_id, title, number, filename, page_count, is_archive):
+    # Campi restituiti quando servono solo i dati da mostrare, senza l'indice delle pagine
+    SUMMARY_PROJECTION = {'pages': 0}
+
+    def __init__(self, comic_id, title, number, filename, page_count, is_archive, pages=None, mtime=None, size=None):
         self.comic_id = comic_id
         self.title = title
         self.number = number
         self.filename = filename  # Percorso dell'archivio o della directory
         self.page_count = page_count
         self.is_archive = is_archive  # Indica se il percorso è un archivio
+        self.pages = pages or []  # Indice ordinato delle pagine (nome, offset, dimensioni, mimetype)
+        self.mtime = mtime  # Data di modifica del capitolo al momento della scansione (vedi chapter_stat)
+        self.size = size  # Dimensione dell'archivio, o delle immagini per le directory
 
-    def save(self):
+    def to_document(self):
         """
-        Salva il capitolo nel database.
+        Restituisce il capitolo nella forma in cui viene salvato nel database.
         """
-        chapter_data = {
+        return {
+            'comic_id': ObjectId(self.comic_id),
             'title': self.title,
             'number': self.number,
             'filename': self.filename,
             'page_count': self.page_count,
-            'is_archive': self.is_archive
+            'is_archive': self.is_archive,
+            'pages': self.pages,
+            'mtime': self.mtime,
+            'size': self.size
         }
-        result = mongo.db.comics.update_one(
-            {'_id': ObjectId(self.comic_id)},
-            {'$push': {'chapters': chapter_data}}
+
+    def save(self):
+        """
+        Salva il capitolo nel database.
+        """
+        result = mongo.db.chapters.insert_one(self.to_document())
+        return result.inserted_id
+
+    def save_op(self):
+        """
+        Operazione di bulk_write che inserisce il capitolo.
+        """
+        return InsertOne(self.to_document())
+
+    def replace_op(self):
+        """
+        Operazione di bulk_write che sostituisce il capitolo con lo stesso nome file nello stesso fumetto.
+        """
+        return ReplaceOne(
+            {'comic_id': ObjectId(self.comic_id), 'filename': self.filename},
+            self.to_document(),
+            upsert=True
         )
-        return result.modified_count
-    
+
+    @staticmethod
+    def bulk_write(operations):
+        """
+        Esegue in ordine un gruppo di operazioni sulla collezione dei capitoli.
+
+        :param operations: Lista di operazioni pymongo (InsertOne, ReplaceOne, ...)
+        :return: BulkWriteResult
+        """
+        return mongo.db.chapters.bulk_write(operations, ordered=True)
+
+    @staticmethod
+    def delete_by_filenames_op(comic_id, filenames):
+        """
+        Operazione di bulk_write che elimina i capitoli di un fumetto i cui file non esistono più.
+
+        :param comic_id: ID del fumetto
+        :param filenames: Nomi dei file o delle directory dei capitoli eliminati
+        """
+        return DeleteMany({'comic_id': ObjectId(comic_id), 'filename': {'$in': list(filenames)}})
+
+    @staticmethod
+    def delete_by_comic_ids_op(comic_ids):
+        """
+        Operazione di bulk_write che elimina tutti i capitoli dei fumetti indicati.
+
+        :param comic_ids: ID dei fumetti eliminati
+        """
+        return DeleteMany({'comic_id': {'$in': list(comic_ids)}})
+
+    @staticmethod
+    def list_scan_state(comic_ids=None):
+        """
+        Restituisce lo stato registrato all'ultima scansione: fumetto, nome, dimensione e mtime di ogni capitolo.
+
+        :param comic_ids: ID dei fumetti a cui limitarsi (opzionale)
+        """
+        query = {} if comic_ids is None else {'comic_id': {'$in': list(comic_ids)}}
+        return mongo.db.chapters.find(query, {'comic_id': 1, 'filename': 1, 'size': 1, 'mtime': 1})
+
+    @staticmethod
+    def ensure_indexes():
+        """
+        Crea gli indici della collezione dei capitoli, se non esistono già.
+
+        (comic_id, number) serve a paginazione, conteggi e capitolo precedente/successivo;
+        (comic_id, filename) identifica un capitolo durante le scansioni incrementali.
+        """
+        mongo.db.chapters.create_index([('comic_id', ASCENDING), ('number', ASCENDING), ('filename', ASCENDING)])
+        mongo.db.chapters.create_index([('comic_id', ASCENDING), ('filename', ASCENDING)], unique=True)
+
+    @staticmethod
+    def migrate_embedded():
+        """
+        Sposta i capitoli salvati nell'array embedded 'chapters' dei fumetti nella collezione chapters.
+
+        La migrazione è idempotente: può essere interrotta e ripetuta senza creare duplicati.
+
+        :return: Numero di fumetti migrati
+        """
+        migrated = 0
+        for comic in mongo.db.comics.find({'chapters': {'$exists': True}}, {'chapters': 1}):
+            operations = []
+            for chapter in comic['chapters']:
+                document = dict(chapter, comic_id=comic['_id'])
+                operations.append(ReplaceOne(
+                    {'comic_id': comic['_id'], 'filename': chapter['filename']},
+                    document,
+                    upsert=True
+                ))
+            if operations:
+                Chapter.bulk_write(operations)
+            mongo.db.comics.update_one({'_id': comic['_id']}, {'$unset': {'chapters': ''}})
+            migrated += 1
+        return migrated
+
+    @staticmethod
+    def list_by_comic(comic_id, offset=0, limit=None):
+        """
+        Restituisce i capitoli di un fumetto ordinati per numero, senza l'indice delle pagine.
+
+        :param comic_id: ID del fumetto
+        :param offset: Numero di capitoli da saltare
+        :param limit: Numero massimo di capitoli da restituire
+        :return: Cursore dei capitoli
+        """
+        cursor = mongo.db.chapters.find(
+            {'comic_id': ObjectId(comic_id)},
+            Chapter.SUMMARY_PROJECTION
+        ).sort([('number', ASCENDING), ('filename', ASCENDING)]).skip(offset)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return cursor
+
+    @staticmethod
+    def count_by_comic(comic_id):
+        """
+        Conta i capitoli di un fumetto.
+        """
+        return mongo.db.chapters.count_documents({'comic_id': ObjectId(comic_id)})
+
+    @staticmethod
+    def count_before(comic_id, number):
+        """
+        Conta i capitoli di un fumetto con numero inferiore a quello dato, cioè la posizione del capitolo.
+        """
+        return mongo.db.chapters.count_documents({'comic_id': ObjectId(comic_id), 'number': {'$lt': number}})
+
+    @staticmethod
+    def find_neighbours(comic_id, number):
+        """
+        Trova il capitolo precedente e quello successivo, anche se la numerazione ha dei salti.
+
+        :param comic_id: ID del fumetto
+        :param number: Numero del capitolo corrente
+        :return: Tuple (precedente, successivo), ciascuno None se non esiste
+        """
+        projection = {'number': 1, 'title': 1}
+        previous = mongo.db.chapters.find_one(
+            {'comic_id': ObjectId(comic_id), 'number': {'$lt': number}},
+            projection,
+            sort=[('number', DESCENDING)]
+        )
+        following = mongo.db.chapters.find_one(
+            {'comic_id': ObjectId(comic_id), 'number': {'$gt': number}},
+            projection,
+            sort=[('number', ASCENDING)]
+        )
+        return previous, following
+
     @staticmethod
     def find_by_number(comic_id, number):
         """
@@ -75,12 +490,210 @@ class Chapter:
         :param number: Numero del capitolo da cercare
         :return: Capitolo se trovato, altrimenti None
         """
-        # Query MongoDB per trovare il capitolo specifico nel fumetto
-        comic = mongo.db.comics.find_one(
-            {'_id': ObjectId(comic_id), 'chapters.number': number},
-            {'chapters.$': 1}
+        return mongo.db.chapters.find_one(
+            {'comic_id': ObjectId(comic_id), 'number': number},
+            sort=[('filename', ASCENDING)]
         )
-        
-        if comic and 'chapters' in comic:
-            return comic['chapters'][0]
-        return None
\ No newline at end of file
+
+def prepare_database():
+    """
+    Crea gli indici e aggiorna i documenti salvati da versioni precedenti dell'applicazione.
+
+    :return: Numero di fumetti i cui capitoli embedded sono stati migrati
+    """
+    Comic.ensure_indexes()
+    Chapter.ensure_indexes()
+    ReadingProgress.ensure_indexes()
+    migrated = Chapter.migrate_embedded()
+    Comic.backfill_summary()
+    return migrated
+
+class ScanJob:
+    LOCK_ID = 'scan'
+
+    @staticmethod
+    def acquire_lock(job_id, timeout):
+        """
+        Prova ad acquisire il lock globale delle scansioni, condiviso tra tutti i processi.
+
+        Un lock il cui heartbeat è più vecchio di timeout secondi è considerato
+        abbandonato (processo terminato durante la scansione) e può essere preso.
+
+        :param job_id: ID del job che vuole eseguire la scansione
+        :param timeout: Secondi dopo i quali un lock senza heartbeat scade
+        :return: True se il lock è stato acquisito
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            mongo.db.locks.update_one(
+                {
+                    '_id': ScanJob.LOCK_ID,
+                    '$or': [{'job_id': None}, {'heartbeat': {'$lt': now - timedelta(seconds=timeout)}}]
+                },
+                {'$set': {'job_id': job_id, 'heartbeat': now}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Il documento del lock esiste ed è tenuto da un altro job
+            return False
+        return True
+
+    @staticmethod
+    def release_lock(job_id):
+        """
+        Rilascia il lock delle scansioni se è ancora tenuto dal job indicato.
+        """
+        mongo.db.locks.update_one({'_id': ScanJob.LOCK_ID, 'job_id': job_id}, {'$set': {'job_id': None}})
+
+    @staticmethod
+    def create(job_id, full, paths=None):
+        """
+        Registra un nuovo job di scansione in esecuzione.
+
+        :param job_id: ID del job
+        :param full: True se la libreria viene ricostruita da zero
+        :param paths: Directory dei fumetti aggiornate, per le scansioni mirate (opzionale)
+        """
+        now = datetime.now(timezone.utc)
+        mongo.db.scan_jobs.insert_one({
+            '_id': job_id,
+            'status': 'running',
+            'full': full,
+            'paths': paths,
+            'started_at': now,
+            'updated_at': now,
+            'finished_at': None,
+            'error': None,
+            'progress': {}
+        })
+
+    @staticmethod
+    def update_progress(job_id, progress):
+        """
+        Salva l'avanzamento di un job e rinnova l'heartbeat del lock.
+
+        :param job_id: ID del job
+        :param progress: Dizionario con i contatori di avanzamento
+        """
+        now = datetime.now(timezone.utc)
+        mongo.db.scan_jobs.update_one({'_id': job_id}, {'$set': {'progress': progress, 'updated_at': now}})
+        mongo.db.locks.update_one({'_id': ScanJob.LOCK_ID, 'job_id': job_id}, {'$set': {'heartbeat': now}})
+
+    @staticmethod
+    def finish(job_id, status, progress, error=None):
+        """
+        Segna un job come terminato ('completed' o 'failed').
+        """
+        now = datetime.now(timezone.utc)
+        mongo.db.scan_jobs.update_one({'_id': job_id}, {'$set': {
+            'status': status,
+            'progress': progress,
+            'error': error,
+            'updated_at': now,
+            'finished_at': now
+        }})
+
+    @staticmethod
+    def get(job_id):
+        """
+        Recupera un job di scansione dato il suo ID.
+
+        :return: Documento del job, o None se non esiste
+        """
+        return mongo.db.scan_jobs.find_one({'_id': job_id})
+
+    @staticmethod
+    def get_running():
+        """
+        Restituisce il job che detiene il lock delle scansioni, se presente.
+        """
+        lock = mongo.db.locks.find_one({'_id': ScanJob.LOCK_ID})
+        if lock and lock.get('job_id'):
+            return ScanJob.get(lock['job_id'])
+        return None
+
+    @staticmethod
+    def get_last_finished_at():
+        """
+        Restituisce la data di fine dell'ultima scansione completata, o None.
+        """
+        job = mongo.db.scan_jobs.find_one({'status': 'completed'}, {'finished_at': 1}, sort=[('finished_at', -1)])
+        return job['finished_at'] if job else None
+
+    @staticmethod
+    def get_last_change():
+        """
+        Restituisce la data di fine dell'ultima scansione terminata, anche se fallita, o None.
+
+        Anche una scansione fallita può aver già modificato fumetti e capitoli.
+        """
+        job = mongo.db.scan_jobs.find_one({'finished_at': {'$ne': None}}, {'finished_at': 1}, sort=[('finished_at', -1)])
+        return job['finished_at'] if job else None
+
+    @staticmethod
+    def get_latest():
+        """
+        Restituisce il job di scansione avviato più di recente.
+        """
+        return mongo.db.scan_jobs.find_one(sort=[('started_at', -1)])
+
+class ReadingProgress:
+    @staticmethod
+    def ensure_indexes():
+        """
+        Crea l'indice usato dallo scaffale "continua a leggere", se non esiste già.
+        """
+        mongo.db.reading_progress.create_index([('updated_at', DESCENDING)])
+
+    @staticmethod
+    def upsert_op(comic_id, chapter_number, page_number, page_count, updated_at):
+        """
+        Operazione di bulk_write che registra l'ultima pagina letta di un fumetto.
+
+        Il filtro su updated_at impedisce a un aggiornamento più vecchio (es. arrivato
+        da un altro processo) di sovrascriverne uno più recente: in quel caso l'upsert
+        fallisce con una chiave duplicata, che il chiamante può ignorare.
+
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :param page_number: Numero della pagina
+        :param page_count: Numero di pagine del capitolo
+        :param updated_at: Data della lettura
+        """
+        return UpdateOne(
+            {'_id': ObjectId(comic_id), 'updated_at': {'$lt': updated_at}},
+            {'$set': {
+                'chapter_number': chapter_number,
+                'page_number': page_number,
+                'page_count': page_count,
+                'updated_at': updated_at
+            }},
+            upsert=True
+        )
+
+    @staticmethod
+    def bulk_write(operations):
+        """
+        Esegue un gruppo di operazioni indipendenti sulla collezione dei progressi di lettura.
+
+        :param operations: Lista di operazioni pymongo
+        :return: BulkWriteResult
+        """
+        return mongo.db.reading_progress.bulk_write(operations, ordered=False)
+
+    @staticmethod
+    def get(comic_id):
+        """
+        Restituisce il progresso di lettura di un fumetto, o None se non è mai stato letto.
+        """
+        return mongo.db.reading_progress.find_one({'_id': ObjectId(comic_id)})
+
+    @staticmethod
+    def list_recent(limit):
+        """
+        Restituisce i progressi di lettura più recenti.
+
+        :param limit: Numero massimo di fumetti
+        :return: Lista dei progressi, dal più recente
+        """
+        return list(mongo.db.reading_progress.find().sort('updated_at', DESCENDING).limit(limit))
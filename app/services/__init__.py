@@ -2,5 +2,7 @@
 
 from .scanner import ComicScanner
 from .comic_service import ComicService
+from .scan_jobs import ScanJobManager, scan_job_manager
+from .search import SearchIndex, search_index
 
 # Qui potresti aggiungere altre importazioni o inizializzazioni necessarie per il modulo services
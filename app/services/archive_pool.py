@@ -0,0 +1,111 @@
+# app/services/archive_pool.py
+
+import threading
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+import rarfile
+from .metrics import span
+
+class ArchivePool:
+    def __init__(self, max_size=16):
+        """
+        Pool LRU di archivi ZIP/RAR aperti, indicizzati per percorso e mtime.
+
+        Ogni handle è prestato a un solo thread alla volta: ZipFile non protegge il
+        conteggio dei membri aperti (open() e la chiusura dei membri non prendono il
+        suo lock), quindi due letture concorrenti sullo stesso handle possono
+        chiuderne il file mentre è ancora nel pool. Le richieste concorrenti sullo
+        stesso archivio aprono handle distinti, che al rilascio tornano nel pool come
+        handle liberi per quella chiave.
+
+        :param max_size: Numero massimo di handle liberi tenuti aperti
+        """
+        self.max_size = max_size
+        # Handle liberi: (percorso, mtime) -> lista di archivi aperti, dalla chiave usata meno di recente
+        self._idle = OrderedDict()
+        self._idle_count = 0
+        # Incrementata da clear(): gli handle prestati prima vengono chiusi al rilascio
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def open(self, path, mtime):
+        """
+        Restituisce un archivio aperto per il percorso dato, riusando un handle libero del pool se presente.
+
+        :param path: Percorso dell'archivio
+        :param mtime: Data di modifica dell'archivio, usata per invalidare gli handle obsoleti
+        :return: Context manager che produce lo ZipFile o il RarFile aperto, in uso esclusivo
+        """
+        archive, generation = self._acquire(path, mtime)
+        try:
+            yield archive
+        finally:
+            self._release((path, mtime), archive, generation)
+
+    def clear(self):
+        """
+        Chiude gli archivi liberi e svuota il pool; quelli in uso vengono chiusi al rilascio.
+        """
+        with self._lock:
+            to_close = [archive for archives in self._idle.values() for archive in archives]
+            self._idle.clear()
+            self._idle_count = 0
+            self._generation += 1
+        for archive in to_close:
+            archive.close()
+
+    def _acquire(self, path, mtime):
+        key = (path, mtime)
+        to_close = []
+        with self._lock:
+            generation = self._generation
+            archives = self._idle.get(key)
+            if archives:
+                archive = archives.pop()
+                self._idle_count -= 1
+                if archives:
+                    self._idle.move_to_end(key)
+                else:
+                    del self._idle[key]
+                return archive, generation
+            # Un archivio modificato rende obsoleti gli handle liberi con mtime diverso
+            for stale_key in [k for k in self._idle if k[0] == path]:
+                stale = self._idle.pop(stale_key)
+                self._idle_count -= len(stale)
+                to_close.extend(stale)
+
+        for stale in to_close:
+            stale.close()
+        # Apertura fuori dal lock: con i RAR può richiedere un processo esterno
+        with span('archive_open'):
+            return self._open_archive(path), generation
+
+    def _release(self, key, archive, generation):
+        to_close = []
+        with self._lock:
+            # Handle aperti prima di clear() o su un archivio che nel frattempo è cambiato
+            stale = generation != self._generation or any(k[0] == key[0] and k != key for k in self._idle)
+            if stale:
+                to_close.append(archive)
+            else:
+                self._idle.setdefault(key, []).append(archive)
+                self._idle.move_to_end(key)
+                self._idle_count += 1
+                while self._idle_count > self.max_size:
+                    oldest_key, oldest = next(iter(self._idle.items()))
+                    to_close.append(oldest.pop(0))
+                    self._idle_count -= 1
+                    if not oldest:
+                        del self._idle[oldest_key]
+        for stale_archive in to_close:
+            stale_archive.close()
+
+    @staticmethod
+    def _open_archive(path):
+        if path.lower().endswith(('.cbz', '.zip')):
+            return zipfile.ZipFile(path, 'r')
+        elif path.lower().endswith(('.cbr', '.rar')):
+            return rarfile.RarFile(path, 'r')
+        raise ValueError(f"Formato di archivio non supportato: {path}")
@@ -1,9 +1,38 @@
+import contextvars
 import os
-from flask import abort
 from io import BytesIO
-import zipfile
-import rarfile
+from PIL import Image
+from app import app
+from imaging import VARIANT_FORMATS, make_sprite, make_thumbnail, make_variant
 from app.models import Comic, Chapter
+from app.utils import build_page_index, chapter_stat, chapter_version, get_mimetype
+from .archive_pool import ArchivePool
+from .executors import BoundedExecutor
+from .metrics import GaugeCallback, registry, span
+from .metadata_cache import metadata_cache
+from .derivative_cache import DerivativeCache
+from .page_stream import CHUNK_SIZE, FileWindow, PageContent, frame_header, iter_archive_member
+from .prefetch import PageByteCache, Prefetcher
+from .rar_cache import RarAccelerator, is_rar
+from .shared_cache import SharedPageCache
+from .transcode import TranscodePool
+
+# Byte letti dall'inizio di una pagina per ricavarne le dimensioni dall'intestazione
+PAGE_HEADER_BYTES = 64 * 1024
+
+archive_pool = ArchivePool(app.config['ARCHIVE_POOL_SIZE'])
+# Con più worker la cache delle pagine decompresse è condivisa in memoria (tmpfs), con un unico limite per l'host
+if app.config['SHARED_PAGE_CACHE']:
+    page_cache = SharedPageCache(app.config['SHARED_PAGE_CACHE_FOLDER'], app.config['PREFETCH_CACHE_BYTES'])
+else:
+    page_cache = PageByteCache(app.config['PREFETCH_CACHE_BYTES'])
+derivative_cache = DerivativeCache(app.config['DERIVATIVE_CACHE_FOLDER'], app.config['DERIVATIVE_CACHE_MAX_BYTES'])
+transcode_pool = TranscodePool(app.config['TRANSCODE_WORKERS'], app.config['TRANSCODE_QUEUE'], app.config['TRANSCODE_TIMEOUT'])
+page_io_executor = BoundedExecutor('page-io', app.config['PAGE_IO_WORKERS'], app.config['PAGE_IO_QUEUE'], app.config['PAGE_IO_TIMEOUT'])
+rar_accelerator = RarAccelerator(
+    app.config['RAR_ACCELERATION'],
+    DerivativeCache(app.config['RAR_CACHE_FOLDER'], app.config['RAR_CACHE_MAX_BYTES'])
+)
 
 class ComicService:
     @staticmethod
@@ -16,76 +45,720 @@ class ComicService:
         :param page_number: Numero della pagina
         :return: Tuple contenente i dati dell'immagine e il mimetype
         """
-        # Recupera il fumetto e il capitolo dal database
-        comic = Comic.get_by_id(comic_id)
-        chapter = Chapter.find_by_number(comic_id, chapter_number)
+        content = ComicService.get_page_content(comic_id, chapter_number, page_number)
+        return content.read(), content.mimetype
+
+    @staticmethod
+    def get_page_content(comic_id, chapter_number, page_number):
+        """
+        Prepara una pagina per lo streaming senza caricarla interamente in memoria.
+
+        Le immagini sciolte e i membri STORED dei CBZ vengono letti direttamente dal
+        file all'offset indicato nell'indice; i membri compressi e i RAR vengono
+        decompressi a blocchi.
+
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :param page_number: Numero della pagina
+        :return: PageContent con la sorgente dei byte della pagina
+        """
+        chapter, chapter_path, mtime = ComicService._resolve_chapter(comic_id, chapter_number)
+        page = ComicService._get_page_entry(chapter, chapter_path, mtime, page_number)
+
+        # Pagina già decompressa dalla lettura anticipata
+        cached = ComicService._cached_page(chapter_path, mtime, page_number, page)
+        if cached is not None:
+            return cached
+
+        return ComicService._open_entry(chapter, chapter_path, mtime, page)
+
+    @staticmethod
+    def load_page_content(comic_id, chapter_number, page_number):
+        """
+        Come get_page_content, ma nel pool limitato di I/O e con la lettura già avviata.
+
+        Un archivio lento (es. un RAR estratto da unrar) occupa un thread del pool
+        invece di quello della richiesta, e oltre PAGE_IO_TIMEOUT secondi la richiesta
+        smette di attenderlo.
+
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :param page_number: Numero della pagina
+        :return: PageContent con la sorgente dei byte della pagina
+        :raises ExecutorBusy: Se il pool è saturo
+        :raises ExecutorTimeout: Se la pagina non è pronta in tempo
+        """
+        def load():
+            with span('page_open'):
+                return ComicService.get_page_content(comic_id, chapter_number, page_number).prime()
+
+        return ComicService._run_io(load)
+
+    @staticmethod
+    def _run_io(func, *args):
+        """
+        Esegue func(*args) nel pool limitato di I/O delle pagine e ne attende il risultato.
+
+        :raises ExecutorBusy: Se il pool è saturo
+        :raises ExecutorTimeout: Se il risultato non arriva entro PAGE_IO_TIMEOUT secondi
+        """
+        def run():
+            with app.app_context():
+                return func(*args)
+
+        # Il contesto copiato porta con sé le fasi della richiesta corrente
+        return page_io_executor.run(contextvars.copy_context().run, run)
+
+    @staticmethod
+    def get_page_range(comic_id, chapter_number, start, count, width=None, fmt=None):
+        """
+        Prepara l'invio di un intervallo contiguo di pagine in un'unica risposta.
+
+        Il capitolo viene risolto una sola volta e le pagine lette in ordine. Le
+        letture dall'archivio avvengono nel pool limitato di I/O, come per le pagine
+        singole; la prima pagina viene preparata subito, così un pool saturo o un
+        capitolo troppo lento rispondono 503/504 invece di una risposta interrotta.
+        Le varianti vengono tutte convertite prima di iniziare la risposta: se una
+        conversione fallisce l'intervallo si ferma alle pagine già pronte.
+        Il formato dei frame è descritto in page_stream.frame_header.
+
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :param start: Prima pagina dell'intervallo
+        :param count: Numero di pagine richieste (ridotto se supera la fine del capitolo)
+        :param width: Larghezza delle varianti (vedi get_page_variant), o None
+        :param fmt: Formato delle varianti, o None per le pagine originali
+        :return: Tuple (iteratore dei blocchi della risposta, numero di pagine incluse,
+                 True se l'intervallo è stato ridotto per un errore)
+        :raises ExecutorBusy: Se il pool è saturo
+        :raises ExecutorTimeout: Se la prima pagina non è pronta in tempo
+        """
+        chapter, chapter_path, mtime = ComicService._resolve_chapter(comic_id, chapter_number)
+        pages = ComicService._get_page_index(chapter, chapter_path, mtime)
+        if not 0 <= start < len(pages):
+            raise FileNotFoundError("Pagina non trovata")
+        stop = min(start + count, len(pages))
+        if width is not None or fmt is not None:
+            variants = ComicService._prepare_variant_range(chapter, chapter_path, mtime, start, stop, width, fmt)
+            chunks = ComicService._iter_variant_range(start, variants)
+            return chunks, len(variants), start + len(variants) < stop
+        first = ComicService._run_io(ComicService._load_range_page, chapter, chapter_path, mtime, pages, start)
+        chunks = ComicService._iter_page_range(chapter, chapter_path, mtime, pages, start, stop, first)
+        return chunks, stop - start, False
+
+    @staticmethod
+    def _iter_page_range(chapter, chapter_path, mtime, pages, start, stop, first):
+        """
+        Generatore dei frame delle pagine [start, stop) di un capitolo già risolto.
+
+        Le intestazioni della risposta sono già state inviate: se una pagina
+        successiva alla prima non si riesce a preparare la risposta termina al
+        frame precedente, e il lettore chiede le pagine mancanti una per una.
+
+        :param first: PageContent della pagina start, già preparato
+        """
+        content = first
+        try:
+            for page_number in range(start, stop):
+                if content is None:
+                    try:
+                        content = ComicService._run_io(ComicService._load_range_page, chapter, chapter_path, mtime, pages, page_number)
+                    except Exception as e:
+                        app.logger.warning("Intervallo di %s interrotto alla pagina %s: %s", chapter_path, page_number, e)
+                        return
+                yield frame_header(page_number, content.mimetype, content.size)
+                yield from content.iter_chunks()
+                content = None
+        finally:
+            if content is not None and content.file is not None:
+                content.file.close()
+
+    @staticmethod
+    def _load_range_page(chapter, chapter_path, mtime, pages, page_number):
+        """
+        Prepara una pagina di un intervallo, da eseguire nel pool di I/O.
+
+        I file e i membri STORED vengono solo aperti; le pagine da decomprimere
+        vengono lette per intero qui, così durante l'invio il thread della richiesta
+        copia solo byte già pronti.
+
+        :return: PageContent con la dimensione effettiva della pagina
+        """
+        page = pages[page_number]
+        if not chapter['is_archive']:
+            image_file = open(os.path.join(chapter_path, page['name']), 'rb')
+            # L'immagine può essere stata sovrascritta dopo il calcolo della versione: conta la dimensione attuale
+            return PageContent(page['mimetype'], os.fstat(image_file.fileno()).st_size, file=image_file)
+
+        cached = ComicService._cached_page(chapter_path, mtime, page_number, page)
+        if cached is not None:
+            return cached
+        content = ComicService._open_entry(chapter, chapter_path, mtime, page)
+        if content.chunks is None:
+            return content
+        with span('decompress'):
+            data = content.read()
+        return PageContent(content.mimetype, len(data), file=BytesIO(data))
+
+    @staticmethod
+    def _prepare_variant_range(chapter, chapter_path, mtime, start, stop, width, fmt):
+        """
+        Converte le varianti delle pagine [start, stop) e ne apre i file, prima dell'invio.
+
+        Gli errori della prima pagina vengono sollevati (503/504 se il pool è saturo
+        o lento); per le successive l'intervallo si ferma all'ultima pagina pronta.
+
+        :return: Lista di tuple (file aperto della variante, mimetype), dalla pagina start
+        """
+        variant_path, mimetype = ComicService._get_variant(chapter, chapter_path, mtime, start, width, fmt)
+        variants = [(open(variant_path, 'rb'), mimetype)]
+        for page_number in range(start + 1, stop):
+            try:
+                variant_path, mimetype = ComicService._get_variant(chapter, chapter_path, mtime, page_number, width, fmt)
+                variants.append((open(variant_path, 'rb'), mimetype))
+            except Exception as e:
+                app.logger.warning("Intervallo di %s ridotto alla pagina %s: %s", chapter_path, page_number, e)
+                break
+        return variants
+
+    @staticmethod
+    def _iter_variant_range(start, variants):
+        """
+        Generatore dei frame delle varianti già pronte di un intervallo, a partire dalla pagina start.
+
+        :param variants: Lista restituita da _prepare_variant_range
+        """
+        try:
+            for page_number, (variant_file, mimetype) in enumerate(variants, start):
+                yield frame_header(page_number, mimetype, os.fstat(variant_file.fileno()).st_size)
+                yield from iter(lambda: variant_file.read(CHUNK_SIZE), b'')
+        finally:
+            for variant_file, _ in variants:
+                variant_file.close()
+
+    @staticmethod
+    def get_page_width(comic_id, chapter_number):
+        """
+        Restituisce la larghezza in pixel della prima pagina di un capitolo, letta dalla sola intestazione dell'immagine.
+
+        Le pagine di un capitolo hanno di solito la stessa larghezza: il lettore la usa
+        per chiedere una variante solo quando è davvero più stretta della pagina.
+
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :return: Larghezza in pixel, o None se non si riesce a leggerla
+        """
+        try:
+            chapter, chapter_path, mtime = ComicService._resolve_chapter(comic_id, chapter_number)
+
+            def load():
+                return ComicService._run_io(ComicService._read_page_width, chapter, chapter_path, mtime)
+
+            return metadata_cache.get_or_load(('page_width', chapter_path, mtime), load)
+        except Exception as e:
+            app.logger.debug("Larghezza delle pagine del capitolo %s di %s non disponibile: %s", chapter_number, comic_id, e)
+            return None
+
+    @staticmethod
+    def _read_page_width(chapter, chapter_path, mtime):
+        """
+        Legge la larghezza della prima pagina dai primi PAGE_HEADER_BYTES byte, senza decodificarla.
+        """
+        head = bytearray()
+        chunks = ComicService._open_page(chapter, chapter_path, mtime, 0).iter_chunks()
+        try:
+            for chunk in chunks:
+                head += chunk
+                if len(head) >= PAGE_HEADER_BYTES:
+                    break
+        finally:
+            chunks.close()
+        with Image.open(BytesIO(head)) as image:
+            return image.width
+
+    @staticmethod
+    def get_page_variant(comic_id, chapter_number, page_number, width=None, fmt=None):
+        """
+        Restituisce una versione ridimensionata e/o convertita di una pagina, generandola se necessario.
+
+        La larghezza viene arrotondata per eccesso alla più vicina di PAGE_VARIANT_WIDTHS,
+        così il numero di varianti in cache resta limitato; oltre la più grande si
+        mantiene la risoluzione originale (i controller inviano allora la pagina originale).
+
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :param page_number: Numero della pagina
+        :param width: Larghezza desiderata in pixel, o None
+        :param fmt: Formato di uscita (chiave di VARIANT_FORMATS), o None per JPEG
+        :return: Tuple (percorso del file della variante, mimetype)
+        """
+        chapter, chapter_path, mtime = ComicService._resolve_chapter(comic_id, chapter_number)
+        return ComicService._get_variant(chapter, chapter_path, mtime, page_number, width, fmt)
+
+    @staticmethod
+    def _get_variant(chapter, chapter_path, mtime, page_number, width, fmt):
+        """
+        Restituisce la variante di una pagina di un capitolo già risolto.
+
+        Le varianti sono salvate nella cache dei derivati con chiave percorso del
+        capitolo, pagina, mtime, larghezza, formato e qualità; la conversione gira
+        nel pool di processi.
+        """
+        fmt = fmt or 'jpeg'
+        if fmt not in VARIANT_FORMATS:
+            raise ValueError("Formato non supportato")
+        width = ComicService._variant_width(width)
+        quality = app.config['PAGE_VARIANT_QUALITY']
+        key = DerivativeCache.make_key(f'{chapter_path}#{page_number}', mtime, f'page:w{width or 0}:{fmt}:q{quality}')
+        _, mimetype, extension = VARIANT_FORMATS[fmt]
+
+        def render():
+            # La lettura della pagina sorgente occupa il pool di I/O, non il thread della richiesta
+            image_data = ComicService._run_io(ComicService._read_page, chapter, chapter_path, mtime, page_number)
+            with span('image'):
+                return transcode_pool.run(make_variant, image_data, width, fmt, quality)
+
+        return derivative_cache.get_or_create(key, extension, render), mimetype
+
+    @staticmethod
+    def _variant_width(width):
+        """
+        Arrotonda una larghezza richiesta alla più piccola di PAGE_VARIANT_WIDTHS che la contiene.
+
+        :param width: Larghezza richiesta, o None
+        :return: Larghezza della variante, o None per la risoluzione originale
+        """
+        if width is None:
+            return None
+        if width <= 0:
+            raise ValueError("Larghezza non valida")
+        for allowed in sorted(app.config['PAGE_VARIANT_WIDTHS']):
+            if width <= allowed:
+                return allowed
+        return None
+
+    @staticmethod
+    def _read_page(chapter, chapter_path, mtime, page_number):
+        """
+        Legge in memoria una pagina di un capitolo già risolto, usando la cache della lettura anticipata.
+        """
+        page = ComicService._get_page_entry(chapter, chapter_path, mtime, page_number)
+        cached = ComicService._cached_page(chapter_path, mtime, page_number, page)
+        if cached is not None:
+            return cached.read()
+        with span('decompress'):
+            return ComicService._open_entry(chapter, chapter_path, mtime, page).read()
+
+    @staticmethod
+    def _cached_page(chapter_path, mtime, page_number, page):
+        """
+        Restituisce la pagina dalla cache delle pagine decompresse, o None.
+
+        Le pagine leggibili direttamente dal file (immagini sciolte e membri STORED)
+        non vengono mai messe in cache: per loro la cache non viene consultata, così
+        le letture non trovate contano solo le pagine che potrebbero esserci.
+        """
+        if page['stored']:
+            return None
+        return page_cache.open((chapter_path, mtime, page_number))
+
+    @staticmethod
+    def prefetch_pages(reader, comic_id, chapter_number, page_number, width=None, fmt=None):
+        """
+        Programma la lettura anticipata delle pagine che seguono quella appena servita.
+
+        Se il lettore sta ricevendo varianti vengono preparate le stesse varianti.
+
+        :param reader: Chiave che identifica il lettore
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :param page_number: Pagina appena servita
+        :param width: Larghezza delle varianti richieste dal lettore, o None
+        :param fmt: Formato delle varianti richieste dal lettore, o None per le pagine originali
+        """
+        resolved = ComicService.get_chapter(comic_id, chapter_number)
+        if resolved is not None:
+            variant = (width, fmt) if width is not None or fmt is not None else ()
+            page_prefetcher.schedule(reader, comic_id, resolved['chapter'], page_number, resolved['next'], variant)
+
+    @staticmethod
+    def prefetch_page(comic_id, chapter_number, page_number, width=None, fmt=None):
+        """
+        Prepara una pagina prima che venga richiesta.
+
+        Le varianti vengono convertite nella cache dei derivati. Delle pagine originali,
+        quelle compresse vengono decompresse nella cache delle pagine; per quelle
+        leggibili direttamente dal file (immagini sciolte e membri STORED) basta
+        chiedere al sistema operativo di caricarle nella page cache.
+
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :param page_number: Numero della pagina
+        :param width: Larghezza della variante, o None
+        :param fmt: Formato della variante, o None per la pagina originale
+        """
+        chapter, chapter_path, mtime = ComicService._resolve_chapter(comic_id, chapter_number)
+        if width is not None or fmt is not None:
+            ComicService._get_variant(chapter, chapter_path, mtime, page_number, width, fmt)
+            return
+
+        key = (chapter_path, mtime, page_number)
+        if key in page_cache:
+            return
+
+        page = ComicService._get_page_entry(chapter, chapter_path, mtime, page_number)
+        if page['stored']:
+            path = chapter_path if chapter['is_archive'] else os.path.join(chapter_path, page['name'])
+            if hasattr(os, 'posix_fadvise'):
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.posix_fadvise(fd, page['offset'], page['file_size'], os.POSIX_FADV_WILLNEED)
+                finally:
+                    os.close(fd)
+            return
+
+        content = ComicService._open_page(chapter, chapter_path, mtime, page_number)
+        page_cache.put(key, content.read(), content.mimetype)
+
+    @staticmethod
+    def get_cover(comic_id, chapter_number, size):
+        """
+        Restituisce la miniatura della prima pagina di un capitolo, generandola se necessario.
+
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :param size: Nome della dimensione, una delle chiavi di THUMBNAIL_SIZES
+        :return: Percorso del file JPEG della miniatura
+        """
+        chapter, chapter_path, mtime = ComicService._resolve_chapter(comic_id, chapter_number)
+        return ComicService.get_chapter_cover(chapter, chapter_path, mtime, size)
+
+    @staticmethod
+    def get_chapter_cover(chapter, chapter_path, mtime, size):
+        """
+        Restituisce la miniatura della prima pagina di un capitolo già risolto.
+
+        La miniatura è salvata nella cache dei derivati con chiave percorso del
+        capitolo, mtime e dimensione: viene rigenerata solo se il capitolo cambia.
+
+        :param chapter: Documento del capitolo
+        :param chapter_path: Percorso dell'archivio o della directory del capitolo
+        :param mtime: Data di modifica del capitolo
+        :param size: Nome della dimensione, una delle chiavi di THUMBNAIL_SIZES
+        :return: Percorso del file JPEG della miniatura
+        """
+        width = app.config['THUMBNAIL_SIZES'][size]
+        quality = app.config['THUMBNAIL_QUALITY']
+        key = ComicService._cover_key(chapter_path, mtime, size)
+
+        def render():
+            with span('decompress'):
+                image_data = ComicService._open_page(chapter, chapter_path, mtime, 0).read()
+            with span('image'):
+                return transcode_pool.run(make_thumbnail, image_data, width, quality)
+
+        return derivative_cache.get_or_create(key, 'jpg', render)
+
+    @staticmethod
+    def _cover_key(chapter_path, mtime, size):
+        """
+        Chiave nella cache dei derivati della miniatura di un capitolo.
+        """
+        width = app.config['THUMBNAIL_SIZES'][size]
+        quality = app.config['THUMBNAIL_QUALITY']
+        return DerivativeCache.make_key(f'{chapter_path}#0', mtime, f'thumb:w{width}:q{quality}')
+
+    @staticmethod
+    def build_series_cover(comic_id):
+        """
+        Genera la miniatura di copertina di una serie (prima pagina del primo capitolo), una volta sola.
+
+        Il riferimento alla miniatura viene salvato sul fumetto, così la griglia della
+        libreria può comporre gli sprite senza cercare capitoli né decodificare pagine.
+
+        La miniatura viene registrata come None solo se la serie non ha una prima
+        pagina; se la generazione fallisce (archivio ancora in copia, pool saturo,
+        disco pieno...) quella registrata viene rimossa, così la serie torna alla
+        copertina singola e viene ritentata dalla scansione successiva o da build-covers.
+
+        :param comic_id: ID del fumetto
+        :return: Operazione di bulk_write che registra o rimuove la miniatura
+        """
+        size = app.config['SERIES_COVER_SIZE']
+        try:
+            comic = Comic.get_by_id(comic_id)
+            chapter = None
+            if comic.get('cover_chapter') is not None:
+                chapter = Chapter.find_by_number(comic_id, comic['cover_chapter'])
+            if chapter is None or not chapter['page_count']:
+                return Comic.cover_thumb_op(comic_id, None)
+
+            chapter_path = os.path.join(comic['path'], chapter['filename'])
+            mtime = chapter.get('mtime') or chapter_stat(chapter_path, chapter['is_archive'])[1]
+            thumbnail_path = ComicService.get_chapter_cover(chapter, chapter_path, mtime, size)
+            with Image.open(thumbnail_path) as thumbnail:
+                width, height = thumbnail.size
+        except Exception as e:
+            app.logger.warning("Impossibile generare la copertina della serie %s, verrà ritentata: %s", comic_id, e)
+            return Comic.unset_cover_thumb_op(comic_id)
+        return Comic.cover_thumb_op(comic_id, {
+            'key': ComicService._cover_key(chapter_path, mtime, size),
+            'width': width,
+            'height': height
+        })
+
+    @staticmethod
+    def sprite_version(comics):
+        """
+        Versione dello sprite delle copertine di una pagina della libreria, o None se nessun fumetto ha la miniatura.
+
+        Cambia quando cambia una delle miniature o l'ordine dei fumetti.
+
+        :param comics: Fumetti della pagina, con il campo cover_thumb
+        """
+        keys = [comic['cover_thumb']['key'] for comic in comics if comic.get('cover_thumb')]
+        if not keys:
+            return None
+        layout = f"sprite:{app.config['SPRITE_CELL_WIDTH']}x{app.config['SPRITE_CELL_HEIGHT']}:c{app.config['SPRITE_COLUMNS']}"
+        return DerivativeCache.make_key('|'.join(keys), '', layout)[:16]
+
+    @staticmethod
+    def get_cover_sprite(comics):
+        """
+        Restituisce lo sprite con le copertine di una pagina della libreria, componendolo se necessario.
+
+        Le celle seguono l'ordine dei fumetti che hanno la miniatura; una miniatura
+        eliminata dalla cache dei derivati viene rigenerata dal capitolo.
+
+        :param comics: Fumetti della pagina, con il campo cover_thumb
+        :return: Percorso del file JPEG dello sprite
+        """
+        members = [comic for comic in comics if comic.get('cover_thumb')]
+        size = app.config['SERIES_COVER_SIZE']
+
+        def render():
+            images_data = []
+            for comic in members:
+                thumbnail_path = derivative_cache.get(comic['cover_thumb']['key'], 'jpg')
+                if thumbnail_path is None:
+                    thumbnail_path = ComicService.get_cover(comic['_id'], comic['cover_chapter'], size)
+                with open(thumbnail_path, 'rb') as thumbnail:
+                    images_data.append(thumbnail.read())
+            with span('image'):
+                return transcode_pool.run(
+                    make_sprite, images_data, app.config['SPRITE_CELL_WIDTH'], app.config['SPRITE_CELL_HEIGHT'],
+                    app.config['SPRITE_COLUMNS'], app.config['THUMBNAIL_QUALITY']
+                )
+
+        return derivative_cache.get_or_create(ComicService.sprite_version(members), 'jpg', render)
+
+    @staticmethod
+    def warm_covers(comic_path, chapters, sizes=None):
+        """
+        Genera in anticipo le miniature dei capitoli appena scansionati.
+
+        :param comic_path: Percorso della directory del fumetto
+        :param chapters: Documenti dei capitoli
+        :param sizes: Nomi delle dimensioni da generare (default: COVER_THUMBNAIL_SIZE)
+        """
+        sizes = sizes or [app.config['COVER_THUMBNAIL_SIZE']]
+        for chapter in chapters:
+            if not chapter['page_count']:
+                continue
+            chapter_path = os.path.join(comic_path, chapter['filename'])
+            for size in sizes:
+                try:
+                    ComicService.get_chapter_cover(chapter, chapter_path, chapter['mtime'], size)
+                except Exception as e:
+                    app.logger.warning("Impossibile generare la miniatura di %s: %s", chapter_path, e)
+
+    @staticmethod
+    def get_comic(comic_id):
+        """
+        Restituisce il documento di un fumetto, usando la cache dei metadati.
+
+        :param comic_id: ID del fumetto
+        :return: Documento del fumetto (solleva 404 se non esiste)
+        """
+        def load():
+            with span('mongo'):
+                return Comic.get_by_id(comic_id)
+
+        return metadata_cache.get_or_load(('comic', str(comic_id)), load)
+
+    @staticmethod
+    def get_chapter(comic_id, chapter_number):
+        """
+        Restituisce un capitolo con i suoi vicini e la sua posizione, usando la cache dei metadati.
+
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :return: Dizionario con 'chapter', 'prev', 'next' e 'position', o None se il capitolo non esiste
+        """
+        def load():
+            with span('mongo'):
+                chapter = Chapter.find_by_number(comic_id, chapter_number)
+                if chapter is None:
+                    return None
+                prev, next = Chapter.find_neighbours(comic_id, chapter_number)
+                return {
+                    'chapter': chapter,
+                    'prev': prev,
+                    'next': next,
+                    'position': Chapter.count_before(comic_id, chapter_number)
+                }
 
-        if not chapter:
+        return metadata_cache.get_or_load(('chapter', str(comic_id), chapter_number), load)
+
+    @staticmethod
+    def get_chapter_version(comic_id, chapter_number):
+        """
+        Restituisce la versione attuale di un capitolo senza aprirlo: bastano i metadati in cache
+        e una stat (dell'archivio, o delle immagini di una directory).
+
+        Corrisponde al parametro ?v= degli URL versionati finché il file non cambia
+        rispetto all'ultima scansione.
+
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :return: Tuple (versione, mtime)
+        """
+        chapter, chapter_path = ComicService._locate_chapter(comic_id, chapter_number)
+        size, mtime = chapter_stat(chapter_path, chapter.get('is_archive'))
+        return chapter_version(size, mtime), mtime
+
+    @staticmethod
+    def _locate_chapter(comic_id, chapter_number):
+        """
+        Recupera il capitolo (dalla cache dei metadati) e il suo percorso su disco.
+
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :return: Tuple (capitolo, percorso del capitolo)
+        """
+        comic = ComicService.get_comic(comic_id)
+        resolved = ComicService.get_chapter(comic_id, chapter_number)
+
+        if resolved is None:
             raise FileNotFoundError("Capitolo non trovato")
 
+        chapter = resolved['chapter']
+        return chapter, os.path.join(comic['path'], chapter['filename'])
+
+    @staticmethod
+    def _resolve_chapter(comic_id, chapter_number):
+        """
+        Recupera il capitolo (dalla cache dei metadati) e ne calcola percorso e data di modifica attuale.
+
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :return: Tuple (capitolo, percorso del capitolo, mtime)
+        """
+        chapter, chapter_path = ComicService._locate_chapter(comic_id, chapter_number)
+        _, mtime = chapter_stat(chapter_path, chapter['is_archive'])
+        return chapter, chapter_path, mtime
+
+    @staticmethod
+    def _open_page(chapter, chapter_path, mtime, page_number):
+        """
+        Prepara lo streaming di una pagina di un capitolo già risolto.
+
+        :param chapter: Documento del capitolo
+        :param chapter_path: Percorso dell'archivio o della directory del capitolo
+        :param mtime: Data di modifica del capitolo
+        :param page_number: Numero della pagina
+        :return: PageContent con la sorgente dei byte della pagina
+        """
+        page = ComicService._get_page_entry(chapter, chapter_path, mtime, page_number)
+        return ComicService._open_entry(chapter, chapter_path, mtime, page)
+
+    @staticmethod
+    def _open_entry(chapter, chapter_path, mtime, page):
+        """
+        Prepara lo streaming di una pagina di cui si ha già la voce dell'indice.
+
+        :param chapter: Documento del capitolo
+        :param chapter_path: Percorso dell'archivio o della directory del capitolo
+        :param mtime: Data di modifica del capitolo
+        :param page: Voce dell'indice della pagina
+        :return: PageContent con la sorgente dei byte della pagina
+        """
         # Controlla se il capitolo è un archivio o una cartella
         if chapter['is_archive']:
-            archive_path = os.path.join(comic['path'], chapter['filename'])
-            return ComicService._get_image_from_archive(archive_path, page_number)
+            return ComicService._get_image_from_archive(chapter_path, mtime, page)
         else:
-            chapter_path = os.path.join(comic['path'], chapter['filename'])
-            return ComicService._get_image_from_directory(chapter_path, page_number)
+            return ComicService._get_image_from_directory(chapter_path, page)
 
     @staticmethod
-    def _get_image_from_archive(archive_path, page_number):
+    def _get_page_index(chapter, chapter_path, mtime):
         """
-        Recupera un'immagine da un archivio zip o rar.
+        Restituisce l'indice delle pagine del capitolo.
 
-        :param archive_path: Percorso dell'archivio
+        L'indice salvato dallo scanner viene usato solo se il capitolo non è stato
+        modificato dopo la scansione; altrimenti viene ricostruito al volo.
+
+        :param chapter: Documento del capitolo
+        :param chapter_path: Percorso dell'archivio o della directory del capitolo
+        :param mtime: Data di modifica attuale del capitolo
+        :return: Lista ordinata delle voci delle pagine
+        """
+        pages = chapter.get('pages')
+        if pages is None or chapter.get('mtime') != mtime:
+            with span('archive_list'):
+                pages = build_page_index(chapter_path, chapter['is_archive'])
+        return pages
+
+    @staticmethod
+    def _get_page_entry(chapter, chapter_path, mtime, page_number):
+        """
+        Restituisce la voce dell'indice delle pagine per la pagina richiesta.
+
+        :param chapter: Documento del capitolo
+        :param chapter_path: Percorso dell'archivio o della directory del capitolo
+        :param mtime: Data di modifica attuale del capitolo
         :param page_number: Numero della pagina da recuperare
-        :return: Tuple contenente i dati dell'immagine e il mimetype
+        :return: Dizionario con nome, offset, dimensioni e mimetype della pagina
         """
-        if archive_path.lower().endswith(('.cbz', '.zip')):
-            with zipfile.ZipFile(archive_path, 'r') as archive:
-                image_files = [f for f in archive.namelist() if f.lower().endswith(('jpg', 'jpeg', 'png', 'gif'))]
-                if 0 <= page_number < len(image_files):
-                    image_filename = image_files[page_number]
-                    image_data = archive.read(image_filename)
-                    mimetype = ComicService._get_mimetype(image_filename)
-                    return image_data, mimetype
-                else:
-                    raise FileNotFoundError("Pagina non trovata")
-        
-        elif archive_path.lower().endswith(('.cbr', '.rar')):
-            with rarfile.RarFile(archive_path, 'r') as archive:
-                image_files = [f for f in archive.namelist() if f.lower().endswith(('jpg', 'jpeg', 'png', 'gif'))]
-                if 0 <= page_number < len(image_files):
-                    image_filename = image_files[page_number]
-                    image_data = archive.read(image_filename)
-                    mimetype = ComicService._get_mimetype(image_filename)
-                    return image_data, mimetype
-                else:
-                    raise FileNotFoundError("Pagina non trovata")
-
-    @staticmethod
-    def _get_image_from_directory(chapter_path, page_number):
+        pages = ComicService._get_page_index(chapter, chapter_path, mtime)
+        if 0 <= page_number < len(pages):
+            return pages[page_number]
+        raise FileNotFoundError("Pagina non trovata")
+
+    @staticmethod
+    def _get_image_from_archive(archive_path, mtime, page):
+        """
+        Recupera un'immagine da un archivio zip o rar, riusando gli archivi già aperti.
+
+        Con RAR_ACCELERATION attiva le pagine dei RAR vengono lette dalla copia estratta nella cache.
+
+        :param archive_path: Percorso dell'archivio
+        :param mtime: Data di modifica dell'archivio
+        :param page: Voce dell'indice della pagina da recuperare
+        :return: PageContent della pagina
+        """
+        if page['stored'] and archive_path.lower().endswith(('.cbz', '.zip')):
+            window = FileWindow(archive_path, page['offset'], page['file_size'])
+            return PageContent(page['mimetype'], page['file_size'], file=window)
+
+        if rar_accelerator.enabled and is_rar(archive_path):
+            content = rar_accelerator.open_page(archive_path, mtime, page)
+            if content is not None:
+                return content
+
+        chunks = iter_archive_member(archive_pool, archive_path, mtime, page['name'])
+        return PageContent(page['mimetype'], page['file_size'], chunks=chunks)
+
+    @staticmethod
+    def _get_image_from_directory(chapter_path, page):
         """
         Recupera un'immagine da una directory di immagini.
 
         :param chapter_path: Percorso della directory del capitolo
-        :param page_number: Numero della pagina da recuperare
-        :return: Tuple contenente i dati dell'immagine e il mimetype
+        :param page: Voce dell'indice della pagina da recuperare
+        :return: PageContent della pagina
         """
-        valid_extensions = ('.jpg', '.jpeg', '.png', '.gif')
-        image_files = [f for f in os.listdir(chapter_path) if f.lower().endswith(valid_extensions)]
-        image_files.sort()  # Ordina i file per assicurare l'ordine corretto
-
-        if 0 <= page_number < len(image_files):
-            image_filename = image_files[page_number]
-            image_path = os.path.join(chapter_path, image_filename)
-            
-            # Leggi i dati dell'immagine
-            with open(image_path, 'rb') as image_file:
-                image_data = image_file.read()
-                mimetype = ComicService._get_mimetype(image_filename)
-                return image_data, mimetype
-        else:
-            raise FileNotFoundError("Pagina non trovata")
+        image_path = os.path.join(chapter_path, page['name'])
+        return PageContent(page['mimetype'], page['file_size'], path=image_path)
 
     @staticmethod
     def _get_mimetype(filename):
@@ -95,11 +768,27 @@ class ComicService:
         :param filename: Nome del file dell'immagine
         :return: Stringa del mimetype
         """
-        if filename.lower().endswith('.jpg') or filename.lower().endswith('.jpeg'):
-            return 'image/jpeg'
-        elif filename.lower().endswith('.png'):
-            return 'image/png'
-        elif filename.lower().endswith('.gif'):
-            return 'image/gif'
-        else:
-            return 'application/octet-stream'
+        return get_mimetype(filename)
+
+page_prefetcher = Prefetcher(
+    ComicService.prefetch_page,
+    app.config['PREFETCH_WORKERS'],
+    app.config['PREFETCH_DEPTH'],
+    app.config['PREFETCH_NEXT_CHAPTER_PAGES']
+)
+
+def _cache_counters(field):
+    caches = {
+        'metadata': metadata_cache.stats,
+        'pages': page_cache.stats
+    }
+    return lambda: [((name,), stats()[field]) for name, stats in caches.items()]
+
+registry.register(GaugeCallback(
+    'comic_vault_cache_hits_total', "Letture trovate nelle cache del processo", ('cache',), _cache_counters('hits'), 'counter'))
+registry.register(GaugeCallback(
+    'comic_vault_cache_misses_total', "Letture non trovate nelle cache del processo", ('cache',), _cache_counters('misses'), 'counter'))
+registry.register(GaugeCallback(
+    'comic_vault_cache_entries', "Voci nelle cache del processo", ('cache',), _cache_counters('entries')))
+registry.register(GaugeCallback(
+    'comic_vault_page_cache_bytes', "Byte delle pagine lette in anticipo in cache (per l'host se condivisa)", (), lambda: [((), page_cache.size)]))
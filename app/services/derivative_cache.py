@@ -0,0 +1,183 @@
+# app/services/derivative_cache.py
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+# Un accesso aggiorna la data del file solo se è più vecchia di così (in secondi)
+TOUCH_INTERVAL = 3600
+
+class DerivativeCache:
+    def __init__(self, folder, max_bytes, touch_interval=TOUCH_INTERVAL):
+        """
+        Archivio su disco di immagini derivate (copertine, miniature), indirizzate per contenuto.
+
+        Ogni derivato è identificato dall'hash di identità del capitolo, mtime della
+        sorgente e parametri della variante. Quando la dimensione totale supera il
+        limite vengono eliminati i file usati meno di recente.
+
+        :param folder: Directory in cui salvare i derivati
+        :param max_bytes: Dimensione massima complessiva in byte
+        :param touch_interval: Secondi dopo cui un accesso aggiorna la data del file, per l'LRU
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self._size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(source, mtime, variant):
+        """
+        Calcola la chiave di un derivato.
+
+        :param source: Identità stabile della sorgente (es. percorso del capitolo e pagina)
+        :param mtime: Data di modifica della sorgente
+        :param variant: Stringa che descrive i parametri della variante
+        :return: Chiave esadecimale
+        """
+        return hashlib.sha1(f'{source}|{mtime}|{variant}'.encode('utf-8')).hexdigest()
+
+    def path_for(self, key, extension):
+        """
+        Restituisce il percorso su disco di un derivato.
+
+        :param key: Chiave del derivato
+        :param extension: Estensione del file (es. 'jpg')
+        :return: Percorso del file
+        """
+        return os.path.join(self.folder, key[:2], f'{key}.{extension}')
+
+    def get(self, key, extension):
+        """
+        Restituisce il percorso del derivato se presente, aggiornandone la data di accesso.
+
+        :param key: Chiave del derivato
+        :param extension: Estensione del file
+        :return: Percorso del file, o None se non presente
+        """
+        path = self.path_for(key, extension)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if now - stat.st_mtime > self.touch_interval:
+            try:
+                os.utime(path, (now, now))
+            except FileNotFoundError:
+                return None
+        return path
+
+    def put(self, key, extension, data):
+        """
+        Salva un derivato in modo atomico e applica il limite di dimensione.
+
+        :param key: Chiave del derivato
+        :param extension: Estensione del file
+        :param data: Byte del derivato
+        :return: Percorso del file salvato
+        """
+        path = self.path_for(key, extension)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self._account(len(data))
+        return path
+
+    def adopt(self, key, extension, source_path):
+        """
+        Sposta nella cache un file già scritto su disco (es. estratto da un archivio), senza copiarlo.
+
+        Il file deve trovarsi sullo stesso filesystem della cache.
+
+        :param key: Chiave del derivato
+        :param extension: Estensione del file
+        :param source_path: Percorso del file da spostare
+        :return: Percorso del file nella cache
+        """
+        path = self.path_for(key, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(source_path)
+        os.replace(source_path, path)
+
+        self._account(size)
+        return path
+
+    def get_or_create(self, key, extension, factory):
+        """
+        Restituisce il derivato, generandolo con factory() se non è ancora presente.
+
+        :param key: Chiave del derivato
+        :param extension: Estensione del file
+        :param factory: Funzione senza argomenti che restituisce i byte del derivato
+        :return: Percorso del file
+        """
+        path = self.get(key, extension)
+        if path is None:
+            path = self.put(key, extension, factory())
+        return path
+
+    def _account(self, added):
+        """
+        Aggiorna la dimensione stimata dopo l'aggiunta di un file e applica il limite.
+
+        :param added: Byte aggiunti
+        """
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += added
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _disk_usage(self):
+        total = 0
+        for entry in self._iter_files():
+            total += entry[2]
+        return total
+
+    def _iter_files(self):
+        for root, dirs, files in os.walk(self.folder):
+            # Le directory nascoste contengono lavori in corso e i file nascosti dati di servizio, non derivati
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            for name in files:
+                if name.endswith('.tmp') or name.startswith('.'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def _evict(self):
+        """
+        Elimina i derivati meno recenti finché la cache non scende al 90% del limite.
+        Le dimensioni vengono ricalcolate dal disco, così più processi possono condividere la directory.
+        """
+        files = sorted(self._iter_files(), key=lambda entry: entry[1])
+        total = sum(entry[2] for entry in files)
+        target = self.max_bytes * 0.9
+        for path, _, size in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._size = total
@@ -0,0 +1,72 @@
+# app/services/executors.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+class ExecutorBusy(Exception):
+    """
+    Troppi lavori in coda: la richiesta va rifiutata invece di attendere.
+    """
+
+class ExecutorTimeout(Exception):
+    """
+    Il lavoro non è terminato entro il tempo massimo della richiesta.
+    """
+
+class BoundedExecutor:
+    def __init__(self, name, workers, max_pending, timeout):
+        """
+        Pool di thread con coda limitata e tempo massimo di attesa per il lavoro
+        bloccante delle richieste (apertura di archivi, decompressione).
+
+        Se i lavori in esecuzione o in coda sono già workers + max_pending la
+        richiesta viene rifiutata subito con ExecutorBusy; se il risultato non
+        arriva entro timeout secondi il chiamante riceve ExecutorTimeout. Un lavoro
+        scaduto occupa il suo posto finché non termina davvero, così un capitolo
+        lento non può riempire il pool all'infinito.
+
+        :param name: Prefisso dei nomi dei thread
+        :param workers: Numero di thread
+        :param max_pending: Numero massimo di lavori in attesa oltre a quelli in esecuzione
+        :param timeout: Secondi di attesa massima del risultato
+        """
+        self.name = name
+        self.timeout = timeout
+        self.rejected = 0
+        self.timed_out = 0
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._capacity = workers + max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+
+    def run(self, func, *args, **kwargs):
+        """
+        Esegue func(*args, **kwargs) nel pool e ne attende il risultato.
+
+        :return: Risultato della funzione
+        :raises ExecutorBusy: Se il pool è saturo
+        :raises ExecutorTimeout: Se il risultato non arriva entro il tempo massimo
+        """
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise ExecutorBusy(f"{self.name}: troppe richieste in coda")
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            self.timed_out += 1
+            future.cancel()
+            raise ExecutorTimeout(f"{self.name}: tempo massimo di {self.timeout}s superato")
+
+    def stats(self):
+        return {
+            'capacity': self._capacity,
+            'available': self._slots._value,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out
+        }
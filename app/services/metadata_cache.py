@@ -0,0 +1,122 @@
+# app/services/metadata_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from app import app
+from app.models import ScanJob
+
+class MetadataCache:
+    def __init__(self, max_entries, ttl, last_change=None, check_interval=5):
+        """
+        Cache LRU in memoria, con scadenza, dei metadati di fumetti e capitoli già risolti.
+
+        Lo scanner incrementa il contatore di generazione al termine di ogni
+        scansione, invalidando tutte le voci del processo. Gli altri processi (gli
+        altri worker e il watcher) confrontano ogni check_interval secondi il valore
+        di last_change, che cambia a ogni scansione terminata, e svuotano la cache
+        quando cambia. I valori None (es. un capitolo non trovato) non vengono
+        messi in cache, così un capitolo appena aggiunto compare subito.
+
+        :param max_entries: Numero massimo di voci
+        :param ttl: Durata di una voce in secondi
+        :param last_change: Funzione che restituisce un valore che cambia a ogni scansione terminata (opzionale)
+        :param check_interval: Secondi tra due controlli di last_change
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.last_change = last_change
+        self.check_interval = check_interval
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        """
+        Restituisce il valore in cache per la chiave, caricandolo con loader() se assente o scaduto.
+
+        Le eccezioni sollevate da loader() e i valori None non vengono messi in cache.
+
+        :param key: Chiave della voce
+        :param loader: Funzione senza argomenti che carica il valore
+        :return: Valore in cache o appena caricato
+        """
+        self._check_version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self.generation
+
+        value = loader()
+        if value is None:
+            return None
+
+        with self._lock:
+            # Un'invalidazione durante il caricamento rende il valore potenzialmente obsoleto
+            if generation == self.generation:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def _check_version(self):
+        """
+        Svuota la cache se da un altro processo è terminata una scansione dopo l'ultimo controllo.
+        """
+        if self.last_change is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+
+        try:
+            version = self.last_change()
+        except Exception as e:
+            app.logger.warning("Controllo della cache dei metadati fallito: %s", e)
+            return
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self.generation += 1
+                self._entries.clear()
+
+    def invalidate(self):
+        """
+        Svuota la cache e passa alla generazione successiva.
+        """
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Restituisce contatori e dimensione della cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'generation': self.generation,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
+
+metadata_cache = MetadataCache(
+    app.config['METADATA_CACHE_SIZE'],
+    app.config['METADATA_CACHE_TTL'],
+    ScanJob.get_last_change,
+    app.config['METADATA_CACHE_CHECK_INTERVAL']
+)
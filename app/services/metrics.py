@@ -0,0 +1,231 @@
+# app/services/metrics.py
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Limiti dei bucket delle latenze, in secondi
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Tempi per fase della richiesta in corso: lista di (fase, secondi) condivisa
+# anche con i thread che lavorano per la richiesta (vedi contextvars.copy_context)
+_request_spans = contextvars.ContextVar('request_spans', default=None)
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Counter:
+    def __init__(self, name, description, labels=()):
+        """
+        Contatore monotono, eventualmente suddiviso per etichette.
+
+        :param name: Nome della metrica
+        :param description: Descrizione mostrata in /metrics
+        :param labels: Nomi delle etichette
+        """
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        """
+        Istogramma cumulativo in stile Prometheus, eventualmente suddiviso per etichette.
+
+        :param name: Nome della metrica
+        :param description: Descrizione mostrata in /metrics
+        :param labels: Nomi delle etichette
+        :param buckets: Limiti superiori dei bucket, in ordine crescente
+        """
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Conteggi per bucket (l'ultimo è +Inf), somma
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        bucket_labels = self.labels + ('le',)
+        with self._lock:
+            for label_values, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{_format_labels(bucket_labels, label_values + (bound,))} {cumulative}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labels, label_values)} {round(total, 6)}')
+                lines.append(f'{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}')
+        return lines
+
+class GaugeCallback:
+    def __init__(self, name, description, labels, collect, kind='gauge'):
+        """
+        Metrica letta al momento dell'esportazione da una funzione, ad esempio dalle
+        statistiche di una cache.
+
+        :param name: Nome della metrica
+        :param description: Descrizione mostrata in /metrics
+        :param labels: Nomi delle etichette
+        :param collect: Funzione che restituisce coppie (tuple dei valori delle etichette, valore)
+        :param kind: Tipo Prometheus dichiarato (gauge o counter)
+        """
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        for label_values, value in self.collect():
+            if value is not None:
+                lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Insieme delle metriche del processo, esportate nel formato testuale di Prometheus.
+
+        Ogni processo (es. ogni worker gunicorn) ha le proprie metriche.
+        """
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        :return: Testo nel formato di esposizione di Prometheus
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+request_seconds = registry.register(Histogram(
+    'comic_vault_request_seconds', "Durata delle richieste, invio della risposta compreso", ('route',)))
+requests_total = registry.register(Counter(
+    'comic_vault_requests_total', "Richieste servite per route e stato", ('route', 'status')))
+response_bytes = registry.register(Counter(
+    'comic_vault_response_bytes_total', "Byte inviati per route", ('route',)))
+stage_seconds = registry.register(Histogram(
+    'comic_vault_stage_seconds', "Durata delle fasi delle richieste (mongo, page_open, archive_open, archive_list, decompress, image)", ('stage',)))
+scan_seconds = registry.register(Histogram(
+    'comic_vault_scan_seconds', "Durata delle scansioni della libreria", (),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)))
+scan_chapters = registry.register(Counter(
+    'comic_vault_scan_chapters_total', "Capitoli letti dalle scansioni", ('result',)))
+
+def start_request():
+    """
+    Inizia a raccogliere le fasi della richiesta corrente.
+
+    :return: Lista delle fasi, da passare a finish_request
+    """
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+def finish_request():
+    """
+    Smette di raccogliere le fasi nel contesto corrente.
+    """
+    _request_spans.set(None)
+
+def record(stage, elapsed):
+    """
+    Registra la durata di una fase nell'istogramma e nella richiesta corrente, se presente.
+
+    :param stage: Nome della fase
+    :param elapsed: Durata in secondi
+    """
+    stage_seconds.observe(elapsed, stage)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((stage, elapsed))
+
+@contextmanager
+def span(stage):
+    """
+    Misura la durata del blocco come fase della richiesta corrente.
+
+    :param stage: Nome della fase
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+def timed(stage, iterator):
+    """
+    Generatore che misura come fase il tempo speso a produrre i blocchi di un iteratore
+    (ad esempio la decompressione durante l'invio), senza il tempo di scrittura.
+
+    :param stage: Nome della fase
+    :param iterator: Iteratore di blocchi
+    :return: Iteratore degli stessi blocchi
+    """
+    elapsed = 0.0
+    iterator = iter(iterator)
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - started
+            yield chunk
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+        record(stage, elapsed)
+
+def summarize_spans(spans):
+    """
+    Somma le durate per fase.
+
+    :param spans: Lista di (fase, secondi)
+    :return: Dizionario fase -> secondi totali
+    """
+    totals = {}
+    for stage, elapsed in spans:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    return totals
@@ -0,0 +1,172 @@
+# app/services/page_stream.py
+
+import io
+import os
+import struct
+
+CHUNK_SIZE = 64 * 1024
+
+class FileWindow(io.RawIOBase):
+    def __init__(self, path, offset, length):
+        """
+        File in sola lettura che espone solo una finestra [offset, offset + length) di un file.
+
+        Usato per servire i membri STORED di un CBZ direttamente dal file, senza
+        passare dal modulo zipfile e senza caricare la pagina in memoria.
+
+        :param path: Percorso del file
+        :param offset: Posizione del primo byte della finestra
+        :param length: Lunghezza della finestra in byte
+        """
+        super().__init__()
+        self._file = open(path, 'rb', buffering=0)
+        self._offset = offset
+        self._length = length
+        self._position = 0
+        self._file.seek(offset)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, position, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            position += self._position
+        elif whence == os.SEEK_END:
+            position += self._length
+        self._position = max(0, min(position, self._length))
+        self._file.seek(self._offset + self._position)
+        return self._position
+
+    def readinto(self, buffer):
+        remaining = self._length - self._position
+        if remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:remaining]
+        read = self._file.readinto(view)
+        self._position += read
+        return read
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+def iter_archive_member(pool, archive_path, mtime, member_name, chunk_size=CHUNK_SIZE):
+    """
+    Generatore che decomprime un membro di un archivio a blocchi.
+
+    L'archivio resta in prestito dal pool finché il generatore non viene esaurito o chiuso.
+
+    :param pool: ArchivePool da cui prendere l'archivio aperto
+    :param archive_path: Percorso dell'archivio
+    :param mtime: Data di modifica dell'archivio
+    :param member_name: Nome del membro da leggere
+    :param chunk_size: Dimensione dei blocchi prodotti
+    :return: Iteratore di blocchi di byte
+    """
+    with pool.open(archive_path, mtime) as archive:
+        with archive.open(member_name) as member:
+            while True:
+                chunk = member.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+def frame_header(page_number, mimetype, size):
+    """
+    Intestazione di un frame della risposta a più pagine.
+
+    Ogni pagina è preceduta da: numero di pagina (uint32), lunghezza dei dati
+    (uint32), lunghezza del mimetype (uint8) e mimetype in ASCII, tutto big-endian;
+    seguono esattamente 'size' byte di immagine.
+
+    :param page_number: Numero della pagina
+    :param mimetype: Mimetype della pagina
+    :param size: Dimensione dei dati della pagina in byte
+    :return: Byte dell'intestazione
+    """
+    encoded = mimetype.encode('ascii')
+    return struct.pack('>IIB', page_number, size, len(encoded)) + encoded
+
+class PageContent:
+    def __init__(self, mimetype, size, path=None, file=None, chunks=None):
+        """
+        Contenuto di una pagina pronto per essere inviato al client.
+
+        Esattamente una delle sorgenti è valorizzata: il percorso di un file su disco,
+        un file posizionabile (finestra su un membro STORED) o un iteratore di blocchi.
+
+        :param mimetype: Mimetype della pagina
+        :param size: Dimensione della pagina in byte
+        :param path: Percorso di un'immagine sciolta in una directory
+        :param file: Oggetto file posizionabile con i byte della pagina
+        :param chunks: Iteratore di blocchi per i membri compressi
+        """
+        self.mimetype = mimetype
+        self.size = size
+        self.path = path
+        self.file = file
+        self.chunks = chunks
+
+    def read(self):
+        """
+        Legge l'intera pagina in memoria. Da usare solo quando serve decodificare l'immagine.
+
+        :return: Byte della pagina
+        """
+        if self.path is not None:
+            with open(self.path, 'rb') as image_file:
+                return image_file.read()
+        if self.file is not None:
+            with self.file:
+                return self.file.read()
+        return b''.join(self.chunks)
+
+    def iter_chunks(self):
+        """
+        Produce la pagina a blocchi, qualunque sia la sorgente.
+
+        :return: Iteratore di blocchi di byte
+        """
+        if self.path is not None:
+            with open(self.path, 'rb') as image_file:
+                yield from iter(lambda: image_file.read(CHUNK_SIZE), b'')
+        elif self.file is not None:
+            with self.file:
+                yield from iter(lambda: self.file.read(CHUNK_SIZE), b'')
+        else:
+            yield from self.chunks
+
+    def prime(self):
+        """
+        Avvia la lettura dei membri compressi producendo subito il primo blocco.
+
+        Così apertura dell'archivio ed eventuali errori avvengono nel thread che
+        prepara la pagina e non durante l'invio della risposta.
+
+        :return: La pagina stessa
+        """
+        if self.chunks is not None:
+            chunks = iter(self.chunks)
+            first = next(chunks, b'')
+            self.chunks = _resume(first, chunks)
+        return self
+
+def _resume(first, chunks):
+    """
+    Generatore che produce un blocco già letto e poi il resto dell'iteratore, chiudendolo alla fine.
+    """
+    try:
+        if first:
+            yield first
+        yield from chunks
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
@@ -0,0 +1,183 @@
+# app/services/prefetch.py
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from app import app
+from .page_stream import PageContent
+
+class PageByteCache:
+    def __init__(self, max_bytes):
+        """
+        Cache LRU in memoria delle pagine già decompresse, limitata dalla dimensione totale in byte.
+
+        :param max_bytes: Dimensione massima complessiva delle pagine in cache
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Restituisce (byte, mimetype) della pagina se presente, altrimenti None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def open(self, key):
+        """
+        Restituisce la pagina pronta per l'invio, o None se non è in cache.
+        """
+        cached = self.get(key)
+        if cached is None:
+            return None
+        data, mimetype = cached
+        return PageContent(mimetype, len(data), file=BytesIO(data))
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, data, mimetype):
+        """
+        Aggiunge una pagina, eliminando le meno recenti se si supera il limite.
+        Le pagine più grandi di un quarto del limite non vengono salvate.
+        """
+        if len(data) > self.max_bytes // 4:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[0])
+            self._entries[key] = (data, mimetype)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        """
+        Svuota la cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
+
+class Prefetcher:
+    def __init__(self, loader, workers, depth, next_chapter_pages, max_readers=1024):
+        """
+        Legge in anticipo le pagine successive a quella servita, per la lettura sequenziale.
+
+        Ogni lettore (identificato da una chiave scelta dal chiamante) ha al più un
+        capitolo in lettura: quando passa a un altro capitolo le letture anticipate
+        non ancora iniziate vengono annullate.
+
+        :param loader: Funzione (comic_id, chapter_number, page_number, *variant) che prepara una pagina
+        :param workers: Numero di thread dedicati alla lettura anticipata
+        :param depth: Numero di pagine da leggere dopo quella servita
+        :param next_chapter_pages: Pagine del capitolo successivo da leggere vicino alla fine del capitolo
+        :param max_readers: Numero massimo di lettori tracciati
+        """
+        self.loader = loader
+        self.depth = depth
+        self.next_chapter_pages = next_chapter_pages
+        self.max_readers = max_readers
+        self.scheduled = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self._readers = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, reader, comic_id, chapter, page_number, next_chapter=None, variant=()):
+        """
+        Programma la lettura delle pagine successive a quella appena servita.
+
+        :param reader: Chiave del lettore
+        :param comic_id: ID del fumetto
+        :param chapter: Documento del capitolo corrente
+        :param page_number: Pagina appena servita
+        :param next_chapter: Documento (anche parziale) del capitolo successivo, se esiste
+        :param variant: Argomenti aggiuntivi del loader che descrivono la variante letta (es. larghezza e formato)
+        """
+        chapter_number = chapter['number']
+        last_page = min(page_number + self.depth, chapter['page_count'] - 1)
+        targets = [(comic_id, chapter_number, n, *variant) for n in range(page_number + 1, last_page + 1)]
+        if next_chapter is not None and page_number + self.depth >= chapter['page_count'] - 1:
+            targets += [(comic_id, next_chapter['number'], n, *variant) for n in range(self.next_chapter_pages)]
+
+        with self._lock:
+            current = self._readers.pop(reader, None)
+            if current is not None and current[0] != (comic_id, chapter_number):
+                self._cancel(current[1])
+                current = None
+            futures = current[1] if current is not None else []
+            futures = [future for future in futures if not future.done()]
+
+            for target in targets:
+                if target in self._in_flight:
+                    continue
+                future = self._executor.submit(self._run, target)
+                self._in_flight[target] = future
+                futures.append(future)
+                self.scheduled += 1
+
+            self._readers[reader] = ((comic_id, chapter_number), futures)
+            while len(self._readers) > self.max_readers:
+                _, (_, stale) = self._readers.popitem(last=False)
+                self._cancel(stale)
+
+    def _cancel(self, futures):
+        for future in futures:
+            if future.cancel():
+                self.cancelled += 1
+        for target in [target for target, future in self._in_flight.items() if future.cancelled()]:
+            del self._in_flight[target]
+
+    def _run(self, target):
+        try:
+            with app.app_context():
+                self.loader(*target)
+            self.completed += 1
+        except Exception as e:
+            # Una pagina mancante o illeggibile verrà segnalata quando sarà richiesta davvero
+            self.failed += 1
+            app.logger.debug("Lettura anticipata di %s fallita: %s", target, e)
+        finally:
+            with self._lock:
+                self._in_flight.pop(target, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'scheduled': self.scheduled,
+                'completed': self.completed,
+                'cancelled': self.cancelled,
+                'failed': self.failed,
+                'in_flight': len(self._in_flight),
+                'readers': len(self._readers)
+            }
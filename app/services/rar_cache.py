@@ -0,0 +1,227 @@
+# app/services/rar_cache.py
+
+import os
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import rarfile
+from app import app
+from app.utils import build_page_index, is_image_member
+from .derivative_cache import DerivativeCache
+from .page_stream import FileWindow, PageContent
+
+# Modalità di accelerazione: estrazione dei singoli membri o conversione in un CBZ non compresso
+MODES = ('off', 'extract', 'cbz')
+
+def is_rar(path):
+    """
+    Verifica se un capitolo è un archivio RAR.
+    """
+    return path.lower().endswith(('.cbr', '.rar'))
+
+class RarAccelerator:
+    def __init__(self, mode, cache, workers=1, max_indexes=256):
+        """
+        Evita di leggere i capitoli RAR tramite unrar a ogni richiesta.
+
+        Al primo accesso il RAR viene estratto una sola volta in background (un
+        unico processo unrar per tutto l'archivio) e salvato nella cache su disco:
+        con 'extract' ogni pagina diventa un file, con 'cbz' l'archivio diventa un
+        CBZ non compresso, le cui pagine si leggono direttamente dal file. Finché la
+        versione veloce non è pronta, o se è stata eliminata dalla cache, le pagine
+        vengono lette dal RAR come prima.
+
+        :param mode: Una di MODES
+        :param cache: DerivativeCache in cui salvare pagine estratte o CBZ
+        :param workers: Numero di thread dedicati all'estrazione
+        :param max_indexes: Numero massimo di indici di CBZ convertiti tenuti in memoria
+        """
+        if mode not in MODES:
+            raise ValueError(f"Modalità di accelerazione RAR non valida: {mode}")
+        self.mode = mode
+        self.cache = cache
+        self.max_indexes = max_indexes
+        self.converted = 0
+        self.failed = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rar-cache') if mode != 'off' else None
+        self._pending = set()
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def open_page(self, archive_path, mtime, page):
+        """
+        Prepara una pagina dalla versione veloce del RAR, se disponibile.
+
+        Se non lo è, programma l'estrazione in background e restituisce None:
+        il chiamante legge la pagina dal RAR.
+
+        :param archive_path: Percorso del RAR
+        :param mtime: Data di modifica del RAR
+        :param page: Voce dell'indice della pagina
+        :return: PageContent, o None se la pagina va letta dal RAR
+        """
+        if not self.enabled:
+            return None
+        try:
+            if self.mode == 'extract':
+                content = self._open_extracted(archive_path, mtime, page)
+            else:
+                content = self._open_converted(archive_path, mtime, page)
+        except FileNotFoundError:
+            # Eliminato dalla cache tra la ricerca e l'apertura
+            content = None
+        if content is None:
+            self.schedule(archive_path, mtime)
+        return content
+
+    def schedule(self, archive_path, mtime):
+        """
+        Programma l'estrazione di un RAR, se non è già in corso.
+        """
+        key = (archive_path, mtime)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._run, archive_path, mtime)
+
+    def convert(self, archive_path, mtime):
+        """
+        Estrae subito un RAR nella cache, nel thread chiamante.
+
+        :param archive_path: Percorso del RAR
+        :param mtime: Data di modifica del RAR
+        :return: Numero di pagine salvate
+        """
+        with tempfile.TemporaryDirectory(dir=self._work_folder()) as work_dir:
+            with rarfile.RarFile(archive_path, 'r') as archive:
+                names = [info.filename for info in archive.infolist()
+                         if not info.is_dir() and is_image_member(info.filename)]
+                archive.extractall(work_dir, names)
+
+            if self.mode == 'extract':
+                for name in names:
+                    self.cache.adopt(self._member_key(archive_path, mtime, name), self._extension(name), self._extracted_path(work_dir, name))
+                # Elenco dei membri, scritto per ultimo: segna l'estrazione come completa
+                self.cache.put(self._extracted_key(archive_path, mtime), 'members', '\n'.join(names).encode('utf-8'))
+            else:
+                converted_path = os.path.join(work_dir, 'converted.cbz')
+                with zipfile.ZipFile(converted_path, 'w', zipfile.ZIP_STORED) as converted:
+                    for name in names:
+                        converted.write(self._extracted_path(work_dir, name), name)
+                self.cache.adopt(self._converted_key(archive_path, mtime), 'cbz', converted_path)
+        return len(names)
+
+    def is_converted(self, archive_path, mtime):
+        """
+        Verifica se la versione veloce di un RAR è già nella cache.
+
+        Con 'extract' l'estrazione è completa se c'è l'elenco dei membri, scritto
+        dopo l'ultimo, e ogni membro elencato è ancora in cache.
+        """
+        if self.mode == 'cbz':
+            return self.cache.get(self._converted_key(archive_path, mtime), 'cbz') is not None
+        if self.mode != 'extract':
+            return False
+        listing = self.cache.get(self._extracted_key(archive_path, mtime), 'members')
+        if listing is None:
+            return False
+        try:
+            with open(listing, 'rb') as listing_file:
+                names = listing_file.read().decode('utf-8').split('\n')
+        except FileNotFoundError:
+            return False
+        return all(
+            os.path.exists(self.cache.path_for(self._member_key(archive_path, mtime, name), self._extension(name)))
+            for name in names if name
+        )
+
+    def _run(self, archive_path, mtime):
+        try:
+            self.convert(archive_path, mtime)
+            self.converted += 1
+        except Exception as e:
+            self.failed += 1
+            app.logger.warning("Estrazione di %s fallita: %s", archive_path, e)
+        finally:
+            with self._lock:
+                self._pending.discard((archive_path, mtime))
+
+    def _open_extracted(self, archive_path, mtime, page):
+        path = self.cache.get(self._member_key(archive_path, mtime, page['name']), self._extension(page['name']))
+        if path is None:
+            return None
+        return PageContent(page['mimetype'], os.path.getsize(path), path=path)
+
+    def _open_converted(self, archive_path, mtime, page):
+        path = self.cache.get(self._converted_key(archive_path, mtime), 'cbz')
+        if path is None:
+            return None
+        entry = self._converted_index(path).get(page['name'])
+        if entry is None:
+            return None
+        offset, size = entry
+        return PageContent(page['mimetype'], size, file=FileWindow(path, offset, size))
+
+    def _converted_index(self, path):
+        """
+        Restituisce nome -> (offset, dimensione) delle pagine di un CBZ convertito.
+        Il contenuto di un CBZ in cache non cambia mai (la chiave include l'mtime del RAR).
+        """
+        with self._lock:
+            index = self._indexes.get(path)
+            if index is not None:
+                self._indexes.move_to_end(path)
+                return index
+
+        index = {page['name']: (page['offset'], page['file_size']) for page in build_page_index(path, True)}
+
+        with self._lock:
+            self._indexes[path] = index
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        return index
+
+    def _work_folder(self):
+        # Stesso filesystem della cache, così i file estratti si spostano senza copiarli
+        folder = os.path.join(self.cache.folder, '.work')
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    @staticmethod
+    def _extracted_path(work_dir, name):
+        path = os.path.realpath(os.path.join(work_dir, name))
+        if not path.startswith(os.path.realpath(work_dir) + os.sep):
+            raise ValueError(f"Percorso non valido nell'archivio: {name}")
+        return path
+
+    @staticmethod
+    def _member_key(archive_path, mtime, name):
+        return DerivativeCache.make_key(f'{archive_path}#{name}', mtime, 'rar-member')
+
+    @staticmethod
+    def _extracted_key(archive_path, mtime):
+        return DerivativeCache.make_key(archive_path, mtime, 'rar-members')
+
+    @staticmethod
+    def _converted_key(archive_path, mtime):
+        return DerivativeCache.make_key(archive_path, mtime, 'rar-cbz')
+
+    @staticmethod
+    def _extension(name):
+        return os.path.splitext(name)[1].lstrip('.').lower()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'converted': self.converted,
+                'failed': self.failed,
+                'pending': len(self._pending)
+            }
@@ -0,0 +1,170 @@
+# app/services/reading_progress.py
+
+import atexit
+import threading
+from datetime import datetime, timezone
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+from app import app
+from app.models import Comic, ReadingProgress
+
+# Codice di errore di MongoDB per le chiavi duplicate
+DUPLICATE_KEY = 11000
+
+class ProgressBuffer:
+    def __init__(self, flush_interval):
+        """
+        Buffer in memoria dei progressi di lettura, scritti su MongoDB in differita.
+
+        Gli aggiornamenti dello stesso fumetto si sovrascrivono in memoria: di una
+        sequenza di pagine girate arriva al database solo l'ultima. Un thread scrive
+        il buffer ogni flush_interval secondi con un unico bulk_write; le letture
+        dello stesso processo vedono subito anche i progressi non ancora scritti.
+
+        :param flush_interval: Secondi tra due scritture del buffer
+        """
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def record(self, comic_id, chapter_number, page_number, page_count):
+        """
+        Registra l'ultima pagina letta di un fumetto, senza accedere al database.
+
+        :param comic_id: ID del fumetto
+        :param chapter_number: Numero del capitolo
+        :param page_number: Numero della pagina
+        :param page_count: Numero di pagine del capitolo
+        """
+        entry = {
+            '_id': ObjectId(comic_id),
+            'chapter_number': chapter_number,
+            'page_number': page_number,
+            'page_count': page_count,
+            'updated_at': datetime.now(timezone.utc)
+        }
+        with self._lock:
+            self._pending[entry['_id']] = entry
+            self.recorded += 1
+            if self._thread is None and not self._stopped.is_set():
+                # Il thread parte alla prima lettura: nei worker di gunicorn, dopo il fork
+                self._thread = threading.Thread(target=self._run, name='progress-flush', daemon=True)
+                self._thread.start()
+
+    def get(self, comic_id):
+        """
+        Restituisce il progresso di lettura di un fumetto, preferendo quello non ancora scritto.
+
+        :param comic_id: ID del fumetto
+        :return: Documento del progresso, o None
+        """
+        with self._lock:
+            entry = self._pending.get(ObjectId(comic_id))
+        if entry is not None:
+            return dict(entry)
+        return ReadingProgress.get(comic_id)
+
+    def list_recent(self, limit):
+        """
+        Restituisce i fumetti letti più di recente con il loro progresso, per lo scaffale "continua a leggere".
+
+        :param limit: Numero massimo di fumetti
+        :return: Lista di tuple (fumetto, progresso), dal più recente
+        """
+        with self._lock:
+            pending = [dict(entry) for entry in self._pending.values()]
+        latest = {entry['_id']: entry for entry in ReadingProgress.list_recent(limit)}
+        for entry in pending:
+            stored = latest.get(entry['_id'])
+            if stored is None or _as_utc(stored['updated_at']) < entry['updated_at']:
+                latest[entry['_id']] = entry
+
+        entries = sorted(latest.values(), key=lambda entry: _as_utc(entry['updated_at']), reverse=True)[:limit]
+        comics = Comic.list_summary_by_ids([entry['_id'] for entry in entries])
+        return [(comics[entry['_id']], entry) for entry in entries if entry['_id'] in comics]
+
+    def flush(self):
+        """
+        Scrive su MongoDB i progressi accumulati con un unico bulk_write.
+
+        Se la scrittura fallisce i progressi tornano nel buffer, salvo quelli già
+        sostituiti da letture più recenti, e verranno riprovati al giro successivo.
+
+        :return: Numero di progressi scritti
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            operations = [
+                ReadingProgress.upsert_op(entry['_id'], entry['chapter_number'], entry['page_number'],
+                                          entry['page_count'], entry['updated_at'])
+                for entry in batch.values()
+            ]
+            try:
+                ReadingProgress.bulk_write(operations)
+            except BulkWriteError as e:
+                # Le chiavi duplicate sono progressi già superati da uno più recente nel database
+                if any(error.get('code') != DUPLICATE_KEY for error in e.details.get('writeErrors', [])):
+                    self._requeue(batch)
+                    raise
+            except Exception:
+                self._requeue(batch)
+                raise
+
+            self.written += len(batch)
+            self.batches += 1
+            return len(batch)
+
+    def _requeue(self, batch):
+        with self._lock:
+            self.failed += 1
+            for comic_id, entry in batch.items():
+                self._pending.setdefault(comic_id, entry)
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                with app.app_context():
+                    self.flush()
+            except Exception:
+                app.logger.exception("Scrittura dei progressi di lettura fallita")
+
+    def shutdown(self):
+        """
+        Ferma il thread di scrittura e scrive subito i progressi rimasti nel buffer.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            with app.app_context():
+                self.flush()
+        except Exception:
+            app.logger.exception("Scrittura finale dei progressi di lettura fallita")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'recorded': self.recorded,
+                'written': self.written,
+                'batches': self.batches,
+                'failed': self.failed
+            }
+
+def _as_utc(value):
+    # MongoDB restituisce date senza fuso orario (UTC)
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+progress_buffer = ProgressBuffer(app.config['PROGRESS_FLUSH_INTERVAL'])
+atexit.register(progress_buffer.shutdown)
@@ -0,0 +1,115 @@
+# app/services/scan_jobs.py
+
+import atexit
+import threading
+import uuid
+from app import app, mongo
+from app.models import ScanJob
+from .scanner import ComicScanner, ScanProgress
+from .search import search_index
+
+class ScanJobManager:
+    def __init__(self, directory_path, lock_timeout):
+        """
+        Esegue le scansioni della libreria in background, una alla volta.
+
+        Il lock che impedisce scansioni concorrenti è salvato in MongoDB, quindi vale
+        anche tra processi diversi; l'avanzamento è leggibile da qualunque processo.
+
+        :param directory_path: Percorso della libreria da scansionare
+        :param lock_timeout: Secondi senza heartbeat dopo i quali un lock è considerato abbandonato
+        """
+        self.directory_path = directory_path
+        self.lock_timeout = lock_timeout
+        # Job in esecuzione in questo processo: ID -> ScanProgress
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def start(self, full=False):
+        """
+        Avvia una scansione in background, se non ce n'è già una in corso.
+
+        :param full: Se True ricostruisce la libreria da zero
+        :return: Tuple (ID del job, True se avviato ora o False se già in corso)
+        """
+        job_id = uuid.uuid4().hex
+        if not ScanJob.acquire_lock(job_id, self.lock_timeout):
+            running = ScanJob.get_running()
+            if running is not None:
+                return running['_id'], False
+            # Il job che teneva il lock è terminato nel frattempo: riprova una volta
+            if not ScanJob.acquire_lock(job_id, self.lock_timeout):
+                return None, False
+
+        ScanJob.create(job_id, full)
+        thread = threading.Thread(target=self._run, args=(job_id, full), name=f'scan-{job_id}', daemon=True)
+        thread.start()
+        return job_id, True
+
+    def run_paths(self, comic_paths):
+        """
+        Aggiorna subito, nel thread chiamante, solo le directory dei fumetti indicate.
+
+        Usato dal watcher: se è in corso un'altra scansione non attende e restituisce False.
+
+        :param comic_paths: Directory dei fumetti da aggiornare, esistenti o eliminate
+        :return: True se l'aggiornamento è stato eseguito
+        """
+        job_id = uuid.uuid4().hex
+        comic_paths = sorted(comic_paths)
+        with app.app_context():
+            if not ScanJob.acquire_lock(job_id, self.lock_timeout):
+                return False
+            ScanJob.create(job_id, False, comic_paths)
+        self._run(job_id, False, comic_paths)
+        return True
+
+    def shutdown(self):
+        """
+        Segna come fallite le scansioni ancora in corso in questo processo e ne rilascia il lock.
+
+        I thread delle scansioni terminano insieme al processo (es. un worker di
+        gunicorn arrestato o riavviato): senza questo il job resterebbe 'running'
+        finché il suo lock non scade.
+        """
+        with self._lock:
+            running, self._running = self._running, {}
+        if not running:
+            return
+        with app.app_context():
+            for job_id, progress in running.items():
+                try:
+                    ScanJob.finish(job_id, 'failed', progress.snapshot(), "Processo terminato durante la scansione")
+                    ScanJob.release_lock(job_id)
+                except Exception:
+                    app.logger.exception("Impossibile chiudere la scansione interrotta %s", job_id)
+
+    def _run(self, job_id, full, comic_paths=None):
+        progress = ScanProgress(on_update=lambda snapshot: ScanJob.update_progress(job_id, snapshot))
+        status, error = 'completed', None
+        with self._lock:
+            self._running[job_id] = progress
+        with app.app_context():
+            scanner = ComicScanner(self.directory_path, mongo)
+            try:
+                scanner.scan_and_register_comics(full=full, progress=progress, comic_paths=comic_paths)
+            except Exception as e:
+                app.logger.exception("Scansione %s fallita", job_id)
+                status, error = 'failed', str(e)
+            finally:
+                with self._lock:
+                    self._running.pop(job_id, None)
+                ScanJob.finish(job_id, status, progress.snapshot(), error)
+                ScanJob.release_lock(job_id)
+
+            if status == 'completed':
+                try:
+                    if full:
+                        search_index.rebuild()
+                    else:
+                        search_index.refresh(scanner.touched_comics, scanner.vanished_comics)
+                except Exception:
+                    app.logger.exception("Aggiornamento dell'indice di ricerca fallito")
+
+scan_job_manager = ScanJobManager(app.config['COMICS_FOLDER'], app.config['SCAN_LOCK_TIMEOUT'])
+atexit.register(scan_job_manager.shutdown)
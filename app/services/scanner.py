@@ -1,50 +1,388 @@
 # app/services/scanner.py
 
 import os
-from app.models import Comic, Chapter
-from app.utils import allowed_file, list_images, extract_metadata_from_filename
+import time
+from collections import defaultdict
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from bson.objectid import ObjectId
+from app import app
+from app.models import Comic, Chapter, prepare_database
+from app.utils import allowed_file, build_page_index, chapter_stat, extract_metadata_from_filename
+from .comic_service import ComicService
+from .metadata_cache import metadata_cache
+from .metrics import scan_chapters, scan_seconds
+
+class _BulkWriter:
+    def __init__(self, batch_size):
+        """
+        Accumula le operazioni di scrittura e le invia a MongoDB in gruppi con bulk_write.
+
+        Ogni modello (Comic, Chapter) ha la sua coda; le operazioni di una coda sono
+        eseguite nell'ordine in cui vengono aggiunte. Quando una coda è piena vengono
+        svuotate tutte, nell'ordine in cui sono state create, così i fumetti nuovi
+        vengono scritti prima dei loro capitoli.
+
+        :param batch_size: Numero di operazioni per ogni bulk_write
+        """
+        self.batch_size = batch_size
+        self.operations = {}
+
+    def add(self, model, operation):
+        """
+        Accoda un'operazione per la collezione del modello dato.
+
+        :param model: Classe del modello (Comic o Chapter) che espone bulk_write
+        :param operation: Operazione pymongo
+        """
+        queue = self.operations.setdefault(model, [])
+        queue.append(operation)
+        if len(queue) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for model, queue in self.operations.items():
+            if queue:
+                model.bulk_write(queue)
+        self.operations = {}
+
+class ScanProgress:
+    def __init__(self, on_update=None, interval=1.0):
+        """
+        Contatori di avanzamento di una scansione.
+
+        :param on_update: Funzione chiamata con snapshot() al più ogni interval secondi
+        :param interval: Intervallo minimo in secondi tra due chiamate di on_update
+        """
+        self.phase = 'chapters'
+        self.directories_seen = 0
+        self.chapters_queued = 0
+        self.archives_listed = 0
+        self.errors = 0
+        self.covers_queued = 0
+        self.covers_built = 0
+        self.started_at = time.monotonic()
+        self._phase_started_at = self.started_at
+        self.on_update = on_update
+        self.interval = interval
+        self._last_update = 0.0
+
+    def directory_seen(self):
+        self.directories_seen += 1
+        self._maybe_update()
+
+    def chapter_queued(self):
+        self.chapters_queued += 1
+
+    def archive_listed(self, failed=False):
+        self.archives_listed += 1
+        if failed:
+            self.errors += 1
+        self._maybe_update()
+
+    def covers_started(self, count):
+        """
+        Passa alla fase delle copertine, con count miniature da generare.
+        """
+        if self.phase != 'covers':
+            self.phase = 'covers'
+            self._phase_started_at = time.monotonic()
+        self.covers_queued += count
+        self._maybe_update(force=True)
+
+    def cover_built(self):
+        self.covers_built += 1
+        self._maybe_update()
+
+    def snapshot(self):
+        """
+        Restituisce i contatori con throughput (capitoli al secondo) e tempo stimato rimanente.
+
+        La stima è ottimistica finché la visita delle directory non è terminata,
+        perché i capitoli ancora da scoprire non sono conteggiati. Nella fase delle
+        copertine la stima si basa sulle miniature ancora da generare.
+        """
+        now = time.monotonic()
+        elapsed = now - self.started_at
+        throughput = self.archives_listed / elapsed if elapsed > 0 else 0.0
+        remaining = self.chapters_queued - self.archives_listed
+        rate = throughput
+        if self.phase == 'covers':
+            phase_elapsed = now - self._phase_started_at
+            rate = self.covers_built / phase_elapsed if phase_elapsed > 0 else 0.0
+            remaining = self.covers_queued - self.covers_built
+        return {
+            'phase': self.phase,
+            'directories_seen': self.directories_seen,
+            'chapters_queued': self.chapters_queued,
+            'archives_listed': self.archives_listed,
+            'errors': self.errors,
+            'covers_queued': self.covers_queued,
+            'covers_built': self.covers_built,
+            'elapsed': round(elapsed, 1),
+            'throughput': round(throughput, 2),
+            'eta': round(remaining / rate, 1) if rate > 0 else None
+        }
+
+    def _maybe_update(self, force=False):
+        now = time.monotonic()
+        if self.on_update is not None and (force or now - self._last_update >= self.interval):
+            self._last_update = now
+            self.on_update(self.snapshot())
 
 class ComicScanner:
-    def __init__(self, directory_path, mongo):
+    def __init__(self, directory_path, mongo, workers=None, batch_size=None):
         """
         Inizializza il ComicScanner con i dettagli della directory e l'oggetto MongoDB esistente.
 
         :param directory_path: Percorso della directory da scansionare
         :param mongo: Oggetto MongoDB fornito da Flask
+        :param workers: Numero di thread che leggono gli archivi in parallelo (default: SCAN_WORKERS)
+        :param batch_size: Numero di operazioni per ogni bulk_write (default: SCAN_BATCH_SIZE)
         """
         self.directory_path = directory_path
         self.db = mongo.db
         self.comics_collection = self.db.comics
+        self.workers = workers or app.config['SCAN_WORKERS']
+        self.batch_size = batch_size or app.config['SCAN_BATCH_SIZE']
 
-    def scan_and_register_comics(self):
+    def scan_and_register_comics(self, full=False, progress=None, comic_paths=None):
         """
         Scansiona la directory e registra i fumetti e i capitoli trovati nel database.
+
+        In modalità incrementale (predefinita) confronta il filesystem con lo stato
+        salvato all'ultima scansione: vengono riaperti solo gli archivi nuovi o
+        modificati (dimensione o mtime diversi), eliminati i fumetti e i capitoli
+        scomparsi, e gli ID dei fumetti esistenti restano invariati.
+
+        La scansione è una pipeline: il thread chiamante visita le directory, un pool
+        di thread costruisce gli indici delle pagine degli archivi in parallelo e i
+        risultati vengono scritti con bulk_write a gruppi di batch_size operazioni.
+
+        Con comic_paths la scansione si limita alle directory dei fumetti indicate
+        (aggiornamenti mirati del watcher): le altre non vengono visitate.
+
+        :param full: Se True svuota la collezione e riscansiona tutta la libreria
+        :param progress: ScanProgress da aggiornare durante la scansione (opzionale)
+        :param comic_paths: Directory dei fumetti da aggiornare, esistenti o eliminate (opzionale)
         """
-        self.comics_collection.drop()
-        for entry in os.listdir(self.directory_path):
-            entry_path = os.path.join(self.directory_path, entry)
-            if os.path.isdir(entry_path):
-                self._process_comic_directory(entry_path)
+        if full and comic_paths is not None:
+            raise ValueError("Una scansione mirata non può essere completa")
+        self.progress = progress or ScanProgress()
+        if full:
+            self.comics_collection.drop()
+            self.db.chapters.drop()
+        if comic_paths is None:
+            prepare_database()
+
+        known_comics = {comic['path']: comic for comic in Comic.list_scan_state(comic_paths)}
+        comic_ids = None if comic_paths is None else [comic['_id'] for comic in known_comics.values()]
+        known_chapters = defaultdict(dict)
+        for chapter in Chapter.list_scan_state(comic_ids):
+            known_chapters[chapter['comic_id']][chapter['filename']] = chapter
+
+        writer = _BulkWriter(self.batch_size)
+        processed = defaultdict(list)
+        # Fumetti i cui capitoli sono cambiati: le loro statistiche vanno ricalcolate
+        self.touched_comics = set()
+        self.vanished_comics = set()
+        max_pending = self.workers * 4
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='scanner') as executor:
+                pending = {}
+                for entry, comic_id, comic_directory, is_new in self._walk_library(known_comics, known_chapters, writer, comic_paths):
+                    future = executor.submit(self._process_chapter_entry, entry, comic_id)
+                    pending[future] = (comic_directory, is_new)
+                    self.progress.chapter_queued()
+                    if len(pending) >= max_pending:
+                        self._collect(pending, writer, processed, FIRST_COMPLETED)
+                self._collect(pending, writer, processed, ALL_COMPLETED)
+                writer.flush()
+
+                if self.touched_comics:
+                    for operation in Comic.refresh_stats_ops(self.touched_comics):
+                        writer.add(Comic, operation)
+                    writer.flush()
 
-    def _process_comic_directory(self, comic_directory):
+                    # Copertine delle serie modificate: una decodifica per serie, riusata dalla griglia.
+                    # Ogni miniatura pronta aggiorna l'avanzamento, che rinnova anche l'heartbeat del lock
+                    cover_jobs = [executor.submit(ComicService.build_series_cover, comic_id) for comic_id in self.touched_comics]
+                    self.progress.covers_started(len(cover_jobs))
+                    for job in as_completed(cover_jobs):
+                        writer.add(Comic, job.result())
+                        self.progress.cover_built()
+                    writer.flush()
+
+                if processed and app.config['WARM_COVERS_AFTER_SCAN']:
+                    warm_jobs = [
+                        executor.submit(ComicService.warm_covers, comic_directory, [chapter.to_document()])
+                        for comic_directory, chapters in processed.items()
+                        for chapter in chapters
+                    ]
+                    self.progress.covers_started(len(warm_jobs))
+                    for job in as_completed(warm_jobs):
+                        self.progress.cover_built()
+        finally:
+            # I metadati in cache possono riferirsi a capitoli modificati o eliminati
+            metadata_cache.invalidate()
+            snapshot = self.progress.snapshot()
+            scan_seconds.observe(snapshot['elapsed'])
+            scan_chapters.inc(snapshot['archives_listed'] - snapshot['errors'], 'ok')
+            scan_chapters.inc(snapshot['errors'], 'error')
+
+    def _walk_library(self, known_comics, known_chapters, writer, comic_paths=None):
+        """
+        Visita la libreria e produce i capitoli da (ri)processare.
+
+        Le operazioni che non richiedono di aprire archivi (nuovi fumetti, capitoli e
+        fumetti scomparsi, mtime aggiornati) vengono accodate direttamente nel writer.
+
+        :param known_comics: Stato dell'ultima scansione dei fumetti, indicizzato per percorso
+        :param known_chapters: Stato dell'ultima scansione dei capitoli, per ID del fumetto e nome file
+        :param writer: _BulkWriter in cui accodare le operazioni
+        :param comic_paths: Directory dei fumetti a cui limitare la visita (opzionale)
+        :return: Iteratore di tuple (voce, ID del fumetto, directory del fumetto, nuovo capitolo)
+        """
+        seen_paths = set()
+        for comic_directory, mtime in self._iter_comic_directories(comic_paths):
+            seen_paths.add(comic_directory)
+            self.progress.directory_seen()
+            known_comic = known_comics.get(comic_directory)
+            if known_comic is None:
+                yield from self._walk_new_comic(comic_directory, writer)
+            else:
+                chapters = known_chapters.get(known_comic['_id'], {})
+                yield from self._walk_known_comic(known_comic, chapters, mtime, writer)
+
+        vanished_ids = [comic['_id'] for path, comic in known_comics.items() if path not in seen_paths]
+        self.vanished_comics.update(vanished_ids)
+        if vanished_ids:
+            writer.add(Comic, Comic.delete_by_ids_op(vanished_ids))
+            writer.add(Chapter, Chapter.delete_by_comic_ids_op(vanished_ids))
+
+    def _iter_comic_directories(self, comic_paths=None):
+        """
+        Produce (percorso, mtime) delle directory dei fumetti esistenti: tutte quelle
+        della libreria, o solo quelle indicate.
         """
-        Processa una directory come un fumetto e i suoi contenuti come capitoli.
+        if comic_paths is None:
+            with os.scandir(self.directory_path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        yield entry.path, entry.stat().st_mtime
+            return
+
+        for comic_directory in comic_paths:
+            try:
+                stat = os.stat(comic_directory)
+            except FileNotFoundError:
+                continue
+            if os.path.isdir(comic_directory):
+                yield comic_directory, stat.st_mtime
+
+    def _walk_new_comic(self, comic_directory, writer):
+        """
+        Registra una directory come nuovo fumetto e produce tutti i suoi capitoli.
 
         :param comic_directory: Percorso della directory del fumetto
+        :param writer: _BulkWriter in cui accodare l'inserimento del fumetto
         """
         comic_title = os.path.basename(comic_directory)
         metadata = extract_metadata_from_filename(comic_title)
-        comic = Comic(title=metadata['title'], path=comic_directory)
-        comic_id = comic.save()
-
-        for entry in os.listdir(comic_directory):
-            chapter_path = os.path.join(comic_directory, entry)
-            if os.path.isdir(chapter_path):
-                # Capitolo come directory
-                self._process_directory_as_chapter(chapter_path, comic_id)
-            elif allowed_file(entry, {'zip', 'cbz', 'rar', 'cbr'}):
-                # Capitolo come archivio
-                self._process_archive_as_chapter(chapter_path, comic_id)
+        comic = Comic(title=metadata['title'], path=comic_directory, mtime=os.stat(comic_directory).st_mtime, author=metadata['author'])
+        comic_id = ObjectId()
+        writer.add(Comic, comic.insert_op(comic_id))
+        self.touched_comics.add(comic_id)
+
+        with os.scandir(comic_directory) as entries:
+            for entry in entries:
+                if self._is_chapter_entry(entry):
+                    yield entry, comic_id, comic_directory, True
+
+    def _walk_known_comic(self, known_comic, known_chapters, mtime, writer):
+        """
+        Produce solo i capitoli nuovi o modificati di un fumetto già registrato.
+
+        :param known_comic: Documento del fumetto con lo stato dell'ultima scansione
+        :param known_chapters: Capitoli registrati del fumetto, indicizzati per nome file
+        :param mtime: Data di modifica attuale della directory del fumetto
+        :param writer: _BulkWriter in cui accodare rimozioni e aggiornamenti
+        """
+        comic_id = known_comic['_id']
+        comic_directory = known_comic['path']
+        seen_filenames = set()
+
+        with os.scandir(comic_directory) as entries:
+            for entry in entries:
+                if not self._is_chapter_entry(entry):
+                    continue
+                seen_filenames.add(entry.name)
+                known_chapter = known_chapters.get(entry.name)
+                if known_chapter is None or not self._is_unchanged(known_chapter, entry):
+                    self.touched_comics.add(comic_id)
+                    yield entry, comic_id, comic_directory, known_chapter is None
+
+        vanished_filenames = set(known_chapters) - seen_filenames
+        if vanished_filenames:
+            self.touched_comics.add(comic_id)
+            writer.add(Chapter, Chapter.delete_by_filenames_op(comic_id, vanished_filenames))
+        if known_comic.get('mtime') != mtime:
+            writer.add(Comic, Comic.update_mtime_op(comic_id, mtime))
+
+    def _collect(self, pending, writer, processed, return_when):
+        """
+        Attende i capitoli in lavorazione e accoda il loro salvataggio nel writer.
+
+        :param pending: Dizionario future -> (directory del fumetto, nuovo capitolo)
+        :param writer: _BulkWriter in cui accodare i salvataggi
+        :param processed: Capitoli processati, raggruppati per directory del fumetto
+        :param return_when: FIRST_COMPLETED o ALL_COMPLETED
+        """
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            comic_directory, is_new = pending.pop(future)
+            try:
+                chapter = future.result()
+            except Exception as e:
+                app.logger.warning("Impossibile leggere un capitolo di %s: %s", comic_directory, e)
+                self.progress.archive_listed(failed=True)
+                continue
+            self.progress.archive_listed()
+            writer.add(Chapter, chapter.save_op() if is_new else chapter.replace_op())
+            processed[comic_directory].append(chapter)
+
+    @staticmethod
+    def _is_chapter_entry(entry):
+        """
+        Verifica se una voce della directory di un fumetto è un capitolo (directory o archivio).
+        """
+        return entry.is_dir() or allowed_file(entry.name, {'zip', 'cbz', 'rar', 'cbr'})
+
+    @staticmethod
+    def _is_unchanged(known_chapter, entry):
+        """
+        Confronta dimensione e mtime registrati di un capitolo con quelli attuali.
+        """
+        size, mtime = chapter_stat(entry.path, not entry.is_dir())
+        return known_chapter.get('mtime') == mtime and known_chapter.get('size') == size
+
+    def _process_chapter_entry(self, entry, comic_id):
+        """
+        Processa una voce della directory di un fumetto come capitolo, se lo è.
+
+        :param entry: os.DirEntry della directory del fumetto
+        :param comic_id: ID del fumetto a cui appartiene il capitolo
+        :return: Capitolo non ancora salvato, o None se la voce non è un capitolo
+        """
+        if entry.is_dir():
+            # Capitolo come directory
+            return self._process_directory_as_chapter(entry.path, comic_id)
+        elif allowed_file(entry.name, {'zip', 'cbz', 'rar', 'cbr'}):
+            # Capitolo come archivio
+            return self._process_archive_as_chapter(entry.path, comic_id)
+        return None
 
     def _process_directory_as_chapter(self, chapter_directory, comic_id):
         """
@@ -52,26 +390,31 @@ class ComicScanner:
 
         :param chapter_directory: Percorso della directory del capitolo
         :param comic_id: ID del fumetto a cui appartiene il capitolo
+        :return: Capitolo da salvare
         """
         chapter_filename = os.path.basename(chapter_directory)
         chapter_number = self._extract_chapter_number(chapter_filename)
         chapter_title = 'Chapter '+str(chapter_number)
         chapter_is_archive = False
 
-        # Ottieni il numero di pagine contandole nella directory
-        page_files = list_images(chapter_directory, chapter_is_archive)
-        page_count = len(page_files)
+        # Dimensione e mtime lette prima dell'elenco: se la directory cambia durante la lettura
+        # l'indice risulta già obsoleto e viene ricostruito, invece di essere registrato come attuale
+        size, mtime = chapter_stat(chapter_directory, chapter_is_archive)
+        # Costruisci l'indice delle pagine della directory
+        pages = build_page_index(chapter_directory, chapter_is_archive)
+        page_count = len(pages)
 
-        # Salva il capitolo nel database
-        chapter = Chapter(
+        return Chapter(
             comic_id=comic_id,
             title=chapter_title,
             number=chapter_number,
             filename=chapter_filename,
             page_count=page_count,
-            is_archive=chapter_is_archive
+            is_archive=chapter_is_archive,
+            pages=pages,
+            mtime=mtime,
+            size=size
         )
-        chapter.save()
 
     def _process_archive_as_chapter(self, archive_path, comic_id):
         """
@@ -79,26 +422,30 @@ class ComicScanner:
 
         :param archive_path: Percorso dell'archivio
         :param comic_id: ID del fumetto a cui appartiene il capitolo
+        :return: Capitolo da salvare
         """
         chapter_filename = os.path.basename(archive_path)
         chapter_number = self._extract_chapter_number(chapter_filename)
         chapter_title = 'Chapter '+str(chapter_number)
         chapter_is_archive = True
 
-        # Ottieni il numero di pagine contandole nella directory
-        page_files = list_images(archive_path, chapter_is_archive)
-        page_count = len(page_files)
+        # Dimensione e mtime lette prima dell'elenco, come per le directory
+        size, mtime = chapter_stat(archive_path, chapter_is_archive)
+        # Costruisci l'indice delle pagine dell'archivio
+        pages = build_page_index(archive_path, chapter_is_archive)
+        page_count = len(pages)
 
-        # Salva il capitolo nel database
-        chapter = Chapter(
+        return Chapter(
             comic_id=comic_id,
             title=chapter_title,
             number=chapter_number,
             filename=chapter_filename,
             page_count=page_count,
-            is_archive=chapter_is_archive
+            is_archive=chapter_is_archive,
+            pages=pages,
+            mtime=mtime,
+            size=size
         )
-        chapter.save()
 
     def _extract_chapter_number(self, chapter_name):
         """
@@ -0,0 +1,268 @@
+# app/services/search.py
+
+import bisect
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+from app import app
+from app.models import Comic, ScanJob
+from app.utils import normalize_text
+
+# Frazione minima dei trigrammi della query presenti nel fumetto per i risultati approssimati
+FUZZY_THRESHOLD = 0.5
+# Parole esaminate al massimo per un prefisso molto comune
+PREFIX_SCAN_LIMIT = 500
+
+def trigrams(text):
+    """
+    Trigrammi delle parole di un testo normalizzato, con le parole delimitate da spazi.
+
+    :param text: Testo normalizzato
+    :return: Set di trigrammi
+    """
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class _Entry:
+    __slots__ = ('document', 'text', 'words', 'trigrams', 'sort_key')
+
+    def __init__(self, document):
+        self.document = document
+        self.text = normalize_text(f"{document.get('title', '')} {document.get('author') or ''}")
+        self.words = set(self.text.split())
+        self.trigrams = trigrams(self.text)
+        self.sort_key = document.get('sort_title') or ''
+
+class SearchIndex:
+    def __init__(self, loader, last_change, refresh_interval=60):
+        """
+        Indice in memoria per la ricerca per titolo e autore, con completamento
+        del prefisso delle parole e ricerca approssimata sui trigrammi.
+
+        L'indice viene costruito alla prima ricerca. Lo scanner del processo lo
+        aggiorna in modo incrementale a fine scansione; gli altri processi ogni
+        refresh_interval secondi controllano la data dell'ultima scansione e, se è
+        cambiata, ricostruiscono l'indice in background.
+
+        :param loader: Funzione (comic_ids=None) che restituisce i documenti da indicizzare
+        :param last_change: Funzione che restituisce un valore che cambia a ogni scansione completata
+        :param refresh_interval: Secondi tra due controlli di last_change
+        """
+        self.loader = loader
+        self.last_change = last_change
+        self.refresh_interval = refresh_interval
+        self._entries = {}
+        self._trigrams = defaultdict(set)
+        # Coppie (parola, ID) ordinate, per la ricerca per prefisso con bisect
+        self._words = []
+        self._built = False
+        self._version = None
+        self._checked_at = 0.0
+        self._rebuilding = False
+        self._lock = threading.RLock()
+
+    def search(self, query, limit=10):
+        """
+        Cerca i fumetti il cui titolo o autore corrisponde alla query.
+
+        Prima vengono i fumetti in cui ogni parola della query è il prefisso di una
+        parola del titolo o dell'autore (i titoli che iniziano con la query per primi);
+        se non bastano si aggiungono quelli con trigrammi simili, per gli errori di battitura.
+
+        :param query: Testo cercato
+        :param limit: Numero massimo di risultati
+        :return: Lista dei documenti dei fumetti, dal più pertinente
+        """
+        text = normalize_text(query)
+        if not text or limit <= 0:
+            return []
+        self._ensure_fresh()
+
+        with self._lock:
+            scores = {}
+            for comic_id in self._prefix_matches(text.split(), limit):
+                entry = self._entries[comic_id]
+                scores[comic_id] = 3.0 if entry.text.startswith(text) else 2.0
+
+            # La ricerca approssimata usa solo le parole di almeno tre lettere:
+            # l'ultima parola digitata a metà è già coperta dal prefisso
+            fuzzy_text = ' '.join(term for term in text.split() if len(term) >= 3)
+            if len(scores) < limit and fuzzy_text:
+                for comic_id, similarity in self._fuzzy_matches(fuzzy_text):
+                    if comic_id not in scores:
+                        scores[comic_id] = similarity
+
+            best = heapq.nsmallest(
+                limit, scores.items(),
+                key=lambda item: (-item[1], self._entries[item[0]].sort_key)
+            )
+            return [self._entries[comic_id].document for comic_id, _ in best]
+
+    def rebuild(self):
+        """
+        Ricostruisce l'intero indice dal database.
+        """
+        version = self.last_change()
+        documents = list(self.loader())
+        entries = {document['_id']: _Entry(document) for document in documents}
+        grams = defaultdict(set)
+        words = []
+        for comic_id, entry in entries.items():
+            for gram in entry.trigrams:
+                grams[gram].add(comic_id)
+            words.extend((word, comic_id) for word in entry.words)
+        words.sort()
+
+        with self._lock:
+            self._entries, self._trigrams, self._words = entries, grams, words
+            self._built = True
+            self._version = version
+            self._checked_at = time.monotonic()
+        app.logger.info("Indice di ricerca ricostruito: %d fumetti", len(entries))
+
+    def refresh(self, comic_ids, removed_ids=()):
+        """
+        Aggiorna l'indice solo per i fumetti modificati e rimossi da una scansione.
+
+        :param comic_ids: ID dei fumetti nuovi o modificati
+        :param removed_ids: ID dei fumetti eliminati
+        """
+        with self._lock:
+            if not self._built:
+                # Verrà costruito per intero alla prima ricerca
+                return
+        documents = list(self.loader(comic_ids)) if comic_ids else []
+        version = self.last_change()
+
+        with self._lock:
+            for comic_id in list(comic_ids) + list(removed_ids):
+                self._remove(comic_id)
+            for document in documents:
+                self._add(_Entry(document))
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def _add(self, entry):
+        comic_id = entry.document['_id']
+        self._entries[comic_id] = entry
+        for gram in entry.trigrams:
+            self._trigrams[gram].add(comic_id)
+        for word in entry.words:
+            bisect.insort(self._words, (word, comic_id))
+
+    def _remove(self, comic_id):
+        entry = self._entries.pop(comic_id, None)
+        if entry is None:
+            return
+        for gram in entry.trigrams:
+            postings = self._trigrams.get(gram)
+            if postings is not None:
+                postings.discard(comic_id)
+                if not postings:
+                    del self._trigrams[gram]
+        for word in entry.words:
+            index = bisect.bisect_left(self._words, (word, comic_id))
+            if index < len(self._words) and self._words[index] == (word, comic_id):
+                del self._words[index]
+
+    def _prefix_range(self, prefix):
+        """
+        Intervallo di self._words con le parole che iniziano con prefix.
+        """
+        start = bisect.bisect_left(self._words, (prefix,))
+        stop = bisect.bisect_left(self._words, (prefix + '\uffff',))
+        return start, stop
+
+    def _prefix_matches(self, terms, limit):
+        """
+        ID dei fumetti in cui ogni termine è il prefisso di almeno una parola.
+
+        Si parte dal termine più selettivo (l'intervallo più corto nell'elenco
+        ordinato delle parole) e si verificano gli altri solo sui candidati. Per i
+        prefissi molto comuni (es. una sola lettera) ci si ferma dopo PREFIX_SCAN_LIMIT parole.
+        """
+        ranges = sorted(((self._prefix_range(term), term) for term in terms), key=lambda item: item[0][1] - item[0][0])
+        (start, stop), first = ranges[0]
+        stop = min(stop, start + max(PREFIX_SCAN_LIMIT, limit * 20))
+        candidates = {self._words[index][1] for index in range(start, stop)}
+
+        others = [term for _, term in ranges[1:]]
+        if not others:
+            return candidates
+        return {
+            comic_id for comic_id in candidates
+            if all(any(word.startswith(term) for word in self._entries[comic_id].words) for term in others)
+        }
+
+    def _fuzzy_matches(self, text):
+        """
+        Produce (ID, somiglianza) dei fumetti che contengono almeno FUZZY_THRESHOLD
+        dei trigrammi del testo; la somiglianza resta sotto il punteggio dei prefissi.
+
+        Un fumetto che supera la soglia deve comparire in almeno una delle liste dei
+        trigrammi più rari: le liste più lunghe servono solo a contare, non a trovare candidati.
+        """
+        query_grams = trigrams(text)
+        if not query_grams:
+            return
+        required = max(1, math.ceil(FUZZY_THRESHOLD * len(query_grams)))
+        by_rarity = sorted(query_grams, key=lambda gram: len(self._trigrams.get(gram, ())))
+        candidates = set()
+        for gram in by_rarity[:len(by_rarity) - required + 1]:
+            candidates.update(self._trigrams.get(gram, ()))
+
+        for comic_id in candidates:
+            similarity = len(query_grams & self._entries[comic_id].trigrams) / len(query_grams)
+            if similarity >= FUZZY_THRESHOLD:
+                yield comic_id, similarity * 0.99
+
+    def _ensure_fresh(self):
+        with self._lock:
+            built = self._built
+            due = time.monotonic() - self._checked_at >= self.refresh_interval
+            if due:
+                self._checked_at = time.monotonic()
+        if not built:
+            with self._lock:
+                if not self._built:
+                    self.rebuild()
+            return
+        if not due:
+            return
+
+        try:
+            version = self.last_change()
+        except Exception as e:
+            app.logger.warning("Controllo dell'indice di ricerca fallito: %s", e)
+            return
+        with self._lock:
+            if version == self._version or self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._background_rebuild, name='search-index', daemon=True).start()
+
+    def _background_rebuild(self):
+        try:
+            with app.app_context():
+                self.rebuild()
+        except Exception as e:
+            app.logger.warning("Ricostruzione dell'indice di ricerca fallita: %s", e)
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'comics': len(self._entries),
+                'trigrams': len(self._trigrams),
+                'words': len(self._words),
+                'built': self._built
+            }
+
+search_index = SearchIndex(Comic.list_search_documents, ScanJob.get_last_finished_at, app.config['SEARCH_REFRESH_INTERVAL'])
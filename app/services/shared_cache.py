@@ -0,0 +1,224 @@
+# app/services/shared_cache.py
+
+import fcntl
+import os
+import struct
+import threading
+import time
+from .derivative_cache import DerivativeCache
+from .page_stream import FileWindow, PageContent
+
+# Intestazione di ogni pagina: firma, lunghezza del mimetype (uint8) e mimetype in ASCII
+MAGIC = b'CVP1'
+EXTENSION = 'page'
+# Contatori condivisi nel file .usage: byte occupati e numero di pagine (int64)
+USAGE_FORMAT = '<qq'
+# I file temporanei più vecchi di così sono resti di un processo terminato durante la scrittura
+STALE_TEMP_SECONDS = 60
+
+class SharedPageCache(DerivativeCache):
+    def __init__(self, folder, max_bytes, touch_interval=30):
+        """
+        Cache delle pagine decompresse condivisa da tutti i processi dell'host.
+
+        Ogni pagina è un file in una directory su tmpfs (es. /dev/shm): i file di
+        tmpfs vivono in memoria condivisa, quindi ogni worker legge le stesse pagine
+        fisiche e una pagina viene decompressa una volta per host, non una per worker.
+        Le pagine vengono servite direttamente dal file, senza copiarle nella memoria
+        del processo.
+
+        La scrittura atomica (file temporaneo e rename) fa da indice sicuro tra
+        processi: una pagina è visibile solo quando è completa. L'occupazione totale è
+        tenuta in un contatore condiviso protetto da flock e viene ricalcolata dal
+        disco all'avvio e a ogni eliminazione, così un processo terminato a metà non
+        lascia la cache oltre il limite.
+
+        :param folder: Directory della cache, preferibilmente su tmpfs
+        :param max_bytes: Memoria massima complessiva delle pagine, per tutti i processi
+        :param touch_interval: Secondi dopo cui una lettura aggiorna la data della pagina, per l'LRU
+        """
+        super().__init__(folder, max_bytes, touch_interval)
+        self.hits = 0
+        self.misses = 0
+        self._usage_path = os.path.join(folder, '.usage')
+        self._recovered = False
+        self._recover_lock = threading.Lock()
+
+    @staticmethod
+    def _key(key):
+        chapter_path, mtime, page_number = key
+        return DerivativeCache.make_key(f'{chapter_path}#{page_number}', mtime, 'page')
+
+    def open(self, key):
+        """
+        Restituisce la pagina pronta per l'invio, letta direttamente dal file condiviso.
+
+        :param key: Tuple (percorso del capitolo, mtime, numero di pagina)
+        :return: PageContent, o None se la pagina non è in cache
+        """
+        self._ensure_recovered()
+        path = self.get(self._key(key), EXTENSION)
+        try:
+            if path is not None:
+                with open(path, 'rb') as page_file:
+                    header = page_file.read(len(MAGIC) + 1 + 255)
+                    file_size = os.fstat(page_file.fileno()).st_size
+                mimetype, offset = _parse_header(header)
+                if mimetype is not None:
+                    self.hits += 1
+                    return PageContent(mimetype, file_size - offset, file=FileWindow(path, offset, file_size - offset))
+        except FileNotFoundError:
+            # Eliminata da un altro processo tra la ricerca e l'apertura
+            pass
+        self.misses += 1
+        return None
+
+    def get(self, key, extension=None):
+        """
+        Con la chiave di una pagina restituisce (byte, mimetype), come PageByteCache.get;
+        con chiave ed estensione si comporta come DerivativeCache.get.
+        """
+        if extension is not None:
+            return super().get(key, extension)
+        content = self.open(key)
+        if content is None:
+            return None
+        return content.read(), content.mimetype
+
+    def __contains__(self, key):
+        return os.path.exists(self.path_for(self._key(key), EXTENSION))
+
+    def put(self, key, data, mimetype):
+        """
+        Aggiunge una pagina, eliminando le meno recenti se si supera il limite.
+        Le pagine più grandi di un quarto del limite non vengono salvate.
+
+        :param key: Tuple (percorso del capitolo, mtime, numero di pagina)
+        :param data: Byte della pagina
+        :param mimetype: Mimetype della pagina
+        """
+        if len(data) > self.max_bytes // 4:
+            return
+        self._ensure_recovered()
+        encoded = mimetype.encode('ascii')
+        super().put(self._key(key), EXTENSION, MAGIC + bytes([len(encoded)]) + encoded + data)
+
+    def clear(self):
+        """
+        Svuota la cache per tutti i processi.
+        """
+        with self._usage_file() as fd:
+            for path, _, _ in list(self._iter_files()):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            _write_usage(fd, 0, 0)
+
+    @property
+    def size(self):
+        """
+        Byte occupati dalla cache, per tutti i processi.
+        """
+        self._ensure_recovered()
+        with self._usage_file() as fd:
+            return _read_usage(fd)[0]
+
+    def _account(self, added):
+        """
+        Aggiorna il contatore condiviso dopo l'aggiunta di una pagina e applica il limite.
+        """
+        with self._usage_file() as fd:
+            used, entries = _read_usage(fd)
+            used, entries = used + added, entries + 1
+            if used > self.max_bytes:
+                with self._lock:
+                    self._evict()
+                    used, entries = self._size, sum(1 for _ in self._iter_files())
+            _write_usage(fd, used, entries)
+
+    def _ensure_recovered(self):
+        """
+        Alla prima operazione del processo elimina i file temporanei abbandonati e
+        ricalcola i contatori dal disco.
+        """
+        if self._recovered:
+            return
+        with self._recover_lock:
+            if self._recovered:
+                return
+            os.makedirs(self.folder, exist_ok=True)
+            with self._usage_file() as fd:
+                now = time.time()
+                for root, dirs, files in os.walk(self.folder):
+                    for name in files:
+                        if not name.endswith('.tmp'):
+                            continue
+                        path = os.path.join(root, name)
+                        try:
+                            if now - os.stat(path).st_mtime > STALE_TEMP_SECONDS:
+                                os.remove(path)
+                        except FileNotFoundError:
+                            pass
+                files = list(self._iter_files())
+                _write_usage(fd, sum(entry[2] for entry in files), len(files))
+            self._recovered = True
+
+    def _usage_file(self):
+        return _LockedFile(self._usage_path)
+
+    def stats(self):
+        self._ensure_recovered()
+        with self._usage_file() as fd:
+            used, entries = _read_usage(fd)
+        lookups = self.hits + self.misses
+        return {
+            'shared': True,
+            'folder': self.folder,
+            'entries': entries,
+            'bytes': used,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None
+        }
+
+class _LockedFile:
+    """
+    File dei contatori aperto con un lock esclusivo (flock) valido tra processi.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self._fd
+
+    def __exit__(self, *exc_info):
+        # Chiudere il descrittore rilascia anche il lock
+        os.close(self._fd)
+        self._fd = None
+
+def _read_usage(fd):
+    raw = os.pread(fd, struct.calcsize(USAGE_FORMAT), 0)
+    if len(raw) != struct.calcsize(USAGE_FORMAT):
+        return 0, 0
+    used, entries = struct.unpack(USAGE_FORMAT, raw)
+    return max(0, used), max(0, entries)
+
+def _write_usage(fd, used, entries):
+    os.pwrite(fd, struct.pack(USAGE_FORMAT, used, entries), 0)
+
+def _parse_header(header):
+    """
+    Restituisce (mimetype, posizione dei dati) dall'inizio di un file di pagina, o (None, 0) se non valido.
+    """
+    if not header.startswith(MAGIC) or len(header) <= len(MAGIC):
+        return None, 0
+    length = header[len(MAGIC)]
+    start = len(MAGIC) + 1
+    if len(header) < start + length:
+        return None, 0
+    return header[start:start + length].decode('ascii'), start + length
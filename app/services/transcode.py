@@ -0,0 +1,100 @@
+# app/services/transcode.py
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from .executors import ExecutorBusy, ExecutorTimeout
+
+# Moduli importati una volta dal server da cui nascono i processi (niente che avvii thread):
+# le funzioni di conversione stanno in imaging, fuori dal pacchetto app
+FORKSERVER_PRELOAD = ['imaging']
+
+class TranscodePool:
+    def __init__(self, workers, max_pending=32, timeout=None):
+        """
+        Pool di processi per le conversioni di immagini, che occupano la CPU e
+        bloccherebbero i thread delle richieste trattenendo il GIL.
+
+        I processi vengono avviati alla prima conversione. Con workers a 0 le
+        conversioni vengono eseguite nel thread chiamante. Come BoundedExecutor,
+        rifiuta i lavori oltre workers + max_pending e smette di attendere dopo timeout secondi.
+
+        :param workers: Numero di processi
+        :param max_pending: Numero massimo di conversioni in attesa oltre a quelle in esecuzione
+        :param timeout: Secondi di attesa massima del risultato (None per nessun limite)
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.rejected = 0
+        self.timed_out = 0
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def run(self, func, *args):
+        """
+        Esegue func(*args) in un processo del pool e ne attende il risultato.
+
+        func e argomenti devono essere serializzabili: funzioni del modulo imaging e byte.
+
+        :param func: Funzione da eseguire
+        :return: Risultato della funzione
+        :raises ExecutorBusy: Se il pool è saturo
+        :raises ExecutorTimeout: Se il risultato non arriva entro il tempo massimo
+        """
+        if self.workers <= 0:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise ExecutorBusy("transcode: troppe conversioni in coda")
+        executor = self._get_executor()
+        try:
+            future = executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            self.timed_out += 1
+            raise ExecutorTimeout(f"transcode: tempo massimo di {self.timeout}s superato")
+        except BrokenProcessPool:
+            # Un processo è terminato in modo anomalo: il pool verrà ricreato alla prossima richiesta
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # I worker dell'applicazione hanno già altri thread (richieste, lettura anticipata, monitor
+                # di pymongo): un fork da qui può copiare nel figlio un lock tenuto da uno di essi. Con
+                # forkserver i processi nascono da un server avviato con exec, senza thread, che ha
+                # importato solo imaging e Pillow; l'applicazione non viene mai importata nei processi.
+                context = None
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(FORKSERVER_PRELOAD)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._executor
+
+    def shutdown(self):
+        """
+        Termina i processi del pool.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'available': self._slots._value,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out
+        }
@@ -0,0 +1,279 @@
+# app/services/watcher.py
+
+import os
+import threading
+import time
+import zipfile
+from app import app
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog è opzionale: senza si usa il polling
+    FileSystemEventHandler = object
+    Observer = None
+
+BACKENDS = ('auto', 'inotify', 'poll')
+
+# Intervallo dopo cui si riprova un aggiornamento rimandato perché era in corso un'altra scansione
+BUSY_RETRY = 5.0
+
+class LibraryWatcher:
+    def __init__(self, directory_path, apply, backend='auto', debounce=2.0, settle=2.0, poll_interval=10.0):
+        """
+        Osserva la libreria e aggiorna solo le serie modificate, senza riscansionare tutto.
+
+        Gli eventi vengono ricondotti alla directory della serie (primo livello sotto la
+        libreria) e raggruppati: una serie viene aggiornata solo quando non riceve eventi
+        da 'debounce' secondi e il suo contenuto (nomi, dimensioni, mtime) è rimasto
+        identico per 'settle' secondi, con tutti gli archivi ZIP leggibili. Così una serie
+        copiata file per file produce un solo aggiornamento, a copia terminata.
+
+        :param directory_path: Percorso della libreria
+        :param apply: Funzione (percorsi delle serie) che aggiorna le serie; restituisce False se va ritentata
+        :param backend: 'inotify' (watchdog), 'poll' (confronto periodico delle mtime) o 'auto'
+        :param debounce: Secondi di quiete dopo l'ultimo evento di una serie
+        :param settle: Secondi per cui il contenuto di una serie deve restare invariato
+        :param poll_interval: Secondi tra due controlli del backend 'poll'
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend del watcher non valido: {backend}")
+        if backend == 'inotify' and Observer is None:
+            raise RuntimeError("Il backend 'inotify' richiede il pacchetto watchdog")
+        self.directory_path = os.path.abspath(directory_path)
+        self.apply = apply
+        self.backend = 'poll' if backend == 'poll' or Observer is None else 'inotify'
+        self.debounce = debounce
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.events = 0
+        self.updates = 0
+        self.retries = 0
+        # Serie in attesa: percorso -> (istante del prossimo controllo, ultimo snapshot)
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._observer = None
+        self._threads = []
+
+    def start(self):
+        """
+        Avvia il backend di osservazione e il thread che applica gli aggiornamenti.
+        """
+        if self.backend == 'inotify':
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self), self.directory_path, recursive=True)
+            self._observer.start()
+        else:
+            self._threads.append(threading.Thread(target=self._poll_loop, name='watcher-poll', daemon=True))
+        self._threads.append(threading.Thread(target=self._dispatch_loop, name='watcher', daemon=True))
+        for thread in self._threads:
+            thread.start()
+        app.logger.info("Watcher della libreria avviato su %s (backend %s)", self.directory_path, self.backend)
+
+    def stop(self):
+        """
+        Ferma l'osservazione; gli aggiornamenti ancora in attesa vengono scartati.
+        """
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        for thread in self._threads:
+            thread.join()
+
+    def run_forever(self):
+        """
+        Avvia il watcher e blocca il thread chiamante fino a un'interruzione da tastiera.
+        """
+        self.start()
+        try:
+            while not self._stopped.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def notify(self, path):
+        """
+        Segnala una modifica a un percorso della libreria.
+
+        :param path: Percorso del file o della directory modificata
+        """
+        series_path = self.series_for(path)
+        if series_path is None:
+            return
+        with self._condition:
+            self.events += 1
+            self._pending[series_path] = (time.monotonic() + self.debounce, None)
+            self._condition.notify()
+
+    def series_for(self, path):
+        """
+        Restituisce la directory della serie che contiene un percorso, o None se è fuori dalla libreria.
+
+        :param path: Percorso di un file o di una directory
+        :return: Percorso della directory della serie
+        """
+        relative = os.path.relpath(os.path.abspath(path), self.directory_path)
+        name = relative.split(os.sep, 1)[0]
+        if name in ('.', '..') or name.startswith('.'):
+            return None
+        return os.path.join(self.directory_path, name)
+
+    def _dispatch_loop(self):
+        while not self._stopped.is_set():
+            with self._condition:
+                now = time.monotonic()
+                due = [path for path, (deadline, _) in self._pending.items() if deadline <= now]
+                if not due:
+                    deadlines = [deadline for deadline, _ in self._pending.values()]
+                    timeout = min(deadlines) - now if deadlines else None
+                    self._condition.wait(timeout)
+                    continue
+
+            ready = [path for path in due if self._is_settled(path)]
+            if ready:
+                self._apply(ready)
+
+    def _is_settled(self, path):
+        """
+        Controlla se una serie in attesa è pronta: se non lo è rimanda il controllo di 'settle' secondi.
+        """
+        snapshot = _snapshot(path)
+        with self._condition:
+            entry = self._pending.get(path)
+            if entry is None:
+                return False
+            # Un nuovo evento arrivato durante lo snapshot ha già spostato la scadenza
+            if entry[0] > time.monotonic():
+                return False
+            if snapshot is not None and (snapshot != entry[1] or not _archives_complete(path, snapshot)):
+                self._pending[path] = (time.monotonic() + self.settle, snapshot)
+                return False
+            del self._pending[path]
+            return True
+
+    def _apply(self, paths):
+        try:
+            applied = self.apply(paths)
+        except Exception:
+            app.logger.exception("Aggiornamento delle serie %s fallito", paths)
+            applied = False
+        if applied:
+            self.updates += 1
+            app.logger.info("Aggiornate dal watcher: %s", ', '.join(os.path.basename(path) for path in paths))
+            return
+
+        # Scansione già in corso o errore: si riprova più tardi, salvo nuovi eventi nel frattempo
+        self.retries += 1
+        with self._condition:
+            for path in paths:
+                self._pending.setdefault(path, (time.monotonic() + BUSY_RETRY, None))
+
+    def _poll_loop(self):
+        """
+        Backend di polling, per i filesystem di rete dove inotify non vede le modifiche remote.
+
+        Confronta a ogni giro le mtime delle serie e dei loro elementi diretti: costa
+        un listing per serie, senza aprire archivi né interrogare il database.
+        """
+        previous = self._poll_state()
+        while not self._stopped.wait(self.poll_interval):
+            current = self._poll_state()
+            for path in previous.keys() | current.keys():
+                if previous.get(path) != current.get(path):
+                    self.notify(path)
+            previous = current
+
+    def _poll_state(self):
+        state = {}
+        try:
+            with os.scandir(self.directory_path) as entries:
+                for entry in entries:
+                    if entry.is_dir() and not entry.name.startswith('.'):
+                        state[entry.path] = _snapshot(entry.path)
+        except OSError as e:
+            app.logger.warning("Lettura della libreria %s fallita: %s", self.directory_path, e)
+        return state
+
+    def stats(self):
+        with self._condition:
+            return {
+                'backend': self.backend,
+                'events': self.events,
+                'updates': self.updates,
+                'retries': self.retries,
+                'pending': len(self._pending)
+            }
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.event_type in ('opened', 'closed_no_write'):
+            return
+        self.watcher.notify(event.src_path)
+        dest_path = getattr(event, 'dest_path', None)
+        if dest_path:
+            self.watcher.notify(dest_path)
+
+def _snapshot(series_path):
+    """
+    Nome, dimensione e mtime degli elementi di una serie, inclusi i file dei capitoli in directory.
+
+    :return: Tuple ordinata, o None se la serie non esiste più
+    """
+    items = []
+    try:
+        with os.scandir(series_path) as entries:
+            for entry in entries:
+                items.append(_describe(entry.name, entry))
+                if entry.is_dir():
+                    try:
+                        with os.scandir(entry.path) as files:
+                            items.extend(_describe(f'{entry.name}/{file.name}', file) for file in files)
+                    except OSError:
+                        continue
+    except FileNotFoundError:
+        return None
+    except NotADirectoryError:
+        return ()
+    return tuple(sorted(items))
+
+def _describe(name, entry):
+    try:
+        stat = entry.stat()
+    except OSError:
+        # File rimosso durante il listing: lo snapshot cambierà al prossimo controllo
+        return name, -1, 0
+    return name, stat.st_size, stat.st_mtime
+
+def _archives_complete(series_path, snapshot):
+    """
+    Controlla che gli archivi ZIP della serie abbiano la directory centrale, scritta per ultima.
+    """
+    for name, _, _ in snapshot:
+        if os.path.splitext(name)[1].lower() in ('.cbz', '.zip'):
+            if not zipfile.is_zipfile(os.path.join(series_path, name)):
+                return False
+    return True
+
+def create_library_watcher():
+    """
+    Crea il watcher della libreria configurato, che applica gli aggiornamenti tramite scan_job_manager.
+    """
+    from .scan_jobs import scan_job_manager
+    return LibraryWatcher(
+        app.config['COMICS_FOLDER'],
+        scan_job_manager.run_paths,
+        backend=app.config['WATCHER_BACKEND'],
+        debounce=app.config['WATCHER_DEBOUNCE'],
+        settle=app.config['WATCHER_SETTLE'],
+        poll_interval=app.config['WATCHER_POLL_INTERVAL']
+    )
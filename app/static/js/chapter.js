@@ -1,11 +1,122 @@
 $(document).ready(function(){
-	$('.carousel-inner').slick({
+	const carousel = $('.carousel-inner');
+	const startPage = parseInt(carousel.data('start-page'), 10) || 0;
+
+	carousel.slick({
 		dots: true,
 		autoplay: false,
 		arrows: false,
 		rtl: true,
 		infinite: false,
 		adaptiveHeight: false,
+		initialSlide: startPage,
+	});
+
+	// Caricamento delle pagine a finestre: una richiesta per blocco di pagine invece di una per pagina
+	const bulkUrl = carousel.data('bulk-url');
+	const windowSize = parseInt(carousel.data('window'), 10) || 8;
+	const totalPages = parseInt(carousel.data('pages'), 10) || 0;
+	const requestedWindows = new Set();
+	// Le pagine vengono ridotte alla larghezza effettiva dello schermo, in WebP se il browser lo supporta,
+	// solo se la variante è davvero più stretta della pagina: altrimenti si ricevono i byte originali
+	const screenWidth = Math.ceil(carousel.width() * (window.devicePixelRatio || 1));
+	const variantWidths = String(carousel.data('variant-widths') || '').split(',').map(Number).filter(Boolean);
+	const pageWidth = parseInt(carousel.data('page-width'), 10) || 0;
+	// Il server arrotonda alla più piccola larghezza prevista che contiene lo schermo
+	const variantWidth = variantWidths.find(width => width >= screenWidth);
+	const canvas = document.createElement('canvas');
+	const variantFormat = canvas.toDataURL('image/webp').startsWith('data:image/webp') ? 'webp' : 'jpeg';
+	const useVariant = variantWidth !== undefined && (!pageWidth || variantWidth < pageWidth);
+	const variantQuery = useVariant ? `w=${variantWidth}&fmt=${variantFormat}` : '';
+
+	// Gli URL delle pagine possono già contenere la versione del capitolo (?v=)
+	function withQuery(url, query) {
+		if (!query) {
+			return url;
+		}
+		return `${url}${url.includes('?') ? '&' : '?'}${query}`;
+	}
+
+	function showPage(pageNumber, src) {
+		carousel.find(`img[data-page="${pageNumber}"]`).attr('src', src);
+	}
+
+	function fallbackWindow(start) {
+		for (let page = start; page < Math.min(start + windowSize, totalPages); page++) {
+			const image = carousel.find(`img[data-page="${page}"]`);
+			if (!image.attr('src')) {
+				image.attr('src', withQuery(image.data('src'), variantQuery));
+			}
+		}
+	}
+
+	function parseFrames(buffer) {
+		// Ogni frame: pagina (uint32), lunghezza (uint32), lunghezza mimetype (uint8), mimetype, dati
+		const view = new DataView(buffer);
+		const decoder = new TextDecoder('ascii');
+		let offset = 0;
+		while (offset + 9 <= buffer.byteLength) {
+			const pageNumber = view.getUint32(offset);
+			const size = view.getUint32(offset + 4);
+			const mimeLength = view.getUint8(offset + 8);
+			const mimetype = decoder.decode(new Uint8Array(buffer, offset + 9, mimeLength));
+			offset += 9 + mimeLength;
+			const blob = new Blob([new Uint8Array(buffer, offset, size)], { type: mimetype });
+			offset += size;
+			showPage(pageNumber, URL.createObjectURL(blob));
+		}
+	}
+
+	function loadWindow(index) {
+		const start = index * windowSize;
+		if (start >= totalPages || requestedWindows.has(index)) {
+			return;
+		}
+		requestedWindows.add(index);
+		fetch(withQuery(withQuery(bulkUrl, `start=${start}&count=${windowSize}`), variantQuery))
+			.then(response => {
+				if (!response.ok) {
+					throw new Error(response.statusText);
+				}
+				return response.arrayBuffer();
+			})
+			.then(buffer => {
+				parseFrames(buffer);
+				// La risposta può fermarsi prima della fine della finestra: le pagine mancanti si chiedono una per una
+				fallbackWindow(start);
+			})
+			.catch(() => fallbackWindow(start));
+	}
+
+	// Progresso di lettura: il server lo tiene in memoria, qui si evita solo di inviarne uno a ogni pagina girata
+	const progressUrl = carousel.data('progress-url');
+	let currentPage = startPage;
+	let progressTimer = null;
+
+	function sendProgress() {
+		clearTimeout(progressTimer);
+		progressTimer = null;
+		navigator.sendBeacon(progressUrl, new URLSearchParams({ page: currentPage }));
+	}
+
+	loadWindow(Math.floor(startPage / windowSize));
+	sendProgress();
+	carousel.on('afterChange', function(event, slick, currentSlide) {
+		const index = Math.floor(currentSlide / windowSize);
+		loadWindow(index);
+		// Oltre metà finestra si richiede già la successiva
+		if (currentSlide % windowSize >= windowSize / 2) {
+			loadWindow(index + 1);
+		}
+		currentPage = currentSlide;
+		clearTimeout(progressTimer);
+		progressTimer = setTimeout(sendProgress, 1000);
+	});
+	// Chiudendo la pagina si invia subito l'ultimo progresso in attesa
+	window.addEventListener('pagehide', function() {
+		if (progressTimer !== null) {
+			sendProgress();
+		}
 	});
 
 	let zoom = 1;
@@ -0,0 +1,57 @@
+// Ricerca durante la digitazione: interroga /api/search e aggiorna la griglia dei risultati
+document.addEventListener('DOMContentLoaded', function() {
+	const input = document.querySelector('.search-form input[name="q"]');
+	const results = document.getElementById('search-results');
+	const apiUrl = input.dataset.apiUrl;
+	let timer = null;
+	let controller = null;
+
+	function render(items) {
+		results.replaceChildren(...items.map(item => {
+			const comic = document.createElement('div');
+			comic.className = 'comic';
+			const link = document.createElement('a');
+			link.href = item.url;
+			const cover = document.createElement('img');
+			cover.src = item.cover_url || PLACEHOLDER_COVER;
+			cover.alt = item.title;
+			cover.loading = 'lazy';
+			const title = document.createElement('div');
+			title.className = 'comic-title';
+			title.textContent = item.title;
+			const meta = document.createElement('div');
+			meta.className = 'comic-meta';
+			meta.textContent = item.author || '';
+			link.append(cover, title, meta);
+			comic.append(link);
+			return comic;
+		}));
+	}
+
+	function search() {
+		const query = input.value.trim();
+		// Annulla la richiesta precedente: conta solo l'ultima digitazione
+		if (controller) {
+			controller.abort();
+		}
+		history.replaceState(null, '', query ? `?q=${encodeURIComponent(query)}` : location.pathname);
+		if (!query) {
+			render([]);
+			return;
+		}
+		controller = new AbortController();
+		fetch(`${apiUrl}?q=${encodeURIComponent(query)}&limit=24`, { signal: controller.signal })
+			.then(response => response.json())
+			.then(data => render(data.items))
+			.catch(error => {
+				if (error.name !== 'AbortError') {
+					console.error(error);
+				}
+			});
+	}
+
+	input.addEventListener('input', function() {
+		clearTimeout(timer);
+		timer = setTimeout(search, 120);
+	});
+});
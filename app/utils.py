@@ -1,4 +1,10 @@
+import base64
+import hashlib
+import json
 import os
+import re
+import struct
+import unicodedata
 import zipfile
 import rarfile
 import io
@@ -98,34 +104,199 @@ def read_image_from_archive(archive_path, image_filename):
         print(f"Errore sconosciuto durante la lettura dell'immagine: {e}")
         return None
 
-def list_images(path, is_archive):
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+
+def natural_sort_key(name):
     """
-    Restituisce una lista di file immagine in una directory o in un archivio.
+    Chiave di ordinamento naturale: 'page2' viene prima di 'page10'.
+
+    :param name: Nome del file
+    :return: Tupla confrontabile, stabile anche tra nomi che differiscono solo per maiuscole
+    """
+    parts = re.split(r'(\d+)', name.lower())
+    return tuple(int(part) if part.isdigit() else part for part in parts), name
+
+def get_mimetype(filename):
+    """
+    Determina il mimetype dell'immagine basato sull'estensione del file.
+
+    :param filename: Nome del file dell'immagine
+    :return: Stringa del mimetype
+    """
+    lower = filename.lower()
+    if lower.endswith(('.jpg', '.jpeg')):
+        return 'image/jpeg'
+    elif lower.endswith('.png'):
+        return 'image/png'
+    elif lower.endswith('.gif'):
+        return 'image/gif'
+    return 'application/octet-stream'
+
+def is_image_member(name):
+    """
+    Verifica se un membro di un archivio (o un file di una directory) è una pagina valida.
+
+    :param name: Nome del membro
+    :return: True se è un'immagine da mostrare, altrimenti False
+    """
+    base = name.replace('\\', '/').rsplit('/', 1)[-1]
+    if base.startswith('.') or name.startswith('__MACOSX/'):
+        return False
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+def _zip_data_offset(archive, info):
+    """
+    Calcola la posizione dei dati di un membro ZIP leggendo il suo local header.
+
+    :param archive: ZipFile aperto
+    :param info: ZipInfo del membro
+    :return: Offset assoluto del primo byte di dati del membro
+    """
+    archive.fp.seek(info.header_offset)
+    header = archive.fp.read(zipfile.sizeFileHeader)
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    name_length = fields[zipfile._FH_FILENAME_LENGTH]
+    extra_length = fields[zipfile._FH_EXTRA_FIELD_LENGTH]
+    return info.header_offset + zipfile.sizeFileHeader + name_length + extra_length
+
+def build_page_index(path, is_archive):
+    """
+    Costruisce l'indice ordinato delle pagine di un capitolo.
+
+    Ogni voce contiene il nome del membro, l'offset dei dati (per i RAR l'offset
+    dell'header), le dimensioni compressa e reale, se il membro è memorizzato
+    senza compressione e il mimetype. Le pagine sono in ordine naturale.
 
     :param path: Percorso della directory o dell'archivio
     :param is_archive: Booleano che indica se il percorso è un archivio (ZIP/RAR)
-    :return: Lista di file immagine con estensioni valide
+    :return: Lista di dizionari, uno per pagina
     """
-    valid_extensions = ('.jpg', '.jpeg', '.png', '.gif')
-    images = []
+    pages = []
 
     if is_archive:
         if path.lower().endswith(('.cbz', '.zip')):
-            # Gestione di archivi ZIP
             with zipfile.ZipFile(path, 'r') as archive:
-                for file_info in archive.infolist():
-                    if file_info.filename.lower().endswith(valid_extensions):
-                        images.append(file_info.filename)
+                for info in archive.infolist():
+                    if info.is_dir() or not is_image_member(info.filename):
+                        continue
+                    stored = info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1
+                    pages.append({
+                        'name': info.filename,
+                        'offset': _zip_data_offset(archive, info),
+                        'compress_size': info.compress_size,
+                        'file_size': info.file_size,
+                        'stored': stored,
+                        'mimetype': get_mimetype(info.filename)
+                    })
         elif path.lower().endswith(('.cbr', '.rar')):
-            # Gestione di archivi RAR
             with rarfile.RarFile(path, 'r') as archive:
-                for file_info in archive.infolist():
-                    if file_info.filename.lower().endswith(valid_extensions):
-                        images.append(file_info.filename)
+                for info in archive.infolist():
+                    if info.is_dir() or not is_image_member(info.filename):
+                        continue
+                    pages.append({
+                        'name': info.filename,
+                        'offset': getattr(info, 'header_offset', None),
+                        'compress_size': info.compress_size,
+                        'file_size': info.file_size,
+                        'stored': False,
+                        'mimetype': get_mimetype(info.filename)
+                    })
     else:
-        # Gestione di directory locali
-        for file in os.listdir(path):
-            if file.lower().endswith(valid_extensions):
-                images.append(file)
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file() and is_image_member(entry.name):
+                    size = entry.stat().st_size
+                    pages.append({
+                        'name': entry.name,
+                        'offset': 0,
+                        'compress_size': size,
+                        'file_size': size,
+                        'stored': True,
+                        'mimetype': get_mimetype(entry.name)
+                    })
 
-    return images
\ No newline at end of file
+    pages.sort(key=lambda page: natural_sort_key(page['name']))
+    return pages
+
+def list_images(path, is_archive):
+    """
+    Restituisce una lista di file immagine in una directory o in un archivio.
+
+    :param path: Percorso della directory o dell'archivio
+    :param is_archive: Booleano che indica se il percorso è un archivio (ZIP/RAR)
+    :return: Lista di file immagine con estensioni valide, in ordine naturale
+    """
+    return [page['name'] for page in build_page_index(path, is_archive)]
+
+def normalize_text(text):
+    """
+    Normalizza un testo per la ricerca: minuscole, senza accenti, solo lettere e cifre separate da uno spazio.
+
+    :param text: Testo da normalizzare
+    :return: Testo normalizzato
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'[^\W_]+', stripped.lower()))
+
+def chapter_stat(path, is_archive):
+    """
+    Restituisce dimensione e data di modifica che identificano il contenuto attuale di un capitolo.
+
+    Per un archivio sono quelle del file. La mtime di una directory cambia solo
+    quando si aggiungono, rimuovono o rinominano file, non quando un'immagine viene
+    sovrascritta: per le directory si usano la dimensione totale delle immagini e
+    la mtime più recente tra la directory e le immagini.
+
+    :param path: Percorso dell'archivio o della directory del capitolo
+    :param is_archive: Booleano che indica se il capitolo è un archivio
+    :return: Tuple (dimensione in byte, mtime)
+    """
+    stat = os.stat(path)
+    if is_archive:
+        return stat.st_size, stat.st_mtime
+    size, mtime = 0, stat.st_mtime
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file() and is_image_member(entry.name):
+                image_stat = entry.stat()
+                size += image_stat.st_size
+                mtime = max(mtime, image_stat.st_mtime)
+    return size, mtime
+
+def chapter_version(size, mtime):
+    """
+    Calcola la versione di un capitolo dalla dimensione e dalla data di modifica del file.
+
+    Lo stesso valore si ottiene dai campi salvati dallo scanner e da una stat del
+    file, quindi serve sia per gli URL versionati sia per gli ETag.
+
+    :param size: Dimensione del capitolo in byte, come restituita da chapter_stat
+    :param mtime: Data di modifica del capitolo, come restituita da chapter_stat
+    :return: Stringa esadecimale di 16 caratteri
+    """
+    return hashlib.sha1(f'{size}:{mtime!r}'.encode('ascii')).hexdigest()[:16]
+
+def encode_cursor(*values):
+    """
+    Codifica i valori di un cursore di paginazione in una stringa sicura per gli URL.
+
+    :param values: Valori serializzabili in JSON
+    :return: Stringa base64 urlsafe
+    """
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decodifica un cursore prodotto da encode_cursor.
+
+    :param cursor: Stringa del cursore
+    :return: Lista dei valori
+    :raises ValueError: Se il cursore non è valido
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Cursore non valido") from e
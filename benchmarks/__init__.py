@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+# Benchmark riproducibili di scansione e lettura: vedi benchmarks/run.py
@@ -0,0 +1,60 @@
+# benchmarks/compare.py
+"""
+Confronta due risultati di benchmarks/run.py.
+
+Uso:
+    python -m benchmarks.compare benchmarks/results/prima.json benchmarks/results/dopo.json
+
+Stampa ogni misura numerica presente in entrambi i file con la variazione
+percentuale. Per latenze, durate e memoria un valore negativo è un miglioramento.
+"""
+
+import argparse
+import json
+
+# Sezioni confrontate: metadati e descrizione della libreria non sono misure
+SECTIONS = ('scan', 'pages', 'covers', 'memory')
+
+def flatten(values, prefix=''):
+    """
+    Appiattisce un dizionario annidato in coppie 'a.b.c' -> valore numerico.
+    """
+    flat = {}
+    for key, value in values.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(before, after):
+    """
+    Restituisce le righe (misura, prima, dopo, variazione %) delle misure comuni.
+    """
+    before_flat = flatten({section: before.get(section, {}) for section in SECTIONS})
+    after_flat = flatten({section: after.get(section, {}) for section in SECTIONS})
+    rows = []
+    for name in sorted(before_flat.keys() & after_flat.keys()):
+        old, new = before_flat[name], after_flat[name]
+        change = (new - old) / old * 100 if old else None
+        rows.append((name, old, new, change))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Confronta due risultati dei benchmark")
+    parser.add_argument('before', help="Risultati di riferimento")
+    parser.add_argument('after', help="Risultati da confrontare")
+    args = parser.parse_args()
+
+    with open(args.before) as before_file, open(args.after) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+
+    print(f"{before['meta'].get('revision')} -> {after['meta'].get('revision')}")
+    width = max([len(row[0]) for row in compare(before, after)] + [10])
+    for name, old, new, change in compare(before, after):
+        change_text = f'{change:+.1f}%' if change is not None else 'n/d'
+        print(f'{name:<{width}}  {old:>14}  {new:>14}  {change_text:>8}')
+
+if __name__ == '__main__':
+    main()
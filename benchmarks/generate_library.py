@@ -0,0 +1,175 @@
+# benchmarks/generate_library.py
+"""
+Genera una libreria sintetica per i benchmark.
+
+Uso:
+    python -m benchmarks.generate_library /tmp/bench-library --series 20 --chapters 10 --pages 24
+
+Ogni serie contiene capitoli nei formati richiesti a rotazione: CBZ non compresso
+(stored), CBZ compresso (deflated), CBR (solo se è installato il comando rar) e
+directory di immagini. Le pagine sono JPEG con un disegno pseudocasuale, così la
+dimensione dei file è realistica e la generazione è riproducibile dato il seed.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import zipfile
+from io import BytesIO
+from PIL import Image, ImageDraw
+
+FORMATS = ('stored', 'deflated', 'cbr', 'directory')
+
+def make_page(width, height, rng, quality=85):
+    """
+    Crea una pagina JPEG sintetica con rumore e forme, per una compressione simile a una scansione.
+
+    :param width: Larghezza in pixel
+    :param height: Altezza in pixel
+    :param rng: random.Random da cui prendere i valori
+    :param quality: Qualità JPEG
+    :return: Byte della pagina
+    """
+    image = Image.effect_noise((width, height), rng.uniform(30, 80)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(width // 2), y0 + rng.randrange(height // 3)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.rectangle((x0, y0, x1, y1), outline=color, width=rng.randrange(2, 12))
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+def rar_available():
+    """
+    Verifica se è disponibile il comando rar, necessario per creare i CBR.
+    """
+    return shutil.which('rar') is not None
+
+def write_chapter(path, fmt, pages):
+    """
+    Scrive un capitolo nel formato richiesto.
+
+    :param path: Percorso del capitolo senza estensione
+    :param fmt: Uno di FORMATS
+    :param pages: Lista di (nome, byte) delle pagine
+    :return: Percorso del capitolo scritto
+    """
+    if fmt == 'directory':
+        os.makedirs(path, exist_ok=True)
+        for name, data in pages:
+            with open(os.path.join(path, name), 'wb') as page_file:
+                page_file.write(data)
+        return path
+
+    if fmt in ('stored', 'deflated'):
+        compression = zipfile.ZIP_STORED if fmt == 'stored' else zipfile.ZIP_DEFLATED
+        archive_path = path + '.cbz'
+        with zipfile.ZipFile(archive_path, 'w', compression) as archive:
+            for name, data in pages:
+                archive.writestr(name, data)
+        return archive_path
+
+    if fmt == 'cbr':
+        archive_path = path + '.cbr'
+        with tempfile.TemporaryDirectory() as work_dir:
+            for name, data in pages:
+                with open(os.path.join(work_dir, name), 'wb') as page_file:
+                    page_file.write(data)
+            subprocess.run(['rar', 'a', '-idq', '-ep1', archive_path] + [os.path.join(work_dir, name) for name, _ in pages], check=True)
+        return archive_path
+
+    raise ValueError(f"Formato non supportato: {fmt}")
+
+def generate_library(root, series=10, chapters=10, pages=20, formats=FORMATS, width=1200, height=1800, variants=4, seed=1):
+    """
+    Genera una libreria sintetica.
+
+    Per contenere tempo e spazio vengono generate solo 'variants' pagine diverse,
+    riusate a rotazione in tutti i capitoli.
+
+    :param root: Directory della libreria (creata se non esiste)
+    :param series: Numero di serie
+    :param chapters: Capitoli per serie
+    :param pages: Pagine per capitolo
+    :param formats: Formati dei capitoli, usati a rotazione
+    :param width: Larghezza delle pagine
+    :param height: Altezza delle pagine
+    :param variants: Numero di pagine diverse da generare
+    :param seed: Seed del generatore pseudocasuale
+    :return: Dizionario con la descrizione della libreria generata
+    """
+    formats = list(formats)
+    if 'cbr' in formats and not rar_available():
+        print("Comando rar non trovato: i capitoli CBR non verranno generati")
+        formats.remove('cbr')
+    if not formats:
+        raise ValueError("Nessun formato da generare")
+
+    rng = random.Random(seed)
+    samples = [make_page(width, height, rng) for _ in range(variants)]
+    os.makedirs(root, exist_ok=True)
+
+    counts = {fmt: 0 for fmt in formats}
+    total_bytes = 0
+    for series_index in range(1, series + 1):
+        series_path = os.path.join(root, f'Series {series_index:04d}_Bench')
+        os.makedirs(series_path, exist_ok=True)
+        for chapter_index in range(1, chapters + 1):
+            fmt = formats[(series_index + chapter_index) % len(formats)]
+            chapter_pages = [(f'page{page:03d}.jpg', samples[(chapter_index + page) % len(samples)]) for page in range(1, pages + 1)]
+            write_chapter(os.path.join(series_path, f'Chapter {chapter_index:03d}'), fmt, chapter_pages)
+            counts[fmt] += 1
+            total_bytes += sum(len(data) for _, data in chapter_pages)
+
+    description = {
+        'root': os.path.abspath(root),
+        'series': series,
+        'chapters_per_series': chapters,
+        'pages_per_chapter': pages,
+        'page_size': [width, height],
+        'formats': counts,
+        'image_bytes': total_bytes,
+        'seed': seed
+    }
+    with open(os.path.join(root, 'library.json'), 'w') as description_file:
+        json.dump(description, description_file, indent=2)
+    return description
+
+def add_arguments(parser):
+    """
+    Aggiunge al parser gli argomenti che descrivono la forma della libreria.
+    """
+    parser.add_argument('--series', type=int, default=10, help="Numero di serie")
+    parser.add_argument('--chapters', type=int, default=10, help="Capitoli per serie")
+    parser.add_argument('--pages', type=int, default=20, help="Pagine per capitolo")
+    parser.add_argument('--formats', default=','.join(FORMATS), help=f"Formati separati da virgola tra {', '.join(FORMATS)}")
+    parser.add_argument('--width', type=int, default=1200, help="Larghezza delle pagine")
+    parser.add_argument('--height', type=int, default=1800, help="Altezza delle pagine")
+    parser.add_argument('--seed', type=int, default=1, help="Seed del generatore")
+
+def parse_formats(value):
+    formats = [fmt.strip() for fmt in value.split(',') if fmt.strip()]
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Formati sconosciuti: {', '.join(sorted(unknown))}")
+    return formats
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera una libreria di fumetti sintetica per i benchmark")
+    parser.add_argument('root', help="Directory della libreria")
+    add_arguments(parser)
+    args = parser.parse_args()
+    description = generate_library(
+        args.root, args.series, args.chapters, args.pages, parse_formats(args.formats),
+        args.width, args.height, seed=args.seed
+    )
+    print(json.dumps(description, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+# benchmarks/run.py
+"""
+Benchmark di scansione e lettura su una libreria sintetica.
+
+Uso:
+    python -m benchmarks.run --series 10 --chapters 10 --pages 20
+    python -m benchmarks.run --library /tmp/bench-library --mongo-uri mongodb://localhost:27017/comic_vault_bench
+    python -m benchmarks.run --in-memory        # richiede mongomock (benchmarks/requirements.txt)
+
+Misura:
+- scan: durata della scansione completa e di quella incrementale senza modifiche;
+- pages: latenza di view_page a freddo (cache del processo svuotate prima di ogni
+  richiesta; la page cache del sistema operativo non viene svuotata) e a caldo,
+  per formato di capitolo;
+- covers: costo di view_cover senza miniatura in cache e con miniatura già pronta;
+- memory: picco della memoria residente del processo dopo ogni fase.
+
+I risultati sono salvati in JSON in benchmarks/results/ (o nel file --output) e
+si confrontano con python -m benchmarks.compare.
+
+ATTENZIONE: la scansione completa svuota le collezioni del database indicato,
+che deve essere dedicato ai benchmark.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from .generate_library import add_arguments, generate_library, parse_formats
+
+DEFAULT_MONGO_URI = 'mongodb://localhost:27017/comic_vault_bench'
+
+def summarize(samples):
+    """
+    Riassume una serie di latenze in secondi con media e percentili, in millisecondi.
+
+    :param samples: Lista di durate in secondi
+    :return: Dizionario con count, mean, p50, p90, p99 e max
+    """
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def percentile(fraction):
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50': percentile(0.5),
+        'p90': percentile(0.9),
+        'p99': percentile(0.99),
+        'max': round(ordered[-1] * 1000, 3)
+    }
+
+def peak_rss_bytes():
+    """
+    Picco della memoria residente del processo finora.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux in KiB, macOS in byte
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def chapter_format(chapter):
+    """
+    Classifica un capitolo come nel generatore: stored, deflated, cbr o directory.
+    """
+    filename = chapter['filename'].lower()
+    if not chapter['is_archive']:
+        return 'directory'
+    if filename.endswith(('.cbr', '.rar')):
+        return 'cbr'
+    pages = chapter.get('pages') or []
+    return 'stored' if pages and all(page['stored'] for page in pages) else 'deflated'
+
+class Benchmark:
+    def __init__(self, app, mongo, library, work_dir, samples, repeat):
+        """
+        Esegue le misure sull'applicazione già configurata.
+
+        :param app: Applicazione Flask
+        :param mongo: Istanza PyMongo dell'applicazione
+        :param library: Directory della libreria
+        :param work_dir: Directory temporanea (cache dei derivati)
+        :param samples: Numero di capitoli campione per formato
+        :param repeat: Ripetizioni di ogni richiesta a caldo
+        """
+        self.app = app
+        self.mongo = mongo
+        self.library = library
+        self.work_dir = work_dir
+        self.samples = samples
+        self.repeat = repeat
+        self.client = app.test_client()
+        self.memory = {}
+
+    def reset_caches(self):
+        """
+        Svuota le cache del processo: archivi aperti, pagine lette in anticipo e metadati.
+        """
+        from app.services.comic_service import archive_pool, page_cache
+        from app.services.metadata_cache import metadata_cache
+        archive_pool.clear()
+        page_cache.clear()
+        metadata_cache.invalidate()
+
+    def fetch(self, url):
+        """
+        Esegue una richiesta leggendo tutto il corpo e ne restituisce la durata.
+        """
+        started = time.perf_counter()
+        response = self.client.get(url)
+        body = response.get_data()
+        elapsed = time.perf_counter() - started
+        response.close()
+        if response.status_code != 200:
+            raise RuntimeError(f"{url}: HTTP {response.status_code} {body[:200]!r}")
+        return elapsed, len(body)
+
+    def run_scan(self, workers):
+        from app.services.scanner import ComicScanner
+        scanner = ComicScanner(self.library, self.mongo, workers=workers)
+
+        started = time.perf_counter()
+        scanner.scan_and_register_comics(full=True)
+        full = time.perf_counter() - started
+
+        started = time.perf_counter()
+        scanner.scan_and_register_comics()
+        incremental = time.perf_counter() - started
+
+        db = self.mongo.db
+        comics = db.comics.count_documents({})
+        chapters = db.chapters.count_documents({})
+        pages = sum(chapter.get('page_count', 0) for chapter in db.chapters.find({}, {'page_count': 1}))
+        self.memory['scan'] = peak_rss_bytes()
+        return {
+            'workers': scanner.workers,
+            'comics': comics,
+            'chapters': chapters,
+            'pages': pages,
+            'full_seconds': round(full, 4),
+            'incremental_seconds': round(incremental, 4),
+            'chapters_per_second': round(chapters / full, 2) if full else None,
+            'pages_per_second': round(pages / full, 2) if full else None
+        }
+
+    def sample_chapters(self):
+        """
+        Sceglie fino a 'samples' capitoli per formato, in ordine deterministico.
+        """
+        by_format = {}
+        for chapter in self.mongo.db.chapters.find().sort([('comic_id', 1), ('number', 1)]):
+            if not chapter.get('page_count'):
+                continue
+            chosen = by_format.setdefault(chapter_format(chapter), [])
+            if len(chosen) < self.samples:
+                chosen.append(chapter)
+        return by_format
+
+    def run_pages(self, by_format):
+        results = {}
+        for fmt, chapters in sorted(by_format.items()):
+            cold, warm, sizes = [], [], []
+            for chapter in chapters:
+                last = chapter['page_count'] - 1
+                for page_number in sorted({0, last // 2, last}):
+                    url = f"/comic/{chapter['comic_id']}/chapter/{chapter['number']}/{page_number}"
+                    self.reset_caches()
+                    elapsed, size = self.fetch(url)
+                    cold.append(elapsed)
+                    sizes.append(size)
+                    for _ in range(self.repeat):
+                        warm.append(self.fetch(url)[0])
+            results[fmt] = {
+                'cold': summarize(cold),
+                'warm': summarize(warm),
+                'mean_page_bytes': round(sum(sizes) / len(sizes)) if sizes else 0
+            }
+        self.memory['pages'] = peak_rss_bytes()
+        return results
+
+    def run_covers(self, by_format):
+        derivatives = self.app.config['DERIVATIVE_CACHE_FOLDER']
+        cold, warm, sizes = [], [], []
+        for chapters in by_format.values():
+            for chapter in chapters:
+                url = f"/comic/{chapter['comic_id']}/{chapter['number']}/cover"
+                shutil.rmtree(derivatives, ignore_errors=True)
+                self.reset_caches()
+                elapsed, size = self.fetch(url)
+                cold.append(elapsed)
+                sizes.append(size)
+                for _ in range(self.repeat):
+                    warm.append(self.fetch(url)[0])
+        self.memory['covers'] = peak_rss_bytes()
+        return {
+            'size': self.app.config['COVER_THUMBNAIL_SIZE'],
+            'cold': summarize(cold),
+            'warm': summarize(warm),
+            'mean_cover_bytes': round(sum(sizes) / len(sizes)) if sizes else 0
+        }
+
+def configure_environment(work_dir, mongo_uri):
+    """
+    Configura l'applicazione tramite variabili d'ambiente, prima che venga importata.
+    """
+    os.environ['DERIVATIVE_CACHE_FOLDER'] = os.path.join(work_dir, 'derivatives')
+    os.environ['RAR_CACHE_FOLDER'] = os.path.join(work_dir, 'rar')
+    os.environ['MONGO_URI'] = mongo_uri
+    # La lettura anticipata falserebbe le misure a freddo
+    os.environ['PREFETCH_ENABLED'] = 'false'
+    os.environ.setdefault('WARM_COVERS_AFTER_SCAN', 'false')
+
+def in_memory_database():
+    """
+    Crea un database mongomock compatibile con quello che usano i modelli.
+
+    mongomock non conosce find_one_or_404 di Flask-PyMongo né alcuni argomenti che
+    le versioni recenti di pymongo passano alle operazioni di bulk_write: vengono
+    aggiunti qui, solo per i benchmark.
+    """
+    import mongomock
+    from mongomock.collection import BulkOperationBuilder
+    from flask import abort
+
+    def find_one_or_404(collection, *args, **kwargs):
+        found = collection.find_one(*args, **kwargs)
+        if found is None:
+            abort(404)
+        return found
+
+    def ignore_sort(method):
+        def wrapper(builder, *args, sort=None, **kwargs):
+            return method(builder, *args, **kwargs)
+        return wrapper
+
+    if not hasattr(mongomock.Collection, 'find_one_or_404'):
+        mongomock.Collection.find_one_or_404 = find_one_or_404
+        BulkOperationBuilder.add_update = ignore_sort(BulkOperationBuilder.add_update)
+        BulkOperationBuilder.add_replace = ignore_sort(BulkOperationBuilder.add_replace)
+    return mongomock.MongoClient().comic_vault_bench
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark di scansione e lettura di Comic Vault")
+    parser.add_argument('--library', help="Libreria esistente da usare invece di generarne una")
+    add_arguments(parser)
+    parser.add_argument('--mongo-uri', default=os.getenv('BENCH_MONGO_URI', DEFAULT_MONGO_URI), help="Database dedicato ai benchmark")
+    parser.add_argument('--in-memory', action='store_true', help="Usa mongomock invece di MongoDB")
+    parser.add_argument('--scan-workers', type=int, default=None, help="Thread dello scanner (default SCAN_WORKERS)")
+    parser.add_argument('--samples', type=int, default=5, help="Capitoli campione per formato")
+    parser.add_argument('--repeat', type=int, default=5, help="Ripetizioni a caldo di ogni richiesta")
+    parser.add_argument('--output', help="File JSON dei risultati (default benchmarks/results/<data>-<revisione>.json)")
+    parser.add_argument('--keep', action='store_true', help="Non eliminare la directory di lavoro")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='comic-vault-bench-')
+    try:
+        if args.library:
+            library = args.library
+            description_path = os.path.join(library, 'library.json')
+            description = {'root': os.path.abspath(library)}
+            if os.path.exists(description_path):
+                with open(description_path) as description_file:
+                    description = json.load(description_file)
+        else:
+            library = os.path.join(work_dir, 'library')
+            started = time.perf_counter()
+            description = generate_library(
+                library, args.series, args.chapters, args.pages, parse_formats(args.formats),
+                args.width, args.height, seed=args.seed
+            )
+            description['generation_seconds'] = round(time.perf_counter() - started, 3)
+
+        configure_environment(work_dir, args.mongo_uri)
+        from app import app, mongo
+        if args.in_memory:
+            try:
+                mongo.db = in_memory_database()
+            except ImportError:
+                parser.error("--in-memory richiede mongomock: pip install -r benchmarks/requirements.txt")
+
+        benchmark = Benchmark(app, mongo, library, work_dir, args.samples, args.repeat)
+        results = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'database': 'mongomock' if args.in_memory else args.mongo_uri,
+                'samples': args.samples,
+                'repeat': args.repeat
+            },
+            'library': description
+        }
+        with app.app_context():
+            results['scan'] = benchmark.run_scan(args.scan_workers)
+            by_format = benchmark.sample_chapters()
+            results['pages'] = benchmark.run_pages(by_format)
+            results['covers'] = benchmark.run_covers(by_format)
+        results['memory'] = {'peak_rss_bytes': benchmark.memory}
+
+        from app.services.comic_service import transcode_pool
+        transcode_pool.shutdown()
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output
+    if output is None:
+        folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+        os.makedirs(folder, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(folder, f"{stamp}-{results['meta']['revision'] or 'norev'}.json")
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Risultati salvati in {output}")
+
+if __name__ == '__main__':
+    main()
@@ -4,3 +4,51 @@ import os
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://192.168.1.10:27017/comic_vault')
 CHAPTERS_PER_PAGE = 20
 COMICS_FOLDER = "/data/comics"
+ARCHIVE_POOL_SIZE = int(os.getenv('ARCHIVE_POOL_SIZE', 16))
+DERIVATIVE_CACHE_FOLDER = os.getenv('DERIVATIVE_CACHE_FOLDER', '/data/cache/derivatives')
+DERIVATIVE_CACHE_MAX_BYTES = int(os.getenv('DERIVATIVE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+THUMBNAIL_SIZES = {'small': 160, 'medium': 320, 'large': 640}
+THUMBNAIL_QUALITY = 80
+COVER_THUMBNAIL_SIZE = 'medium'
+SERIES_COVER_SIZE = 'small'
+SPRITE_CELL_WIDTH = 160
+SPRITE_CELL_HEIGHT = 240
+SPRITE_COLUMNS = 8
+WARM_COVERS_AFTER_SCAN = os.getenv('WARM_COVERS_AFTER_SCAN', 'false').lower() == 'true'
+SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', 8))
+SCAN_BATCH_SIZE = int(os.getenv('SCAN_BATCH_SIZE', 500))
+SCAN_LOCK_TIMEOUT = int(os.getenv('SCAN_LOCK_TIMEOUT', 600))
+LIBRARY_PAGE_SIZE = int(os.getenv('LIBRARY_PAGE_SIZE', 48))
+METADATA_CACHE_SIZE = int(os.getenv('METADATA_CACHE_SIZE', 4096))
+METADATA_CACHE_TTL = int(os.getenv('METADATA_CACHE_TTL', 300))
+METADATA_CACHE_CHECK_INTERVAL = float(os.getenv('METADATA_CACHE_CHECK_INTERVAL', 5))
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'true').lower() == 'true'
+PREFETCH_DEPTH = int(os.getenv('PREFETCH_DEPTH', 4))
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', 2))
+PREFETCH_CACHE_BYTES = int(os.getenv('PREFETCH_CACHE_BYTES', 128 * 1024 * 1024))
+PREFETCH_NEXT_CHAPTER_PAGES = int(os.getenv('PREFETCH_NEXT_CHAPTER_PAGES', 2))
+BULK_MAX_PAGES = int(os.getenv('BULK_MAX_PAGES', 32))
+READER_WINDOW = int(os.getenv('READER_WINDOW', 8))
+PAGE_VARIANT_WIDTHS = [480, 720, 1080, 1440, 2160]
+PAGE_VARIANT_QUALITY = int(os.getenv('PAGE_VARIANT_QUALITY', 80))
+TRANSCODE_WORKERS = int(os.getenv('TRANSCODE_WORKERS', min(4, os.cpu_count() or 1)))
+RAR_ACCELERATION = os.getenv('RAR_ACCELERATION', 'off')
+RAR_CACHE_FOLDER = os.getenv('RAR_CACHE_FOLDER', '/data/cache/rar')
+RAR_CACHE_MAX_BYTES = int(os.getenv('RAR_CACHE_MAX_BYTES', 4 * 1024 * 1024 * 1024))
+PAGE_IO_WORKERS = int(os.getenv('PAGE_IO_WORKERS', 16))
+PAGE_IO_QUEUE = int(os.getenv('PAGE_IO_QUEUE', 64))
+PAGE_IO_TIMEOUT = float(os.getenv('PAGE_IO_TIMEOUT', 30))
+TRANSCODE_QUEUE = int(os.getenv('TRANSCODE_QUEUE', 32))
+TRANSCODE_TIMEOUT = float(os.getenv('TRANSCODE_TIMEOUT', 60))
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', 1.0))
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 50))
+SEARCH_REFRESH_INTERVAL = int(os.getenv('SEARCH_REFRESH_INTERVAL', 60))
+WATCHER_ENABLED = os.getenv('WATCHER_ENABLED', 'false').lower() == 'true'
+WATCHER_BACKEND = os.getenv('WATCHER_BACKEND', 'auto')
+WATCHER_DEBOUNCE = float(os.getenv('WATCHER_DEBOUNCE', 2.0))
+WATCHER_SETTLE = float(os.getenv('WATCHER_SETTLE', 2.0))
+WATCHER_POLL_INTERVAL = float(os.getenv('WATCHER_POLL_INTERVAL', 10.0))
+PROGRESS_FLUSH_INTERVAL = float(os.getenv('PROGRESS_FLUSH_INTERVAL', 5.0))
+CONTINUE_READING_LIMIT = int(os.getenv('CONTINUE_READING_LIMIT', 24))
+SHARED_PAGE_CACHE = os.getenv('SHARED_PAGE_CACHE', 'false').lower() == 'true'
+SHARED_PAGE_CACHE_FOLDER = os.getenv('SHARED_PAGE_CACHE_FOLDER', '/dev/shm/comic-vault/pages')
@@ -0,0 +1,34 @@
+# gunicorn.conf.py
+# Configurazione di produzione: più processi, ognuno con più thread.
+# La lettura delle pagine è dominata dall'I/O, quindi i thread (gthread)
+# servono più lettori per processo; le conversioni di immagini girano nel
+# pool di processi dell'applicazione (TRANSCODE_WORKERS), avviato con
+# forkserver perché i worker hanno già dei thread quando serve.
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', min(4, multiprocessing.cpu_count())))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+# Oltre PAGE_IO_TIMEOUT una pagina risponde già 504: questo limite riguarda solo i worker bloccati
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+# Nessun riciclo periodico dei worker: le scansioni in background girano nel worker che le
+# ha avviate e un riciclo le interromperebbe, lasciando a metà una scansione completa che ha
+# già svuotato la libreria. Le cache in processo hanno comunque un limite di dimensione.
+# GUNICORN_MAX_REQUESTS lo riattiva se le scansioni non partono dal web (es. solo flask watch-library)
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+def worker_exit(server, worker):
+    # Scrive i progressi di lettura ancora nel buffer prima che il worker termini
+    from app.services.reading_progress import progress_buffer
+    progress_buffer.shutdown()
+    # Le scansioni avviate da questo worker muoiono con lui (arresto, riavvio o max_requests)
+    from app.services.scan_jobs import scan_job_manager
+    scan_job_manager.shutdown()
@@ -0,0 +1,83 @@
+# imaging.py
+# Conversioni di immagini eseguite nei processi di TRANSCODE_WORKERS. Il modulo
+# sta fuori dal pacchetto app: i processi del pool importano le funzioni da qui
+# senza avviare l'applicazione (connessione a MongoDB, pool e cache di modulo).
+from io import BytesIO
+from PIL import Image, ImageOps
+
+# Formati di uscita delle varianti: nome -> (formato Pillow, mimetype, estensione)
+VARIANT_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'webp': ('WEBP', 'image/webp', 'webp')
+}
+
+def make_variant(image_data, width, fmt, quality=80):
+    """
+    Ridimensiona e converte un'immagine, senza mai ingrandirla.
+
+    Per i JPEG usa la modalità draft di Pillow, che decodifica direttamente a una
+    scala ridotta (1/2, 1/4, 1/8) invece di decodificare l'immagine a piena
+    risoluzione; il ridimensionamento riduce prima per fattori interi (reduce) e
+    applica LANCZOS solo sull'ultimo passo.
+
+    :param image_data: Byte dell'immagine sorgente
+    :param width: Larghezza massima, o None per mantenere quella originale
+    :param fmt: Formato di uscita, una delle chiavi di VARIANT_FORMATS
+    :param quality: Qualità di compressione
+    :return: Byte dell'immagine convertita
+    """
+    image = Image.open(BytesIO(image_data))
+    source_width, source_height = image.size
+    width = min(width or source_width, source_width)
+    bounds = (width, max(1, round(source_height * width / source_width)))
+    if image.format == 'JPEG' and bounds != image.size:
+        image.draft('RGB', bounds)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    if image.size != bounds:
+        image = image.resize(bounds, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    buffer = BytesIO()
+    if fmt == 'webp':
+        image.save(buffer, format='WEBP', quality=quality, method=4)
+    else:
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+def make_thumbnail(image_data, width, quality=80):
+    """
+    Crea una miniatura JPEG larga al massimo width pixel.
+
+    :param image_data: Byte dell'immagine sorgente
+    :param width: Larghezza massima della miniatura
+    :param quality: Qualità JPEG
+    :return: Byte della miniatura JPEG
+    """
+    return make_variant(image_data, width, 'jpeg', quality)
+
+def make_sprite(images_data, cell_width, cell_height, columns, quality=80):
+    """
+    Compone più miniature in un'unica immagine a griglia (sprite), riga per riga.
+
+    Ogni miniatura viene ritagliata al centro e ridimensionata per riempire una
+    cella di cell_width x cell_height pixel.
+
+    :param images_data: Lista dei byte delle miniature, nell'ordine delle celle
+    :param cell_width: Larghezza di una cella
+    :param cell_height: Altezza di una cella
+    :param columns: Numero di celle per riga
+    :param quality: Qualità JPEG
+    :return: Byte dello sprite JPEG
+    """
+    columns = max(1, min(columns, len(images_data)))
+    rows = max(1, -(-len(images_data) // columns))
+    sprite = Image.new('RGB', (cell_width * columns, cell_height * rows), (27, 27, 27))
+    for index, image_data in enumerate(images_data):
+        with Image.open(BytesIO(image_data)) as image:
+            cell = ImageOps.fit(image.convert('RGB'), (cell_width, cell_height), Image.Resampling.LANCZOS)
+        row, column = divmod(index, columns)
+        sprite.paste(cell, (column * cell_width, row * cell_height))
+
+    buffer = BytesIO()
+    sprite.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
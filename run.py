@@ -1,6 +1,15 @@
 # run.py
+# Server di sviluppo; in produzione usare gunicorn -c gunicorn.conf.py wsgi:app
 from app import app
+from app.models import prepare_database
 
 if __name__ == '__main__':
+    # Prepara gli indici ed eventualmente migra i dati salvati nel vecchio formato
+    with app.app_context():
+        prepare_database()
+    if app.config['WATCHER_ENABLED']:
+        # In produzione il watcher gira come processo a parte: flask watch-library
+        from app.services.watcher import create_library_watcher
+        create_library_watcher().start()
     app.run(host="0.0.0.0", port=5000)
 
@@ -0,0 +1,128 @@
+# tests/conftest.py
+
+import os
+import struct
+import tempfile
+import zipfile
+from io import BytesIO
+import pytest
+from PIL import Image
+
+# L'applicazione legge la configurazione all'importazione: cache e database vanno indirizzati prima
+_work_dir = tempfile.mkdtemp(prefix='comic-vault-tests-')
+os.environ['DERIVATIVE_CACHE_FOLDER'] = os.path.join(_work_dir, 'derivatives')
+os.environ['RAR_CACHE_FOLDER'] = os.path.join(_work_dir, 'rar')
+os.environ['MONGO_URI'] = 'mongodb://localhost:27017/comic_vault_tests'
+os.environ['PREFETCH_ENABLED'] = 'false'
+os.environ['SHARED_PAGE_CACHE'] = 'false'
+os.environ['TRANSCODE_WORKERS'] = '0'
+
+@pytest.fixture
+def app():
+    from app import app
+    return app
+
+def in_memory_database():
+    """
+    Crea un database mongomock vuoto compatibile con quello che usano i modelli.
+
+    mongomock non conosce find_one_or_404 di Flask-PyMongo né l'argomento sort che
+    le versioni recenti di pymongo passano alle operazioni di bulk_write.
+    """
+    import mongomock
+    from mongomock.collection import BulkOperationBuilder
+    from flask import abort
+
+    def find_one_or_404(collection, *args, **kwargs):
+        found = collection.find_one(*args, **kwargs)
+        if found is None:
+            abort(404)
+        return found
+
+    def ignore_sort(method):
+        def wrapper(builder, *args, sort=None, **kwargs):
+            return method(builder, *args, **kwargs)
+        return wrapper
+
+    if not hasattr(mongomock.Collection, 'find_one_or_404'):
+        mongomock.Collection.find_one_or_404 = find_one_or_404
+        BulkOperationBuilder.add_update = ignore_sort(BulkOperationBuilder.add_update)
+        BulkOperationBuilder.add_replace = ignore_sort(BulkOperationBuilder.add_replace)
+    return mongomock.MongoClient().comic_vault_tests
+
+@pytest.fixture
+def database(app):
+    """
+    Sostituisce il database dell'applicazione con uno mongomock vuoto per la durata del test.
+    """
+    pytest.importorskip('mongomock')
+    from app import mongo
+
+    previous = mongo.db
+    # Ogni MongoClient di mongomock ha i propri dati: il database parte vuoto
+    mongo.db = in_memory_database()
+    try:
+        with app.app_context():
+            yield mongo.db
+    finally:
+        mongo.db = previous
+
+def jpeg_bytes(width=60, height=90, color='red'):
+    """
+    Byte di un'immagine JPEG a tinta unita.
+    """
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+def write_cbz(path, pages, compression=zipfile.ZIP_STORED):
+    """
+    Scrive un CBZ con le pagine date, nell'ordine dei nomi.
+
+    :param path: Percorso dell'archivio
+    :param pages: Dizionario nome -> byte della pagina
+    :param compression: Compressione dei membri
+    """
+    with zipfile.ZipFile(path, 'w', compression) as archive:
+        for name, data in pages.items():
+            archive.writestr(name, data)
+    return path
+
+def parse_frames(body):
+    """
+    Decodifica il corpo di una risposta a più pagine in una lista di (pagina, mimetype, dati).
+    """
+    frames = []
+    offset = 0
+    while offset < len(body):
+        page_number, size, mimetype_length = struct.unpack_from('>IIB', body, offset)
+        offset += struct.calcsize('>IIB')
+        mimetype = body[offset:offset + mimetype_length].decode('ascii')
+        offset += mimetype_length
+        frames.append((page_number, mimetype, body[offset:offset + size]))
+        offset += size
+    assert offset == len(body)
+    return frames
+
+@pytest.fixture
+def scanned_comic(database, tmp_path):
+    """
+    Una serie registrata con una scansione: capitolo 1 CBZ STORED, 2 CBZ compresso e 3 in directory,
+    ciascuno di tre pagine di colori diversi.
+
+    :return: Tuple (ID del fumetto come stringa, dizionario numero del capitolo -> lista dei byte delle pagine)
+    """
+    from app import mongo
+    from app.services.scanner import ComicScanner
+
+    series = tmp_path / 'library' / 'Series_Author'
+    series.mkdir(parents=True)
+    pages = {number: [jpeg_bytes(color=color) for color in ('red', 'green', 'blue')] for number in (1, 2, 3)}
+    write_cbz(series / 'Chapter 1.cbz', {f'{n:03}.jpg': data for n, data in enumerate(pages[1])})
+    write_cbz(series / 'Chapter 2.cbz', {f'{n:03}.jpg': data for n, data in enumerate(pages[2])}, zipfile.ZIP_DEFLATED)
+    (series / 'Chapter 3').mkdir()
+    for n, data in enumerate(pages[3]):
+        (series / 'Chapter 3' / f'{n:03}.jpg').write_bytes(data)
+
+    ComicScanner(str(series.parent), mongo, workers=1).scan_and_register_comics()
+    return str(database.comics.find_one()['_id']), pages
@@ -0,0 +1,78 @@
+# tests/test_cache_headers.py
+
+import os
+import pytest
+from conftest import jpeg_bytes
+
+def _version(comic_id, chapter_number):
+    from app.services import ComicService
+    return ComicService.get_chapter_version(comic_id, chapter_number)[0]
+
+@pytest.mark.parametrize('url', ['/comic/{id}/chapter/1/0', '/comic/{id}/chapter/2/0', '/comic/{id}/chapter/1/pages?start=0&count=2'])
+def test_matching_etag_returns_304(app, scanned_comic, url):
+    comic_id, _ = scanned_comic
+    client = app.test_client()
+    url = url.format(id=comic_id)
+
+    first = client.get(url)
+    second = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+
+    assert first.status_code == 200
+    assert second.status_code == 304
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert second.get_data() == b''
+
+def test_etag_distinguishes_pages_and_windows(app, scanned_comic):
+    comic_id, _ = scanned_comic
+    client = app.test_client()
+
+    etags = {
+        client.get(f'/comic/{comic_id}/chapter/1/0').headers['ETag'],
+        client.get(f'/comic/{comic_id}/chapter/1/1').headers['ETag'],
+        client.get(f'/comic/{comic_id}/chapter/1/pages?start=0&count=2').headers['ETag'],
+        client.get(f'/comic/{comic_id}/chapter/1/pages?start=1&count=2').headers['ETag']
+    }
+
+    assert len(etags) == 4
+
+def test_versioned_url_is_immutable_and_stale_version_is_not(app, scanned_comic):
+    comic_id, _ = scanned_comic
+    client = app.test_client()
+    version = _version(comic_id, 1)
+
+    current = client.get(f'/comic/{comic_id}/chapter/1/0?v={version}')
+    stale = client.get(f'/comic/{comic_id}/chapter/1/0?v=old')
+
+    assert current.cache_control.immutable
+    assert current.cache_control.max_age > 0
+    assert not stale.cache_control.immutable
+    assert stale.cache_control.no_cache
+
+def test_rewritten_archive_changes_the_etag(app, database, scanned_comic):
+    comic_id, _ = scanned_comic
+    client = app.test_client()
+    chapter = database.chapters.find_one({'number': 1})
+    archive_path = os.path.join(database.comics.find_one()['path'], chapter['filename'])
+    etag = client.get(f'/comic/{comic_id}/chapter/1/0').headers['ETag']
+
+    stat = os.stat(archive_path)
+    os.utime(archive_path, (stat.st_atime, stat.st_mtime + 10))
+    response = client.get(f'/comic/{comic_id}/chapter/1/0', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_overwritten_directory_page_changes_the_version(app, database, scanned_comic):
+    comic_id, _ = scanned_comic
+    directory = os.path.join(database.comics.find_one()['path'], 'Chapter 3')
+    version = _version(comic_id, 3)
+    directory_mtime = os.stat(directory).st_mtime
+
+    image_path = os.path.join(directory, '000.jpg')
+    with open(image_path, 'wb') as image_file:
+        image_file.write(jpeg_bytes(120, 180))
+    stat = os.stat(image_path)
+    os.utime(image_path, (stat.st_atime, stat.st_mtime + 10))
+    os.utime(directory, (directory_mtime, directory_mtime))
+
+    assert _version(comic_id, 3) != version
@@ -0,0 +1,55 @@
+# tests/test_chapters_collection.py
+
+import pytest
+from bson.objectid import ObjectId
+
+@pytest.fixture
+def comic_id(database):
+    """
+    Un fumetto con capitoli numerati con dei salti: 1, 2, 5, 9.
+    """
+    comic_id = ObjectId()
+    database.comics.insert_one({'_id': comic_id, 'title': 'Series', 'path': '/library/Series_Author'})
+    database.chapters.insert_many([
+        {'comic_id': comic_id, 'number': number, 'title': f'Chapter {number}', 'filename': f'Chapter {number}.cbz',
+         'is_archive': True, 'page_count': 1, 'pages': []}
+        for number in (5, 1, 9, 2)
+    ])
+    return comic_id
+
+def test_list_by_comic_is_ordered_and_paginated(comic_id):
+    from app.models import Chapter
+
+    assert [chapter['number'] for chapter in Chapter.list_by_comic(comic_id)] == [1, 2, 5, 9]
+    assert [chapter['number'] for chapter in Chapter.list_by_comic(comic_id, offset=1, limit=2)] == [2, 5]
+    assert all('pages' not in chapter for chapter in Chapter.list_by_comic(comic_id))
+    assert Chapter.count_by_comic(comic_id) == 4
+    assert Chapter.count_before(comic_id, 5) == 2
+
+@pytest.mark.parametrize('number, expected', [(1, (None, 2)), (2, (1, 5)), (5, (2, 9)), (9, (5, None))])
+def test_neighbours_skip_gaps_in_numbering(comic_id, number, expected):
+    from app.models import Chapter
+
+    previous, following = Chapter.find_neighbours(comic_id, number)
+
+    assert tuple(chapter and chapter['number'] for chapter in (previous, following)) == expected
+
+def test_migration_moves_embedded_chapters_and_is_idempotent(database):
+    from app.models import Chapter
+
+    comic_id = ObjectId()
+    database.comics.insert_one({'_id': comic_id, 'title': 'Old', 'chapters': [
+        {'number': 1, 'title': 'Chapter 1', 'filename': 'Chapter 1.cbz', 'is_archive': True, 'page_count': 3},
+        {'number': 2, 'title': 'Chapter 2', 'filename': 'Chapter 2.cbz', 'is_archive': True, 'page_count': 4}
+    ]})
+
+    assert Chapter.migrate_embedded() == 1
+    # Una migrazione interrotta prima di rimuovere l'array viene ripetuta senza duplicati
+    database.comics.update_one({'_id': comic_id}, {'$set': {'chapters': [
+        {'number': 1, 'title': 'Chapter 1', 'filename': 'Chapter 1.cbz', 'is_archive': True, 'page_count': 3}
+    ]}})
+    assert Chapter.migrate_embedded() == 1
+    assert Chapter.migrate_embedded() == 0
+
+    assert 'chapters' not in database.comics.find_one({'_id': comic_id})
+    assert [chapter['number'] for chapter in Chapter.list_by_comic(comic_id)] == [1, 2]
@@ -0,0 +1,67 @@
+# tests/test_derivative_cache.py
+
+import os
+import time
+import pytest
+from app.services.derivative_cache import DerivativeCache
+
+@pytest.fixture
+def cache(tmp_path):
+    return DerivativeCache(str(tmp_path / 'derivatives'), 3000)
+
+def _age(path, seconds):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+def test_key_depends_on_source_mtime_and_variant():
+    keys = {
+        DerivativeCache.make_key('/a.cbz#0', 1.0, 'thumb-small'),
+        DerivativeCache.make_key('/a.cbz#1', 1.0, 'thumb-small'),
+        DerivativeCache.make_key('/a.cbz#0', 2.0, 'thumb-small'),
+        DerivativeCache.make_key('/a.cbz#0', 1.0, 'thumb-large')
+    }
+    assert len(keys) == 4
+
+def test_get_or_create_builds_once(cache):
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return b'data'
+
+    first = cache.get_or_create('ab12', 'jpg', factory)
+    second = cache.get_or_create('ab12', 'jpg', factory)
+
+    assert first == second
+    assert calls == [1]
+    with open(first, 'rb') as derivative:
+        assert derivative.read() == b'data'
+
+def test_least_recently_used_files_are_evicted(cache):
+    paths = [cache.put(f'{n:02}ff', 'jpg', b'x' * 1000) for n in range(3)]
+    for age, path in zip((300, 100, 200), paths):
+        _age(path, age)
+
+    cache.put('03ff', 'jpg', b'x' * 1000)
+
+    assert not os.path.exists(paths[0])
+    assert os.path.exists(paths[1])
+    assert cache._size <= 3000 * 0.9
+
+def test_get_refreshes_old_files(cache):
+    path = cache.put('ab12', 'jpg', b'data')
+    _age(path, cache.touch_interval + 10)
+
+    assert cache.get('ab12', 'jpg') == path
+    assert time.time() - os.stat(path).st_mtime < 10
+    assert cache.get('cd34', 'jpg') is None
+
+def test_adopt_moves_the_file_into_the_cache(cache, tmp_path):
+    source = tmp_path / 'extracted.jpg'
+    source.write_bytes(b'x' * 100)
+
+    path = cache.adopt('ab12', 'jpg', str(source))
+
+    assert not source.exists()
+    assert cache.get('ab12', 'jpg') == path
+    assert cache._disk_usage() == 100
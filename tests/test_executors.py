@@ -0,0 +1,91 @@
+# tests/test_executors.py
+
+import threading
+import pytest
+from app.services.executors import BoundedExecutor, ExecutorBusy, ExecutorTimeout
+
+@pytest.fixture
+def gate():
+    """
+    Evento che tiene occupati i lavori finché il test non lo imposta.
+    """
+    event = threading.Event()
+    yield event
+    event.set()
+
+def _start_blocked(executor, gate):
+    started = threading.Event()
+
+    def job():
+        started.set()
+        gate.wait(5)
+
+    thread = threading.Thread(target=lambda: executor.run(job))
+    thread.start()
+    assert started.wait(5)
+    return thread
+
+def _drain(executor):
+    # Il posto si libera in una callback nel thread del lavoro: un lavoro successivo la attende
+    executor._executor.submit(lambda: None).result()
+
+def test_results_and_exceptions_are_returned_to_the_caller():
+    executor = BoundedExecutor('test', 1, 1, 5)
+
+    assert executor.run(sum, [1, 2, 3]) == 6
+    with pytest.raises(ZeroDivisionError):
+        executor.run(lambda: 1 / 0)
+    _drain(executor)
+    assert executor.stats()['available'] == 2
+
+def test_full_pool_rejects_instead_of_queueing(gate):
+    executor = BoundedExecutor('test', 1, 0, 5)
+    thread = _start_blocked(executor, gate)
+
+    with pytest.raises(ExecutorBusy):
+        executor.run(sum, [1])
+    assert executor.stats()['rejected'] == 1
+
+    gate.set()
+    thread.join()
+    _drain(executor)
+    assert executor.run(sum, [1]) == 1
+
+def test_slow_job_times_out_and_keeps_its_slot_until_it_ends(gate):
+    executor = BoundedExecutor('test', 1, 0, 0.05)
+
+    with pytest.raises(ExecutorTimeout):
+        executor.run(gate.wait, 5)
+    assert executor.stats()['timed_out'] == 1
+    assert executor.stats()['available'] == 0
+
+    gate.set()
+    executor._executor.shutdown(wait=True)
+    assert executor.stats()['available'] == 1
+
+def test_busy_pool_answers_503_with_retry_after(app, scanned_comic, monkeypatch):
+    from app.services import ComicService
+
+    comic_id, _ = scanned_comic
+
+    def busy(*args, **kwargs):
+        raise ExecutorBusy("page-io: troppe richieste in coda")
+
+    monkeypatch.setattr(ComicService, 'load_page_content', busy)
+    response = app.test_client().get(f'/comic/{comic_id}/chapter/1/0')
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+def test_slow_page_answers_504(app, scanned_comic, monkeypatch):
+    from app.services import ComicService
+
+    comic_id, _ = scanned_comic
+
+    def slow(*args, **kwargs):
+        raise ExecutorTimeout("page-io: tempo massimo di 5s superato")
+
+    monkeypatch.setattr(ComicService, 'get_page_range', slow)
+    response = app.test_client().get(f'/comic/{comic_id}/chapter/1/pages?start=0&count=2')
+
+    assert response.status_code == 504
@@ -0,0 +1,123 @@
+# tests/test_incremental_scan.py
+
+import os
+import shutil
+import pytest
+from conftest import jpeg_bytes, write_cbz
+
+@pytest.fixture
+def library(tmp_path):
+    """
+    Libreria con due serie: una di due capitoli CBZ, una con un capitolo in directory.
+    """
+    root = tmp_path / 'library'
+    first = root / 'Alpha_Author'
+    first.mkdir(parents=True)
+    write_cbz(first / 'Chapter 1.cbz', {'001.jpg': jpeg_bytes(), '002.jpg': jpeg_bytes()})
+    write_cbz(first / 'Chapter 2.cbz', {'001.jpg': jpeg_bytes()})
+    loose = root / 'Beta_Author' / 'Chapter 1'
+    loose.mkdir(parents=True)
+    (loose / '001.jpg').write_bytes(jpeg_bytes())
+    return root
+
+def _scan(database, library, **kwargs):
+    from app import mongo
+    from app.services.scanner import ComicScanner, ScanProgress
+
+    progress = ScanProgress()
+    ComicScanner(str(library), mongo, workers=2, batch_size=2).scan_and_register_comics(progress=progress, **kwargs)
+    return progress.snapshot()
+
+def _state(database):
+    comics = {comic['title']: comic['_id'] for comic in database.comics.find()}
+    chapters = {(chapter['comic_id'], chapter['filename']): chapter for chapter in database.chapters.find()}
+    return comics, chapters
+
+def _touch(path, delta=10):
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + delta))
+
+def test_first_scan_registers_comics_and_chapters(database, library):
+    snapshot = _scan(database, library)
+
+    comics, chapters = _state(database)
+    assert set(comics) == {'Alpha', 'Beta'}
+    assert len(chapters) == 3
+    assert snapshot['archives_listed'] == 3
+    assert chapters[(comics['Alpha'], 'Chapter 1.cbz')]['page_count'] == 2
+
+def test_unchanged_library_reopens_nothing_and_keeps_ids(database, library):
+    _scan(database, library)
+    comics, chapters = _state(database)
+
+    snapshot = _scan(database, library)
+
+    assert snapshot['archives_listed'] == 0
+    assert _state(database) == (comics, chapters)
+
+def test_modified_chapter_is_relisted_with_the_same_id(database, library):
+    _scan(database, library)
+    comics, chapters = _state(database)
+    chapter_path = library / 'Alpha_Author' / 'Chapter 2.cbz'
+    write_cbz(chapter_path, {'001.jpg': jpeg_bytes(), '002.jpg': jpeg_bytes(), '003.jpg': jpeg_bytes()})
+    _touch(chapter_path)
+
+    snapshot = _scan(database, library)
+
+    assert snapshot['archives_listed'] == 1
+    new_comics, new_chapters = _state(database)
+    assert new_comics == comics
+    key = (comics['Alpha'], 'Chapter 2.cbz')
+    assert new_chapters[key]['_id'] == chapters[key]['_id']
+    assert new_chapters[key]['page_count'] == 3
+
+def test_page_overwritten_in_a_directory_chapter_is_relisted(database, library):
+    _scan(database, library)
+    image_path = library / 'Beta_Author' / 'Chapter 1' / '001.jpg'
+    directory_mtime = os.stat(image_path.parent).st_mtime
+    image_path.write_bytes(jpeg_bytes(120, 180))
+    _touch(image_path)
+    # La mtime della directory non cambia quando un file viene sovrascritto
+    os.utime(image_path.parent, (directory_mtime, directory_mtime))
+
+    snapshot = _scan(database, library)
+
+    assert snapshot['archives_listed'] == 1
+    chapter = database.chapters.find_one({'filename': 'Chapter 1', 'is_archive': False})
+    assert chapter['pages'][0]['file_size'] == image_path.stat().st_size
+
+def test_new_and_removed_chapters_and_series(database, library):
+    _scan(database, library)
+    comics, chapters = _state(database)
+    write_cbz(library / 'Alpha_Author' / 'Chapter 3.cbz', {'001.jpg': jpeg_bytes()})
+    os.remove(library / 'Alpha_Author' / 'Chapter 1.cbz')
+    shutil.rmtree(library / 'Beta_Author')
+
+    snapshot = _scan(database, library)
+
+    assert snapshot['archives_listed'] == 1
+    new_comics, new_chapters = _state(database)
+    assert new_comics == {'Alpha': comics['Alpha']}
+    assert set(new_chapters) == {(comics['Alpha'], 'Chapter 2.cbz'), (comics['Alpha'], 'Chapter 3.cbz')}
+    assert new_chapters[(comics['Alpha'], 'Chapter 2.cbz')]['_id'] == chapters[(comics['Alpha'], 'Chapter 2.cbz')]['_id']
+
+def test_targeted_scan_visits_only_the_given_series(database, library):
+    _scan(database, library)
+    for chapter_path in (library / 'Alpha_Author' / 'Chapter 2.cbz', library / 'Beta_Author' / 'Chapter 1' / '001.jpg'):
+        _touch(chapter_path)
+
+    snapshot = _scan(database, library, comic_paths=[str(library / 'Alpha_Author')])
+
+    assert snapshot['directories_seen'] == 1
+    assert snapshot['archives_listed'] == 1
+
+def test_full_scan_rebuilds_the_library(database, library):
+    _scan(database, library)
+    comics, _ = _state(database)
+
+    snapshot = _scan(database, library, full=True)
+
+    new_comics, new_chapters = _state(database)
+    assert snapshot['archives_listed'] == 3
+    assert set(new_comics) == set(comics)
+    assert len(new_chapters) == 3
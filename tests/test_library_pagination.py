@@ -0,0 +1,78 @@
+# tests/test_library_pagination.py
+
+from datetime import datetime, timedelta
+import pytest
+from bson.objectid import ObjectId
+from app.utils import decode_cursor, encode_cursor
+
+def test_cursor_round_trip():
+    cursor = encode_cursor('batman / year one', '65f1c0ffee0000000000abcd')
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == ['batman / year one', '65f1c0ffee0000000000abcd']
+
+def test_cursor_round_trip_unicode_and_none():
+    assert decode_cursor(encode_cursor('città è già', None)) == ['città è già', None]
+
+@pytest.mark.parametrize('cursor', ['not-base64!', '////', 'bm90IGpzb24'])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def _insert_comics(database, rows):
+    ids = []
+    for sort_title, added_at in rows:
+        comic_id = ObjectId()
+        database.comics.insert_one({
+            '_id': comic_id,
+            'title': sort_title.title(),
+            'sort_title': sort_title,
+            'added_at': added_at,
+            'chapter_count': 1,
+            'page_count': 10,
+            'cover_chapter': 1
+        })
+        ids.append(comic_id)
+    return ids
+
+def _walk(sort, limit):
+    from app.models import Comic
+
+    seen, cursor = [], None
+    for _ in range(100):
+        comics, cursor = Comic.list_summary(sort, cursor, limit)
+        assert len(comics) <= limit
+        seen.extend(comic['_id'] for comic in comics)
+        if cursor is None:
+            return seen
+    raise AssertionError("La paginazione non termina")
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 5, 50])
+def test_title_pagination_crosses_equal_sort_keys(database, limit):
+    base = datetime(2024, 1, 1)
+    rows = [('alpha', base)] + [('same', base)] * 7 + [('zeta', base), ('same', base)]
+    ids = _insert_comics(database, rows)
+    expected = sorted(ids, key=lambda comic_id: (database.comics.find_one({'_id': comic_id})['sort_title'], comic_id))
+
+    assert _walk('title', limit) == expected
+
+@pytest.mark.parametrize('limit', [1, 3, 4])
+def test_recent_pagination_crosses_equal_dates(database, limit):
+    newest = datetime(2024, 5, 1, 12, 0, 0)
+    rows = [('a', newest)] * 4 + [('b', newest - timedelta(days=1))] * 3 + [('c', newest - timedelta(days=2))]
+    ids = _insert_comics(database, rows)
+    added = {comic_id: added_at for comic_id, (_, added_at) in zip(ids, rows)}
+    expected = sorted(ids, key=lambda comic_id: (added[comic_id], comic_id), reverse=True)
+
+    assert _walk('recent', limit) == expected
+
+def test_invalid_cursor_is_rejected(database):
+    from app.models import Comic
+
+    _insert_comics(database, [('a', datetime(2024, 1, 1))])
+    with pytest.raises(ValueError):
+        Comic.list_summary('title', encode_cursor('a', 'not-an-object-id'), 10)
+    with pytest.raises(ValueError):
+        Comic.list_summary('recent', encode_cursor('yesterday', str(ObjectId())), 10)
+    # JSON valido ma non nella forma [valore, id]
+    with pytest.raises(ValueError):
+        Comic.list_summary('title', encode_cursor(), 10)
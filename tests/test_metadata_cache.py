@@ -0,0 +1,75 @@
+# tests/test_metadata_cache.py
+
+from app.services.metadata_cache import MetadataCache
+
+class Loader:
+    """
+    Loader che conta le chiamate e restituisce il valore impostato.
+    """
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+def test_values_are_loaded_once():
+    cache = MetadataCache(10, 60)
+    loader = Loader('chapter')
+
+    assert cache.get_or_load('key', loader) == 'chapter'
+    assert cache.get_or_load('key', loader) == 'chapter'
+    assert loader.calls == 1
+    assert cache.stats()['hits'] == 1
+
+def test_missing_values_are_not_cached():
+    cache = MetadataCache(10, 60)
+    loader = Loader(None)
+
+    assert cache.get_or_load('key', loader) is None
+    loader.value = 'chapter'
+    assert cache.get_or_load('key', loader) == 'chapter'
+    assert loader.calls == 2
+
+def test_expired_and_evicted_entries_are_reloaded():
+    expired = MetadataCache(10, 0)
+    loader = Loader('chapter')
+    expired.get_or_load('key', loader)
+    expired.get_or_load('key', loader)
+    assert loader.calls == 2
+
+    small = MetadataCache(2, 60)
+    for key in ('a', 'b', 'a', 'c'):
+        small.get_or_load(key, Loader(key))
+    assert small.get_or_load('a', Loader('reloaded')) == 'a'
+    assert small.get_or_load('b', Loader('reloaded')) == 'reloaded'
+
+def test_value_loaded_across_an_invalidation_is_not_cached():
+    cache = MetadataCache(10, 60)
+
+    def stale():
+        cache.invalidate()
+        return 'stale'
+
+    assert cache.get_or_load('key', stale) == 'stale'
+    assert cache.get_or_load('key', Loader('fresh')) == 'fresh'
+
+def test_scan_finished_in_another_process_clears_the_cache():
+    versions = Loader(1)
+    cache = MetadataCache(10, 60, last_change=versions, check_interval=0)
+    cache.get_or_load('key', Loader('old'))
+
+    assert cache.get_or_load('key', Loader('new')) == 'old'
+    versions.value = 2
+    assert cache.get_or_load('key', Loader('new')) == 'new'
+    assert cache.stats()['generation'] == 2
+
+def test_last_change_is_checked_at_most_once_per_interval():
+    versions = Loader(1)
+    cache = MetadataCache(10, 60, last_change=versions, check_interval=3600)
+
+    for _ in range(5):
+        cache.get_or_load('key', Loader('value'))
+
+    assert versions.calls == 1
@@ -0,0 +1,86 @@
+# tests/test_metrics.py
+
+from app.services import metrics
+from app.services.metrics import Counter, GaugeCallback, Histogram
+
+def test_counter_renders_labelled_series():
+    counter = Counter('pages_total', "Pagine", ('route', 'status'))
+    counter.inc(1, 'view_page', '200')
+    counter.inc(2, 'view_page', '200')
+    counter.inc(1, 'say "hi"', '404')
+
+    assert counter.render() == [
+        '# HELP pages_total Pagine',
+        '# TYPE pages_total counter',
+        'pages_total{route="say \\"hi\\"",status="404"} 1',
+        'pages_total{route="view_page",status="200"} 3'
+    ]
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency_seconds', "Latenza", (), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        'latency_seconds_sum 3.65',
+        'latency_seconds_count 4'
+    ]
+
+def test_gauge_skips_missing_values():
+    gauge = GaugeCallback('hit_rate', "Hit rate", ('cache',), lambda: [(('pages',), 0.5), (('covers',), None)])
+
+    assert gauge.render()[2:] == ['hit_rate{cache="pages"} 0.5']
+
+def test_spans_are_collected_for_the_current_request():
+    spans = metrics.start_request()
+    try:
+        with metrics.span('archive_open'):
+            pass
+        chunks = list(metrics.timed('decompress', iter([b'a', b'b'])))
+    finally:
+        metrics.finish_request()
+
+    assert chunks == [b'a', b'b']
+    assert [stage for stage, _ in spans] == ['archive_open', 'decompress']
+    assert set(metrics.summarize_spans(spans + [('archive_open', 1.0)])) == {'archive_open', 'decompress'}
+
+def test_timed_closes_the_wrapped_iterator():
+    closed = []
+
+    def chunks():
+        try:
+            yield b'a'
+            yield b'b'
+        finally:
+            closed.append(True)
+
+    wrapped = metrics.timed('decompress', chunks())
+    next(wrapped)
+    wrapped.close()
+
+    assert closed == [True]
+
+def _sample(text, prefix):
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+def test_streamed_responses_are_counted_after_they_are_sent(app, scanned_comic):
+    comic_id, _ = scanned_comic
+    client = app.test_client()
+    requests_prefix = 'comic_vault_requests_total{route="view_page_range",status="200"}'
+    bytes_prefix = 'comic_vault_response_bytes_total{route="view_page_range"}'
+    before = client.get('/metrics').get_data(as_text=True)
+
+    response = client.get(f'/comic/{comic_id}/chapter/2/pages?start=0&count=3')
+    body = response.get_data()
+    # Il server chiude il corpo dopo averlo inviato: è lì che la richiesta viene contata
+    response.close()
+    after = client.get('/metrics').get_data(as_text=True)
+
+    assert _sample(after, requests_prefix) == _sample(before, requests_prefix) + 1
+    assert _sample(after, bytes_prefix) == _sample(before, bytes_prefix) + len(body)
@@ -0,0 +1,79 @@
+# tests/test_page_index.py
+
+import struct
+import zipfile
+import pytest
+from app.utils import _zip_data_offset, build_page_index
+
+def _extra_field(header_id, payload):
+    return struct.pack('<HH', header_id, len(payload)) + payload
+
+@pytest.fixture
+def archive_path(tmp_path):
+    """
+    CBZ con membri STORED e DEFLATED; uno dei membri ha un extra field nel local header.
+    """
+    path = tmp_path / 'chapter.cbz'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr(zipfile.ZipInfo('page10.jpg'), b'ten' * 100, compress_type=zipfile.ZIP_STORED)
+        info = zipfile.ZipInfo('page2.jpg')
+        # Extra field di tipo sconosciuto (0xcafe): zipfile lo conserva così com'è
+        info.extra = _extra_field(0xcafe, b'x' * 27)
+        archive.writestr(info, b'two' * 100, compress_type=zipfile.ZIP_STORED)
+        archive.writestr(zipfile.ZipInfo('page1.jpg'), b'one' * 1000, compress_type=zipfile.ZIP_DEFLATED)
+        archive.writestr('notes.txt', b'not a page')
+    return path
+
+def test_zip_data_offset_points_at_member_data(archive_path):
+    raw = archive_path.read_bytes()
+    with zipfile.ZipFile(archive_path) as archive:
+        for name, payload in (('page10.jpg', b'ten' * 100), ('page2.jpg', b'two' * 100)):
+            info = archive.getinfo(name)
+            offset = _zip_data_offset(archive, info)
+            assert raw[offset:offset + info.file_size] == payload
+
+def test_zip_data_offset_skips_local_extra_field(archive_path):
+    with zipfile.ZipFile(archive_path) as archive:
+        info = archive.getinfo('page2.jpg')
+        offset = _zip_data_offset(archive, info)
+    name_length = len('page2.jpg')
+    extra_length = 4 + 27
+    assert offset == info.header_offset + zipfile.sizeFileHeader + name_length + extra_length
+
+def test_zip_data_offset_uses_local_header_when_central_extra_differs(tmp_path):
+    # Il local header ha un extra field che la directory centrale non riporta (es. padding di allineamento)
+    path = tmp_path / 'aligned.cbz'
+    payload = b'page' * 64
+    with zipfile.ZipFile(path, 'w') as archive:
+        info = zipfile.ZipInfo('page1.jpg')
+        info.extra = _extra_field(0xcafe, b'\0' * 13)
+        archive.writestr(info, payload, compress_type=zipfile.ZIP_STORED)
+    raw = path.read_bytes()
+    central = raw.index(b'PK\x01\x02')
+    extra_length_at = central + 30
+    name_length = struct.unpack('<H', raw[central + 28:central + 30])[0]
+    patched = (
+        raw[:extra_length_at] + struct.pack('<H', 0)
+        + raw[extra_length_at + 2:central + 46 + name_length]
+        + raw[central + 46 + name_length + len(info.extra):]
+    )
+    # Corregge dimensione e posizione della directory centrale nel record finale
+    end = patched.rindex(b'PK\x05\x06')
+    size, start = struct.unpack('<II', patched[end + 12:end + 20])
+    patched = patched[:end + 12] + struct.pack('<II', size - len(info.extra), start) + patched[end + 20:]
+    path.write_bytes(patched)
+
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo('page1.jpg')
+        assert info.extra == b''
+        offset = _zip_data_offset(archive, info)
+    assert patched[offset:offset + len(payload)] == payload
+
+def test_build_page_index_orders_pages_and_flags_stored_members(archive_path):
+    pages = build_page_index(str(archive_path), True)
+    assert [page['name'] for page in pages] == ['page1.jpg', 'page2.jpg', 'page10.jpg']
+    assert [page['stored'] for page in pages] == [False, True, True]
+    raw = archive_path.read_bytes()
+    for page in pages[1:]:
+        assert len(raw[page['offset']:page['offset'] + page['file_size']]) == page['file_size']
+    assert raw[pages[1]['offset']:pages[1]['offset'] + pages[1]['file_size']] == b'two' * 100
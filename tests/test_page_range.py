@@ -0,0 +1,57 @@
+# tests/test_page_range.py
+
+import struct
+import pytest
+from conftest import parse_frames
+from app.services.page_stream import frame_header
+
+def test_frame_header_layout():
+    header = frame_header(7, 'image/png', 1234)
+    assert header == struct.pack('>IIB', 7, 1234, 9) + b'image/png'
+
+@pytest.mark.parametrize('chapter_number', [1, 2, 3])
+def test_range_returns_pages_in_order(app, scanned_comic, chapter_number):
+    comic_id, pages = scanned_comic
+
+    response = app.test_client().get(f'/comic/{comic_id}/chapter/{chapter_number}/pages?start=1&count=2')
+
+    assert response.status_code == 200
+    assert response.headers['X-Page-Start'] == '1'
+    assert response.headers['X-Page-Count'] == '2'
+    assert parse_frames(response.get_data()) == [
+        (1, 'image/jpeg', pages[chapter_number][1]),
+        (2, 'image/jpeg', pages[chapter_number][2])
+    ]
+
+def test_range_is_clipped_at_the_end_of_the_chapter(app, scanned_comic):
+    comic_id, pages = scanned_comic
+
+    response = app.test_client().get(f'/comic/{comic_id}/chapter/1/pages?start=2&count=10')
+
+    assert response.headers['X-Page-Count'] == '1'
+    assert parse_frames(response.get_data()) == [(2, 'image/jpeg', pages[1][2])]
+
+@pytest.mark.parametrize('query, status', [('start=3&count=1', 404), ('start=-1&count=1', 404), ('start=0&count=0', 400)])
+def test_invalid_ranges_are_rejected(app, scanned_comic, query, status):
+    comic_id, _ = scanned_comic
+
+    response = app.test_client().get(f'/comic/{comic_id}/chapter/1/pages?{query}')
+
+    assert response.status_code == status
+
+def test_failure_after_the_first_page_ends_at_the_previous_frame(app, scanned_comic, monkeypatch):
+    from app.services import ComicService
+
+    comic_id, pages = scanned_comic
+    load = ComicService._load_range_page
+
+    def failing(chapter, chapter_path, mtime, index, page_number):
+        if page_number == 1:
+            raise OSError("lettura fallita")
+        return load(chapter, chapter_path, mtime, index, page_number)
+
+    monkeypatch.setattr(ComicService, '_load_range_page', failing)
+    response = app.test_client().get(f'/comic/{comic_id}/chapter/2/pages?start=0&count=3')
+
+    assert response.status_code == 200
+    assert parse_frames(response.get_data()) == [(0, 'image/jpeg', pages[2][0])]
@@ -0,0 +1,92 @@
+# tests/test_page_stream.py
+
+import os
+import pytest
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from app.services.page_stream import FileWindow, PageContent
+
+DATA = bytes(range(256)) * 4
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(DATA)
+    return str(path)
+
+def test_file_window_reads_only_its_slice(data_path):
+    with FileWindow(data_path, 100, 50) as window:
+        assert window.read() == DATA[100:150]
+        assert window.read() == b''
+
+def test_file_window_seek_is_relative_to_the_window(data_path):
+    with FileWindow(data_path, 100, 50) as window:
+        assert window.seek(10) == 10
+        assert window.read(5) == DATA[110:115]
+        assert window.seek(-5, os.SEEK_END) == 45
+        assert window.read() == DATA[145:150]
+        assert window.seek(5, os.SEEK_CUR) == 50
+        assert window.seek(-1000) == 0
+        assert window.read(3) == DATA[100:103]
+
+@pytest.mark.parametrize('range_header, start, stop', [
+    ('bytes=0-9', 0, 10),
+    ('bytes=10-19', 10, 20),
+    ('bytes=40-', 40, 50),
+    ('bytes=-5', 45, 50),
+    ('bytes=45-1000', 45, 50)
+])
+def test_send_page_serves_range_of_window(app, data_path, range_header, start, stop):
+    from app.controllers import send_page
+
+    content = PageContent('image/jpeg', 50, file=FileWindow(data_path, 100, 50))
+    validators = {'etag': 'v1-0', 'last_modified': None, 'immutable': False}
+    with app.test_request_context(headers={'Range': range_header}):
+        response = send_page(content, validators)
+        response.direct_passthrough = False
+        body = response.get_data()
+    assert response.status_code == 206
+    assert body == DATA[100 + start:100 + stop]
+    assert response.headers['Content-Range'] == f'bytes {start}-{stop - 1}/50'
+    assert response.content_length == stop - start
+
+def test_send_page_rejects_unsatisfiable_range(app, data_path):
+    from app.controllers import send_page
+
+    content = PageContent('image/jpeg', 50, file=FileWindow(data_path, 100, 50))
+    validators = {'etag': 'v1-0', 'last_modified': None, 'immutable': False}
+    with app.test_request_context(headers={'Range': 'bytes=50-60'}):
+        with pytest.raises(RequestedRangeNotSatisfiable):
+            send_page(content, validators)
+
+def test_send_page_without_range_sends_whole_window(app, data_path):
+    from app.controllers import send_page
+
+    content = PageContent('image/jpeg', 50, file=FileWindow(data_path, 100, 50))
+    validators = {'etag': 'v1-0', 'last_modified': None, 'immutable': False}
+    with app.test_request_context():
+        response = send_page(content, validators)
+        response.direct_passthrough = False
+        body = response.get_data()
+    assert response.status_code == 200
+    assert body == DATA[100:150]
+    assert response.headers['Accept-Ranges'] == 'bytes'
+
+@pytest.mark.parametrize('chapter_number', [1, 3])
+def test_page_route_serves_ranges_of_seekable_pages(app, scanned_comic, chapter_number):
+    comic_id, pages = scanned_comic
+
+    response = app.test_client().get(f'/comic/{comic_id}/chapter/{chapter_number}/1', headers={'Range': 'bytes=10-19'})
+
+    assert response.status_code == 206
+    assert response.get_data() == pages[chapter_number][1][10:20]
+    assert response.headers['Content-Range'] == f'bytes 10-19/{len(pages[chapter_number][1])}'
+
+def test_page_route_streams_compressed_members_whole(app, scanned_comic):
+    comic_id, pages = scanned_comic
+
+    response = app.test_client().get(f'/comic/{comic_id}/chapter/2/1', headers={'Range': 'bytes=10-19'})
+
+    assert response.status_code == 200
+    assert response.headers['Accept-Ranges'] == 'none'
+    assert response.content_length == len(pages[2][1])
+    assert response.get_data() == pages[2][1]
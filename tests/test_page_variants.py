@@ -0,0 +1,76 @@
+# tests/test_page_variants.py
+
+from io import BytesIO
+import pytest
+from PIL import Image
+from conftest import jpeg_bytes, parse_frames
+from imaging import make_variant
+
+def _size(data):
+    with Image.open(BytesIO(data)) as image:
+        return image.format, image.size
+
+@pytest.fixture
+def widths(app, monkeypatch):
+    # Le pagine di prova sono larghe 60 pixel: varianti più strette per vederle ridotte
+    monkeypatch.setitem(app.config, 'PAGE_VARIANT_WIDTHS', [20, 40])
+
+def test_make_variant_scales_down_keeping_the_aspect_ratio():
+    assert _size(make_variant(jpeg_bytes(600, 900), 300, 'jpeg')) == ('JPEG', (300, 450))
+    assert _size(make_variant(jpeg_bytes(600, 900), 250, 'webp')) == ('WEBP', (250, 375))
+
+def test_make_variant_never_upscales_and_converts_transparent_images():
+    png = BytesIO()
+    Image.new('RGBA', (40, 20), (255, 0, 0, 128)).save(png, 'PNG')
+
+    assert _size(make_variant(jpeg_bytes(600, 900), 1200, 'jpeg')) == ('JPEG', (600, 900))
+    assert _size(make_variant(png.getvalue(), None, 'jpeg')) == ('JPEG', (40, 20))
+
+@pytest.mark.parametrize('requested, expected', [(None, None), (1, 480), (480, 480), (481, 720), (2160, 2160), (5000, None)])
+def test_width_is_rounded_up_to_a_configured_variant(app, requested, expected):
+    from app.services import ComicService
+
+    assert ComicService._variant_width(requested) == expected
+
+def test_page_route_serves_variants(app, scanned_comic, widths):
+    comic_id, pages = scanned_comic
+    client = app.test_client()
+
+    variant = client.get(f'/comic/{comic_id}/chapter/2/1?w=30&fmt=webp')
+    original = client.get(f'/comic/{comic_id}/chapter/2/1')
+
+    assert variant.mimetype == 'image/webp'
+    assert _size(variant.get_data()) == ('WEBP', (40, 60))
+    assert variant.headers['ETag'] != original.headers['ETag']
+    assert original.get_data() == pages[2][1]
+
+def test_wider_than_every_variant_sends_the_original(app, scanned_comic, widths):
+    comic_id, pages = scanned_comic
+
+    response = app.test_client().get(f'/comic/{comic_id}/chapter/1/0?w=5000&fmt=webp')
+
+    assert response.mimetype == 'image/jpeg'
+    assert response.get_data() == pages[1][0]
+
+@pytest.mark.parametrize('query', ['w=0', 'w=-5', 'fmt=gif'])
+def test_invalid_variant_arguments_are_rejected(app, scanned_comic, query):
+    comic_id, _ = scanned_comic
+
+    assert app.test_client().get(f'/comic/{comic_id}/chapter/1/0?{query}').status_code == 400
+
+def test_page_range_sends_variant_frames(app, scanned_comic, widths):
+    comic_id, _ = scanned_comic
+
+    response = app.test_client().get(f'/comic/{comic_id}/chapter/3/pages?start=0&count=3&w=20&fmt=jpeg')
+
+    frames = parse_frames(response.get_data())
+    assert [(page_number, mimetype) for page_number, mimetype, _ in frames] == [(n, 'image/jpeg') for n in range(3)]
+    assert all(_size(data)[1] == (20, 30) for _, _, data in frames)
+
+def test_page_width_is_read_from_the_first_page(app, scanned_comic):
+    from app.services import ComicService
+
+    comic_id, _ = scanned_comic
+
+    assert ComicService.get_page_width(comic_id, 2) == 60
+    assert ComicService.get_page_width(comic_id, 99) is None
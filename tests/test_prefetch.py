@@ -0,0 +1,111 @@
+# tests/test_prefetch.py
+
+import threading
+import pytest
+from app.services.prefetch import PageByteCache, Prefetcher
+
+CHAPTER = {'number': 1, 'page_count': 10}
+NEXT_CHAPTER = {'number': 2}
+
+class Loader:
+    """
+    Loader che registra le pagine lette; finché release non è impostato blocca il worker.
+    """
+    def __init__(self, blocked=False):
+        self.loaded = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not blocked:
+            self.release.set()
+
+    def __call__(self, *target):
+        self.started.set()
+        self.release.wait(5)
+        self.loaded.append(target)
+
+@pytest.fixture
+def make_prefetcher():
+    created = []
+
+    def make(loader, depth=3, next_chapter_pages=2):
+        prefetcher = Prefetcher(loader, 1, depth, next_chapter_pages)
+        created.append((prefetcher, loader))
+        return prefetcher
+
+    yield make
+    for prefetcher, loader in created:
+        loader.release.set()
+        prefetcher._executor.shutdown(wait=True)
+
+def test_page_cache_evicts_least_recently_used_pages():
+    cache = PageByteCache(3000)
+    for n in range(3):
+        cache.put(n, b'x' * 700, 'image/jpeg')
+    cache.get(0)
+
+    cache.put(3, b'x' * 700, 'image/jpeg')
+    cache.put(4, b'x' * 700, 'image/jpeg')
+
+    assert 0 in cache
+    assert 1 not in cache
+    assert cache.size == 4 * 700
+    assert cache.open(0).read() == b'x' * 700
+
+def test_page_cache_skips_large_pages_and_counts_replacements_once():
+    cache = PageByteCache(1000)
+
+    cache.put('large', b'x' * 300, 'image/jpeg')
+    cache.put('page', b'x' * 200, 'image/jpeg')
+    cache.put('page', b'x' * 100, 'image/jpeg')
+
+    assert 'large' not in cache
+    assert cache.size == 100
+
+def test_following_pages_are_read_ahead(make_prefetcher):
+    loader = Loader()
+    prefetcher = make_prefetcher(loader)
+
+    prefetcher.schedule('reader', 'comic', CHAPTER, 2, NEXT_CHAPTER)
+    prefetcher._executor.shutdown(wait=True)
+
+    assert loader.loaded == [('comic', 1, 3), ('comic', 1, 4), ('comic', 1, 5)]
+    assert prefetcher.stats()['completed'] == 3
+
+def test_next_chapter_is_read_near_the_end(make_prefetcher):
+    loader = Loader()
+    prefetcher = make_prefetcher(loader)
+
+    prefetcher.schedule('reader', 'comic', CHAPTER, 7, NEXT_CHAPTER, variant=(720, 'webp'))
+    prefetcher._executor.shutdown(wait=True)
+
+    assert loader.loaded == [
+        ('comic', 1, 8, 720, 'webp'), ('comic', 1, 9, 720, 'webp'),
+        ('comic', 2, 0, 720, 'webp'), ('comic', 2, 1, 720, 'webp')
+    ]
+
+def test_pages_already_in_flight_are_not_scheduled_twice(make_prefetcher):
+    loader = Loader(blocked=True)
+    prefetcher = make_prefetcher(loader)
+
+    prefetcher.schedule('reader', 'comic', CHAPTER, 2)
+    prefetcher.schedule('reader', 'comic', CHAPTER, 3)
+
+    assert prefetcher.stats()['scheduled'] == 4
+    loader.release.set()
+    prefetcher._executor.shutdown(wait=True)
+    assert sorted(loader.loaded) == [('comic', 1, n) for n in range(3, 7)]
+
+def test_changing_chapter_cancels_pending_pages(make_prefetcher):
+    loader = Loader(blocked=True)
+    prefetcher = make_prefetcher(loader)
+
+    prefetcher.schedule('reader', 'comic', CHAPTER, 0)
+    assert loader.started.wait(5)
+    prefetcher.schedule('reader', 'comic', {'number': 5, 'page_count': 10}, 0)
+    loader.release.set()
+    prefetcher._executor.shutdown(wait=True)
+
+    # La prima pagina era già in lettura; le altre due del capitolo 1 vengono annullate
+    assert prefetcher.stats()['cancelled'] == 2
+    assert [target for target in loader.loaded if target[1] == 1] == [('comic', 1, 1)]
+    assert [target for target in loader.loaded if target[1] == 5] == [('comic', 5, n) for n in (1, 2, 3)]
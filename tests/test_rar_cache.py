@@ -0,0 +1,81 @@
+# tests/test_rar_cache.py
+
+import os
+import zipfile
+import pytest
+from conftest import jpeg_bytes, write_cbz
+
+PAGES = {'001.jpg': jpeg_bytes(color='red'), 'sub/002.jpg': jpeg_bytes(color='blue')}
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    """
+    Un "RAR" letto tramite zipfile: RarFile e ZipFile espongono la stessa interfaccia usata dalla conversione.
+    """
+    from app.services import rar_cache
+
+    monkeypatch.setattr(rar_cache.rarfile, 'RarFile', zipfile.ZipFile)
+    path = write_cbz(tmp_path / 'Chapter 1.cbr', PAGES)
+    return str(path), os.stat(path).st_mtime
+
+def _accelerator(tmp_path, mode):
+    from app.services.derivative_cache import DerivativeCache
+    from app.services.rar_cache import RarAccelerator
+
+    return RarAccelerator(mode, DerivativeCache(str(tmp_path / 'rar'), 10 ** 8))
+
+def _page(name):
+    return {'name': name, 'mimetype': 'image/jpeg'}
+
+@pytest.mark.parametrize('mode', ['extract', 'cbz'])
+def test_converted_pages_are_served_from_the_cache(tmp_path, archive, mode):
+    accelerator = _accelerator(tmp_path, mode)
+    archive_path, mtime = archive
+
+    assert not accelerator.is_converted(archive_path, mtime)
+    assert accelerator.convert(archive_path, mtime) == 2
+    assert accelerator.is_converted(archive_path, mtime)
+
+    for name, data in PAGES.items():
+        content = accelerator.open_page(archive_path, mtime, _page(name))
+        assert content.size == len(data)
+        assert content.read() == data
+
+def test_extraction_with_a_missing_member_is_not_ready(tmp_path, archive):
+    accelerator = _accelerator(tmp_path, 'extract')
+    archive_path, mtime = archive
+    accelerator.convert(archive_path, mtime)
+
+    os.remove(accelerator.cache.path_for(accelerator._member_key(archive_path, mtime, 'sub/002.jpg'), 'jpg'))
+
+    assert not accelerator.is_converted(archive_path, mtime)
+
+def test_missing_conversion_is_scheduled_once(tmp_path, archive):
+    accelerator = _accelerator(tmp_path, 'cbz')
+    archive_path, mtime = archive
+
+    assert accelerator.open_page(archive_path, mtime, _page('001.jpg')) is None
+    accelerator._executor.shutdown(wait=True)
+
+    assert accelerator.stats()['converted'] == 1
+    assert accelerator.stats()['pending'] == 0
+    assert accelerator.is_converted(archive_path, mtime)
+    assert accelerator.open_page(archive_path, mtime, _page('001.jpg')).read() == PAGES['001.jpg']
+
+def test_new_mtime_needs_a_new_conversion(tmp_path, archive):
+    accelerator = _accelerator(tmp_path, 'cbz')
+    archive_path, mtime = archive
+    accelerator.convert(archive_path, mtime)
+
+    assert not accelerator.is_converted(archive_path, mtime + 1)
+
+def test_disabled_accelerator_reads_from_the_rar(tmp_path, archive):
+    from app.services.rar_cache import RarAccelerator
+
+    accelerator = _accelerator(tmp_path, 'off')
+    archive_path, mtime = archive
+
+    assert accelerator.open_page(archive_path, mtime, _page('001.jpg')) is None
+    assert not accelerator.is_converted(archive_path, mtime)
+    with pytest.raises(ValueError):
+        RarAccelerator('fast', accelerator.cache)
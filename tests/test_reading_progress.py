@@ -0,0 +1,73 @@
+# tests/test_reading_progress.py
+
+from datetime import datetime, timedelta, timezone
+import pytest
+from bson.objectid import ObjectId
+
+@pytest.fixture
+def buffer(database):
+    """
+    Buffer dei progressi con scrittura solo manuale.
+    """
+    from app.services.reading_progress import ProgressBuffer
+
+    progress_buffer = ProgressBuffer(3600)
+    yield progress_buffer
+    progress_buffer.shutdown()
+
+def test_updates_of_the_same_comic_collapse_into_one_write(database, buffer):
+    comic_id = str(ObjectId())
+    for page_number in range(5):
+        buffer.record(comic_id, 1, page_number, 10)
+
+    assert buffer.get(comic_id)['page_number'] == 4
+    assert buffer.flush() == 1
+    assert database.reading_progress.count_documents({}) == 1
+    assert database.reading_progress.find_one()['page_number'] == 4
+    assert buffer.stats()['pending'] == 0
+
+def test_older_progress_does_not_overwrite_a_newer_one(database, buffer):
+    from app.models import ReadingProgress
+
+    comic_id = ObjectId()
+    now = datetime.now(timezone.utc)
+    database.reading_progress.insert_one({'_id': comic_id, 'chapter_number': 2, 'page_number': 7,
+                                          'page_count': 10, 'updated_at': now})
+
+    buffer.record(str(comic_id), 1, 3, 10)
+    buffer._pending[comic_id]['updated_at'] = now - timedelta(minutes=1)
+    buffer.flush()
+
+    stored = ReadingProgress.get(str(comic_id))
+    assert (stored['chapter_number'], stored['page_number']) == (2, 7)
+    assert buffer.stats()['failed'] == 0
+
+def test_newer_progress_overwrites_the_stored_one(database, buffer):
+    from app.models import ReadingProgress
+
+    comic_id = ObjectId()
+    database.reading_progress.insert_one({'_id': comic_id, 'chapter_number': 1, 'page_number': 1,
+                                          'page_count': 10, 'updated_at': datetime.now(timezone.utc) - timedelta(minutes=1)})
+
+    buffer.record(str(comic_id), 1, 5, 10)
+    buffer.flush()
+
+    assert ReadingProgress.get(str(comic_id))['page_number'] == 5
+
+def test_failed_write_is_requeued_without_replacing_newer_progress(database, buffer, monkeypatch):
+    from app.models import ReadingProgress
+
+    comic_id = str(ObjectId())
+    buffer.record(comic_id, 1, 2, 10)
+
+    def failing(operations):
+        # Una lettura più recente arriva mentre la scrittura è in corso
+        buffer.record(comic_id, 1, 6, 10)
+        raise ConnectionError("database non raggiungibile")
+
+    monkeypatch.setattr(ReadingProgress, 'bulk_write', failing)
+    with pytest.raises(ConnectionError):
+        buffer.flush()
+
+    assert buffer.get(comic_id)['page_number'] == 6
+    assert buffer.stats()['failed'] == 1
@@ -0,0 +1,68 @@
+# tests/test_scan_jobs.py
+
+from datetime import datetime, timedelta, timezone
+import pytest
+from conftest import jpeg_bytes, write_cbz
+
+@pytest.fixture
+def manager(database, tmp_path):
+    from app.services.scan_jobs import ScanJobManager
+
+    series = tmp_path / 'library' / 'Series_Author'
+    series.mkdir(parents=True)
+    write_cbz(series / 'Chapter 1.cbz', {'001.jpg': jpeg_bytes()})
+    return ScanJobManager(str(series.parent), 60)
+
+def test_lock_is_exclusive_until_released(database):
+    from app.models import ScanJob
+
+    assert ScanJob.acquire_lock('first', 60)
+    assert not ScanJob.acquire_lock('second', 60)
+
+    ScanJob.release_lock('second')
+    assert not ScanJob.acquire_lock('second', 60)
+
+    ScanJob.release_lock('first')
+    assert ScanJob.acquire_lock('second', 60)
+
+def test_abandoned_lock_expires(database):
+    from app.models import ScanJob
+
+    assert ScanJob.acquire_lock('first', 60)
+    database.locks.update_one({}, {'$set': {'heartbeat': datetime.now(timezone.utc) - timedelta(seconds=120)}})
+
+    assert ScanJob.acquire_lock('second', 60)
+
+def test_run_paths_records_a_completed_job(database, manager, tmp_path):
+    from app.models import ScanJob
+
+    series_path = str(tmp_path / 'library' / 'Series_Author')
+
+    assert manager.run_paths([series_path])
+
+    job = ScanJob.get_latest()
+    assert job['status'] == 'completed'
+    assert job['progress']['archives_listed'] == 1
+    assert ScanJob.get_running() is None
+    assert database.chapters.count_documents({}) == 1
+
+def test_run_paths_gives_up_while_another_scan_holds_the_lock(database, manager, tmp_path):
+    from app.models import ScanJob
+
+    assert ScanJob.acquire_lock('other', 60)
+
+    assert not manager.run_paths([str(tmp_path / 'library' / 'Series_Author')])
+    assert database.chapters.count_documents({}) == 0
+
+def test_shutdown_fails_running_jobs_and_releases_the_lock(database, manager):
+    from app.models import ScanJob
+    from app.services.scanner import ScanProgress
+
+    assert ScanJob.acquire_lock('interrupted', 60)
+    ScanJob.create('interrupted', False)
+    manager._running['interrupted'] = ScanProgress()
+
+    manager.shutdown()
+
+    assert ScanJob.get('interrupted')['status'] == 'failed'
+    assert ScanJob.acquire_lock('next', 60)
@@ -0,0 +1,74 @@
+# tests/test_scan_pipeline.py
+
+from conftest import jpeg_bytes, write_cbz
+from app.services.scanner import ScanProgress, _BulkWriter
+
+class Recorder:
+    """
+    Modello finto che registra i bulk_write ricevuti in un registro comune.
+    """
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+
+    def bulk_write(self, operations):
+        self.log.append((self.name, list(operations)))
+
+def test_bulk_writer_flushes_queues_in_creation_order():
+    log = []
+    comics, chapters = Recorder('comics', log), Recorder('chapters', log)
+    writer = _BulkWriter(3)
+
+    writer.add(comics, 'comic-1')
+    writer.add(chapters, 'chapter-1')
+    writer.add(chapters, 'chapter-2')
+    writer.add(chapters, 'chapter-3')
+    writer.add(chapters, 'chapter-4')
+    writer.flush()
+
+    assert log == [
+        ('comics', ['comic-1']),
+        ('chapters', ['chapter-1', 'chapter-2', 'chapter-3']),
+        ('chapters', ['chapter-4'])
+    ]
+
+def test_progress_reports_at_most_once_per_interval():
+    updates = []
+    progress = ScanProgress(on_update=updates.append, interval=3600)
+
+    for _ in range(5):
+        progress.chapter_queued()
+        progress.archive_listed()
+    progress.archive_listed(failed=True)
+
+    assert len(updates) == 1
+    snapshot = progress.snapshot()
+    assert snapshot['archives_listed'] == 6
+    assert snapshot['errors'] == 1
+
+def test_cover_phase_is_always_reported():
+    updates = []
+    progress = ScanProgress(on_update=updates.append, interval=3600)
+    progress.archive_listed()
+
+    progress.covers_started(4)
+    progress.cover_built()
+
+    assert [update['phase'] for update in updates] == ['chapters', 'covers']
+    assert progress.snapshot()['covers_built'] == 1
+    assert progress.snapshot()['covers_queued'] == 4
+
+def test_unreadable_archive_is_counted_and_skipped(database, tmp_path):
+    from app import mongo
+    from app.services.scanner import ComicScanner
+
+    series = tmp_path / 'library' / 'Series_Author'
+    series.mkdir(parents=True)
+    write_cbz(series / 'Chapter 1.cbz', {'001.jpg': jpeg_bytes()})
+    (series / 'Chapter 2.cbz').write_bytes(b'not a zip')
+    progress = ScanProgress()
+
+    ComicScanner(str(series.parent), mongo, workers=2).scan_and_register_comics(progress=progress)
+
+    assert progress.snapshot()['errors'] == 1
+    assert [chapter['number'] for chapter in database.chapters.find()] == [1]
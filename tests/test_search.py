@@ -0,0 +1,80 @@
+# tests/test_search.py
+
+import pytest
+from app.services.search import SearchIndex, trigrams
+from app.utils import normalize_text
+
+COMICS = [
+    {'_id': 1, 'title': 'One Piece', 'author': 'Eiichiro Oda', 'sort_title': 'one piece'},
+    {'_id': 2, 'title': 'One-Punch Man', 'author': 'ONE', 'sort_title': 'one punch man'},
+    {'_id': 3, 'title': 'Piccolo Principe', 'author': 'Antoine', 'sort_title': 'piccolo principe'},
+    {'_id': 4, 'title': 'Pokémon Adventures', 'author': 'Hidenori Kusaka', 'sort_title': 'pokemon adventures'}
+]
+
+class Library:
+    """
+    Sorgente dei documenti da indicizzare, con un contatore delle versioni modificabile dal test.
+    """
+    def __init__(self, documents):
+        self.documents = {document['_id']: document for document in documents}
+        self.version = 1
+
+    def load(self, comic_ids=None):
+        if comic_ids is None:
+            return list(self.documents.values())
+        return [self.documents[comic_id] for comic_id in comic_ids if comic_id in self.documents]
+
+    def last_change(self):
+        return self.version
+
+@pytest.fixture
+def library():
+    return Library(COMICS)
+
+@pytest.fixture
+def index(library):
+    return SearchIndex(library.load, library.last_change, refresh_interval=3600)
+
+def _ids(results):
+    return [document['_id'] for document in results]
+
+def test_normalize_text_strips_accents_and_punctuation():
+    assert normalize_text('  Pokémon: Adventures!') == 'pokemon adventures'
+    assert normalize_text(None) == ''
+
+def test_trigrams_are_padded_per_word():
+    assert trigrams('ab') == {'  a', ' ab', 'ab '}
+
+def test_prefix_results_rank_titles_starting_with_the_query_first(index):
+    assert _ids(index.search('one')) == [1, 2]
+    assert _ids(index.search('punch')) == [2]
+    assert _ids(index.search('pi')) == [3, 1]
+    assert _ids(index.search('oda pi')) == [1]
+    assert _ids(index.search('pokem')) == [4]
+
+def test_typos_fall_back_to_trigram_matches(index):
+    assert _ids(index.search('pokenon adventurs')) == [4]
+    assert index.search('zzzz') == []
+    assert index.search('  ') == []
+
+def test_limit_caps_the_results(index):
+    assert len(index.search('o', limit=1)) == 1
+
+def test_refresh_updates_only_the_changed_comics(index, library):
+    index.search('one')
+    library.documents[1] = dict(COMICS[0], title='Two Piece')
+    del library.documents[3]
+    library.documents[5] = {'_id': 5, 'title': 'Onepunch Remake', 'author': None, 'sort_title': 'onepunch remake'}
+
+    index.refresh([1, 5], [3])
+
+    assert _ids(index.search('one')) == [2, 5]
+    assert _ids(index.search('two')) == [1]
+    assert index.search('piccolo') == []
+    assert index.stats()['comics'] == 4
+
+def test_refresh_before_the_first_search_waits_for_the_full_build(index, library):
+    index.refresh([1])
+
+    assert not index.stats()['built']
+    assert _ids(index.search('one piece'))[0] == 1
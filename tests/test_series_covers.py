@@ -0,0 +1,66 @@
+# tests/test_series_covers.py
+
+import zipfile
+from io import BytesIO
+import pytest
+from bson.objectid import ObjectId
+from PIL import Image
+
+@pytest.fixture
+def comic(database, tmp_path):
+    """
+    Una serie con un capitolo CBZ di due pagine, registrata nel database.
+    """
+    series = tmp_path / 'Series_Author'
+    series.mkdir()
+    image = BytesIO()
+    Image.new('RGB', (60, 90), 'red').save(image, 'JPEG')
+    with zipfile.ZipFile(series / 'chapter1.cbz', 'w') as archive:
+        archive.writestr('001.jpg', image.getvalue())
+        archive.writestr('002.jpg', image.getvalue())
+
+    from app.utils import build_page_index
+    comic_id = ObjectId()
+    pages = build_page_index(str(series / 'chapter1.cbz'), True)
+    database.comics.insert_one({'_id': comic_id, 'title': 'Series', 'path': str(series), 'cover_chapter': 1})
+    database.chapters.insert_one({
+        'comic_id': comic_id, 'number': 1, 'filename': 'chapter1.cbz', 'is_archive': True,
+        'page_count': len(pages), 'pages': pages, 'mtime': (series / 'chapter1.cbz').stat().st_mtime
+    })
+    return comic_id
+
+def _apply(database, comic_id, operation):
+    from app.models import Comic
+    Comic.bulk_write([operation])
+    return database.comics.find_one({'_id': comic_id})
+
+def test_build_series_cover_records_thumbnail(database, comic):
+    from app.services import ComicService
+
+    stored = _apply(database, comic, ComicService.build_series_cover(comic))
+    assert stored['cover_thumb']['key']
+    assert stored['cover_thumb']['width'] > 0
+
+def test_failed_cover_is_not_recorded_and_is_retried(database, comic, monkeypatch):
+    from app.models import Comic
+    from app.services import ComicService
+    from app.services.executors import ExecutorBusy
+
+    database.comics.update_one({'_id': comic}, {'$set': {'cover_thumb': {'key': 'stale', 'width': 1, 'height': 1}}})
+
+    def busy(*args):
+        raise ExecutorBusy("transcode: troppe conversioni in coda")
+
+    monkeypatch.setattr(ComicService, 'get_chapter_cover', busy)
+    stored = _apply(database, comic, ComicService.build_series_cover(comic))
+    assert 'cover_thumb' not in stored
+    assert Comic.list_missing_cover_thumbs() == [comic]
+
+def test_series_without_pages_records_none_and_stays_in_backfill(database, comic):
+    from app.models import Comic
+    from app.services import ComicService
+
+    database.chapters.update_one({'comic_id': comic}, {'$set': {'page_count': 0, 'pages': []}})
+    stored = _apply(database, comic, ComicService.build_series_cover(comic))
+    assert stored['cover_thumb'] is None
+    assert Comic.list_missing_cover_thumbs() == [comic]
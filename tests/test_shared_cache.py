@@ -0,0 +1,93 @@
+# tests/test_shared_cache.py
+
+import os
+import time
+import pytest
+
+PAGE = b'x' * 1000
+
+@pytest.fixture
+def folder(tmp_path):
+    return str(tmp_path / 'pages')
+
+def _cache(folder, max_bytes=10000):
+    from app.services.shared_cache import SharedPageCache
+    return SharedPageCache(folder, max_bytes)
+
+def _disk_usage(cache):
+    files = list(cache._iter_files())
+    return sum(entry[2] for entry in files), len(files)
+
+def test_page_round_trip(folder):
+    cache = _cache(folder)
+    cache.put(('/a.cbz', 1.0, 0), PAGE, 'image/png')
+
+    content = cache.open(('/a.cbz', 1.0, 0))
+
+    assert content.mimetype == 'image/png'
+    assert content.size == len(PAGE)
+    assert content.read() == PAGE
+    assert cache.get(('/a.cbz', 1.0, 0)) == (PAGE, 'image/png')
+    assert cache.open(('/a.cbz', 2.0, 0)) is None
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 1
+
+def test_usage_is_shared_between_processes(folder):
+    first, second = _cache(folder), _cache(folder)
+
+    first.put(('/a.cbz', 1.0, 0), PAGE, 'image/jpeg')
+    second.put(('/a.cbz', 1.0, 1), PAGE, 'image/jpeg')
+
+    assert first.size == second.size == _disk_usage(first)[0]
+    assert second.stats()['entries'] == 2
+    assert second.open(('/a.cbz', 1.0, 0)).read() == PAGE
+
+def test_limit_is_enforced_across_processes(folder):
+    first, second = _cache(folder, 5000), _cache(folder, 5000)
+
+    for page_number in range(10):
+        cache = first if page_number % 2 else second
+        cache.put(('/a.cbz', 1.0, page_number), PAGE, 'image/jpeg')
+
+    used, entries = _disk_usage(first)
+    assert used <= 5000
+    assert first.stats()['bytes'] == used
+    assert first.stats()['entries'] == entries
+    assert ('/a.cbz', 1.0, 9) in first
+
+def test_large_pages_are_not_stored(folder):
+    cache = _cache(folder, 2000)
+
+    cache.put(('/a.cbz', 1.0, 0), PAGE, 'image/jpeg')
+
+    assert ('/a.cbz', 1.0, 0) not in cache
+    assert cache.size == 0
+
+def test_clear_empties_the_cache_for_every_process(folder):
+    first, second = _cache(folder), _cache(folder)
+    first.put(('/a.cbz', 1.0, 0), PAGE, 'image/jpeg')
+
+    second.clear()
+
+    assert first.open(('/a.cbz', 1.0, 0)) is None
+    assert first.size == 0
+    assert _disk_usage(first) == (0, 0)
+
+def test_recovery_recounts_usage_and_removes_stale_temporary_files(folder):
+    from app.services.shared_cache import STALE_TEMP_SECONDS
+
+    _cache(folder).put(('/a.cbz', 1.0, 0), PAGE, 'image/jpeg')
+    stale = os.path.join(folder, 'abandoned.tmp')
+    with open(stale, 'wb') as stale_file:
+        stale_file.write(PAGE)
+    old = time.time() - STALE_TEMP_SECONDS - 1
+    os.utime(stale, (old, old))
+    # Contatore lasciato sbagliato da un processo terminato
+    with open(os.path.join(folder, '.usage'), 'wb') as usage_file:
+        usage_file.write(b'\xff' * 16)
+
+    cache = _cache(folder)
+
+    assert cache.size == _disk_usage(cache)[0]
+    assert cache.stats()['entries'] == 1
+    assert not os.path.exists(stale)
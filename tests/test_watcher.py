@@ -0,0 +1,144 @@
+# tests/test_watcher.py
+
+from types import SimpleNamespace
+import pytest
+from conftest import jpeg_bytes, write_cbz
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    from app.services import watcher
+
+    fake = Clock()
+    monkeypatch.setattr(watcher, 'time', SimpleNamespace(monotonic=fake))
+    return fake
+
+@pytest.fixture
+def library(tmp_path):
+    root = tmp_path / 'library'
+    (root / 'Series_Author').mkdir(parents=True)
+    return root
+
+@pytest.fixture
+def watcher(library, clock):
+    """
+    Watcher senza thread: i controlli si eseguono con dispatch(), l'orologio si sposta a mano.
+    """
+    from app.services.watcher import LibraryWatcher
+
+    applied = []
+
+    def apply(paths):
+        applied.append(sorted(paths))
+        return True
+
+    instance = LibraryWatcher(str(library), apply, backend='poll', debounce=2.0, settle=2.0)
+    instance.applied = applied
+    return instance
+
+def dispatch(watcher, clock):
+    """
+    Esegue un giro del ciclo di invio: controlla le serie scadute e applica quelle pronte.
+    """
+    due = [path for path, (deadline, _) in watcher._pending.items() if deadline <= clock()]
+    ready = [path for path in due if watcher._is_settled(path)]
+    if ready:
+        watcher._apply(ready)
+
+def test_series_for_maps_paths_to_the_first_level(watcher, library):
+    series = str(library / 'Series_Author')
+
+    assert watcher.series_for(str(library / 'Series_Author' / 'Chapter 1' / '001.jpg')) == series
+    assert watcher.series_for(series) == series
+    assert watcher.series_for(str(library / '.trash' / 'x.cbz')) is None
+    assert watcher.series_for(str(library.parent / 'elsewhere')) is None
+
+def test_burst_of_events_produces_one_update_after_settling(watcher, library, clock):
+    series = library / 'Series_Author'
+    for number in range(3):
+        write_cbz(series / f'Chapter {number}.cbz', {'001.jpg': jpeg_bytes()})
+        watcher.notify(str(series / f'Chapter {number}.cbz'))
+        clock.now += 1
+
+    dispatch(watcher, clock)
+    assert watcher.applied == []
+
+    # Scaduto il debounce si registra lo snapshot, poi serve 'settle' senza cambiamenti
+    clock.now += 1
+    dispatch(watcher, clock)
+    assert watcher.applied == []
+    clock.now += 2
+    dispatch(watcher, clock)
+
+    assert watcher.applied == [[str(series)]]
+    assert watcher.stats()['events'] == 3
+    assert watcher.stats()['pending'] == 0
+
+def test_changes_during_settle_postpone_the_update(watcher, library, clock):
+    series = library / 'Series_Author'
+    write_cbz(series / 'Chapter 1.cbz', {'001.jpg': jpeg_bytes()})
+    watcher.notify(str(series))
+    clock.now += 2
+    dispatch(watcher, clock)
+
+    # Copia ancora in corso, senza eventi (es. filesystem di rete)
+    write_cbz(series / 'Chapter 2.cbz', {'001.jpg': jpeg_bytes()})
+    clock.now += 2
+    dispatch(watcher, clock)
+    assert watcher.applied == []
+
+    clock.now += 2
+    dispatch(watcher, clock)
+    assert watcher.applied == [[str(series)]]
+
+def test_incomplete_archive_is_not_applied(watcher, library, clock):
+    series = library / 'Series_Author'
+    archive = write_cbz(series / 'Chapter 1.cbz', {'001.jpg': jpeg_bytes()})
+    complete = archive.read_bytes()
+    # Archivio troncato prima della directory centrale
+    archive.write_bytes(complete[:len(complete) // 2])
+    watcher.notify(str(archive))
+
+    for _ in range(3):
+        clock.now += 2
+        dispatch(watcher, clock)
+    assert watcher.applied == []
+
+    archive.write_bytes(complete)
+    for _ in range(2):
+        clock.now += 2
+        dispatch(watcher, clock)
+    assert watcher.applied == [[str(series)]]
+
+def test_busy_update_is_retried(watcher, library, clock):
+    from app.services.watcher import BUSY_RETRY
+
+    results = [False, True]
+    attempts = []
+
+    def apply(paths):
+        attempts.append(paths)
+        return results.pop(0)
+
+    watcher.apply = apply
+    watcher.notify(str(library / 'Series_Author'))
+    for _ in range(2):
+        clock.now += 2
+        dispatch(watcher, clock)
+    assert len(attempts) == 1
+    assert watcher.stats()['retries'] == 1
+
+    clock.now += BUSY_RETRY
+    dispatch(watcher, clock)
+    clock.now += 2
+    dispatch(watcher, clock)
+
+    assert len(attempts) == 2
+    assert watcher.stats()['updates'] == 1
+    assert watcher.stats()['pending'] == 0
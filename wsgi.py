@@ -0,0 +1,8 @@
+# wsgi.py
+# Punto di ingresso per i server WSGI di produzione: gunicorn -c gunicorn.conf.py wsgi:app
+from app import app
+from app.models import prepare_database
+
+# Gli indici e le migrazioni sono idempotenti: ogni worker li verifica all'avvio
+with app.app_context():
+    prepare_database()